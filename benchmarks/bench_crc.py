@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: table-driven CRC16-XMODEM vs the original bit-by-bit loop.
+
+Usage: python benchmarks/bench_crc.py [--number N]
+"""
+
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import StreamingFrameCRC, crc16_xmodem_update  # noqa: E402
+
+
+QPIGS_FRAME = (
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)"
+)
+
+
+def crc16_xmodem_bitwise(data):
+    """Reference implementation as shipped up to 2.1.0."""
+    crc = 0x0000
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            if crc & 0x8000:
+                crc = (crc << 1) ^ 0x1021
+            else:
+                crc <<= 1
+            crc &= 0xFFFF
+    return crc
+
+
+def streamed(wire, chunk_size=8):
+    """Feed the frame in HID-report sized chunks like the read loop does."""
+    tracker = StreamingFrameCRC()
+    buffer = b""
+    for i in range(0, len(wire), chunk_size):
+        buffer += wire[i:i + chunk_size]
+        if tracker.feed(buffer):
+            break
+    return tracker.crc
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    wire = QPIGS_FRAME + crc16_xmodem_bitwise(QPIGS_FRAME).to_bytes(2, "big") + b"\r"
+    assert crc16_xmodem_bitwise(QPIGS_FRAME) == crc16_xmodem_update(0, QPIGS_FRAME)
+    assert streamed(wire) == crc16_xmodem_bitwise(QPIGS_FRAME)
+
+    cases = {
+        "bitwise (2.1.0)": lambda: crc16_xmodem_bitwise(QPIGS_FRAME),
+        "table": lambda: crc16_xmodem_update(0, QPIGS_FRAME),
+        "table, streamed 8B chunks": lambda: streamed(wire),
+    }
+    baseline = None
+    print(f"QPIGS frame: {len(QPIGS_FRAME)} bytes, {args.number} iterations")
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=args.number, repeat=5))
+        per_call_us = best / args.number * 1e6
+        baseline = baseline or per_call_us
+        print(f"{name:28s} {per_call_us:8.2f} us/frame  x{baseline / per_call_us:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
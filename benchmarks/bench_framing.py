@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: receive path on a chunked reply stream.
+
+Compares the 2.1.0 path (bytes concatenation, full rescan with
+extract_complete_response_frame on every chunk, CRC over the finished
+frame), the streaming CRC tracker fed on every chunk, and FrameReader's
+path: one bytearray, scanned only once a carriage return arrived. Replies
+are written to a pipe as NUL padded 8-byte HID reports up front and read
+back one report per read, as hidraw delivers them, so only the receive
+path is timed. The cases take turns within each repeat so drift on a busy
+machine hits them alike.
+
+Usage: python benchmarks/bench_framing.py [--number N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, StreamingFrameCRC, crc16_xmodem_update  # noqa: E402
+
+
+PAYLOADS = [
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)",
+    b"(L)",
+    b"(000000000000000000000000000000000000)",
+    b"(230.0 21.7 230.0 50.0 21.7 5000 4000 48.0 46.0 42.0 56.4 54.0 2 30 060 0 2 3 9 01 0 0 54.0 0 1)",
+]
+REPORT_SIZE = 8
+
+
+def wire_reports(payload):
+    wire = payload + crc16_xmodem_update(0, payload).to_bytes(2, "big") + b"\r"
+    return [wire[i:i + REPORT_SIZE].ljust(REPORT_SIZE, b"\0") for i in range(0, len(wire), REPORT_SIZE)]
+
+
+CORPUS = [wire_reports(payload) for payload in PAYLOADS]
+PASS = b"".join(b"".join(reports) for reports in CORPUS)
+MONITOR = MPPSolarMonitor.__new__(MPPSolarMonitor)
+
+
+def legacy(read_fd):
+    """2.1.0: response += chunk, rescan from the start, CRC at the end."""
+    leftover = b""
+    for reports in CORPUS:
+        response = leftover
+        for _ in reports:
+            response += os.read(read_fd, REPORT_SIZE)
+            frame, remaining = MONITOR.extract_complete_response_frame(response)
+            if frame is not None:
+                break
+        crc16_xmodem_update(0, frame[:-3])
+        frame[:-3].decode("ascii", errors="ignore")[1:-1].split()
+        leftover = remaining[-512:]
+
+
+def streaming_bytes(read_fd):
+    """Streaming CRC tracker fed on every chunk of a growing bytes object."""
+    leftover = b""
+    for reports in CORPUS:
+        response = leftover
+        tracker = StreamingFrameCRC()
+        for _ in reports:
+            response += os.read(read_fd, REPORT_SIZE)
+            if tracker.feed(response):
+                break
+        frame = response[tracker.frame_start:tracker.frame_end]
+        frame[:-3].decode("ascii", errors="ignore")[1:-1].split()
+        leftover = response[tracker.frame_end:][-512:]
+
+
+def carriage_return_gate(read_fd):
+    """FrameReader: bytearray += chunk, tracker fed once a CR arrived."""
+    leftover = b""
+    for reports in CORPUS:
+        response = bytearray(leftover)
+        tracker = StreamingFrameCRC()
+        for _ in reports:
+            chunk = os.read(read_fd, REPORT_SIZE)
+            response += chunk
+            if response.find(b"\r", len(response) - len(chunk)) != -1 and tracker.feed(response):
+                break
+        frame = bytes(response[tracker.frame_start:tracker.frame_end])
+        str(frame[:-3], "ascii", errors="ignore")[1:-1].split()
+        response = response[tracker.frame_end:]
+        start = response.find(b"(")
+        leftover = bytes(response[start:][-512:]) if start != -1 else b""
+
+
+def timed(func, read_fd, write_fd, number):
+    """Seconds spent in func over number passes, excluding the pipe writes."""
+    total = 0.0
+    for _ in range(number):
+        os.write(write_fd, PASS)
+        started = time.perf_counter()
+        func(read_fd)
+        total += time.perf_counter() - started
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    read_fd, write_fd = os.pipe()
+    cases = {
+        "legacy rescan (2.1.0)": legacy,
+        "bytes + streaming CRC": streaming_bytes,
+        "CR gate (FrameReader)": carriage_return_gate,
+    }
+    reports = sum(len(reports) for reports in CORPUS)
+    print(f"{len(CORPUS)} replies in {reports} HID reports per pass, {args.number} passes, best of {args.repeat}")
+    best = dict.fromkeys(cases, float("inf"))
+    for _ in range(args.repeat):
+        for name, func in cases.items():
+            best[name] = min(best[name], timed(func, read_fd, write_fd, args.number))
+    baseline = None
+    for name in cases:
+        per_pass_us = best[name] / args.number * 1e6
+        baseline = baseline or per_pass_us
+        print(f"{name:24s} {per_pass_us:8.1f} us/pass  x{baseline / per_pass_us:5.2f}")
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: opening the device every cycle vs keeping it open.
+
+One cycle writes QPIGS, lets the fake inverter answer and reads until the
+carriage return. The 2.1.0 case opens the node, waits with select() and
+closes it again every cycle; the HIDSession cases run the same exchange
+through the session, once closing it after every cycle and once keeping
+the fd (and its poll registration) across cycles. A raw pty stands in for
+/dev/hidrawN; opening a real hidraw node also goes through the USB HID
+driver, so the per-open cost measured here is a lower bound. The cases
+take turns within each repeat so drift on a busy machine hits them alike.
+
+Usage: python benchmarks/bench_hid_session.py [--number N] [--repeat R]
+"""
+
+import argparse
+import os
+import pty
+import select
+import sys
+import time
+import tty
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import HIDSession, crc16_xmodem_update  # noqa: E402
+
+
+PAYLOAD = (
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)"
+)
+REPLY = PAYLOAD + crc16_xmodem_update(0, PAYLOAD).to_bytes(2, "big") + b"\r"
+COMMAND = b"QPIGS" + crc16_xmodem_update(0, b"QPIGS").to_bytes(2, "big") + b"\r"
+
+
+def answer(master):
+    """The inverter side: take the command, send the reply."""
+    os.read(master, 64)
+    os.write(master, REPLY)
+
+
+def open_per_cycle(path, master):
+    """2.1.0: os.open, select() until the CR, os.close."""
+    fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+    try:
+        os.write(fd, COMMAND)
+        answer(master)
+        response = b""
+        while not response.endswith(b"\r"):
+            ready, _, _ = select.select([fd], [], [], 1.0)
+            if ready:
+                response += os.read(fd, 512)
+    finally:
+        os.close(fd)
+
+
+def session_cycle(session, master):
+    session.write(COMMAND)
+    answer(master)
+    response = b""
+    while not response.endswith(b"\r"):
+        if session.wait_readable(1.0):
+            response += session.read()
+
+
+def timed(cycle, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        cycle()
+    return time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    reopened = HIDSession(path)
+    persistent = HIDSession(path)
+
+    def reopened_cycle():
+        session_cycle(reopened, master)
+        reopened.close()
+
+    cases = {
+        "open/close per cycle (2.1.0)": lambda: open_per_cycle(path, master),
+        "HIDSession, closed per cycle": reopened_cycle,
+        "HIDSession, persistent fd": lambda: session_cycle(persistent, master),
+    }
+    print(f"QPIGS exchange on a pty, {args.number} cycles, best of {args.repeat}")
+    best = dict.fromkeys(cases, float("inf"))
+    for _ in range(args.repeat):
+        for name, cycle in cases.items():
+            best[name] = min(best[name], timed(cycle, args.number))
+    baseline = None
+    for name in cases:
+        per_cycle_us = best[name] / args.number * 1e6
+        baseline = baseline or per_cycle_us
+        print(f"{name:30s} {per_cycle_us:8.1f} us/cycle  x{baseline / per_cycle_us:5.2f}")
+    print(f"opens: closed per cycle {reopened.open_count}, persistent {persistent.open_count}")
+    persistent.close()
+    os.close(master)
+    os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
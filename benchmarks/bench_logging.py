@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Logging overhead of one read cycle.
+
+Times read_command('QPIGS') against a pty standing in for the inverter
+(the reply is written before the command, so no device latency is
+included) with logging switched off entirely, at the default INFO level
+and at DEBUG, with output formatted into /dev/null. The difference to the
+run without logging is what the log calls cost per cycle.
+
+Replies are either clean or fail the CRC check every cycle; the latter
+warns once per cycle, logged each time (log_summary_interval 0) or
+aggregated into periodic summaries (the default).
+
+Usage: python benchmarks/bench_logging.py [--cycles N] [--repeat N]
+"""
+
+import argparse
+import logging
+import os
+import pty
+import sys
+import time
+import tty
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, crc16_xmodem_update  # noqa: E402
+
+PAYLOAD = (
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)"
+)
+REPLIES = {
+    "clean": PAYLOAD + crc16_xmodem_update(0, PAYLOAD).to_bytes(2, "big") + b"\r",
+    "bad CRC": PAYLOAD + b"\x00\x00\r",
+}
+
+
+def time_cycles(monitor, master, reply, cycles):
+    """Seconds spent in read_command over cycles reads."""
+    total = 0.0
+    for _ in range(cycles):
+        os.write(master, reply)
+        started = time.perf_counter()
+        monitor.read_command("QPIGS")
+        total += time.perf_counter() - started
+        os.read(master, 64)  # the command we sent
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--cycles", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    os.environ["DEVICE"] = os.ttyname(slave)
+    os.environ["ADAPTIVE_DEADLINE"] = "false"
+    root = logging.getLogger()
+    for handler in root.handlers:
+        handler.setStream(open(os.devnull, "w"))
+    monitor = MPPSolarMonitor()
+    module_logger = logging.getLogger("mpp_solar_monitor")
+    logging.disable(logging.CRITICAL)
+    time_cycles(monitor, master, REPLIES["clean"], args.cycles)  # warm up
+
+    modes = {
+        "logging off": (logging.CRITICAL, None),
+        "INFO": (logging.NOTSET, logging.INFO),
+        "DEBUG": (logging.NOTSET, logging.DEBUG),
+    }
+    cases = [
+        (reply_name, interval, mode)
+        for reply_name in REPLIES
+        for interval in ((300.0, 0.0) if reply_name == "bad CRC" else (300.0,))
+        for mode in modes
+    ]
+    best = {}
+    # Modes take turns within each repeat, so drift on a busy machine hits them alike
+    for _ in range(args.repeat):
+        for case in cases:
+            reply_name, interval, mode = case
+            disabled, level = modes[mode]
+            logging.disable(disabled)
+            module_logger.setLevel(level or logging.INFO)
+            monitor.warnings.interval = interval
+            elapsed = time_cycles(monitor, master, REPLIES[reply_name], args.cycles)
+            best[case] = min(best.get(case, elapsed), elapsed)
+
+    print(f"{args.cycles} QPIGS reads per run, best of {args.repeat}, us per cycle")
+    for reply_name, interval, mode in cases:
+        per_cycle = best[reply_name, interval, mode] / args.cycles * 1e6
+        baseline = best[reply_name, interval, "logging off"] / args.cycles * 1e6
+        label = f"{reply_name}, {'aggregated' if interval else 'every warning'}, {mode}"
+        print(f"{label:38s} {per_cycle:8.1f} us  logging +{per_cycle - baseline:6.1f} us")
+    logging.disable(logging.NOTSET)
+    monitor.session.close()
+    os.close(master)
+    os.close(slave)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Throughput of bulk QPIGS decoding, in samples per second.
+
+Decodes the same synthetic replies (both layouts, varying values) one by
+one with parse_qpigs() and with the per-layout decoder, and as a
+batch with QPIGSBatchDecoder (only when NumPy is installed: without it
+the batch decoder calls parse_qpigs() per row).
+Every path is checked to produce the same values as parse_qpigs().
+
+Usage: python benchmarks/bench_qpigs_batch.py [--samples N] [--repeat N] [--odd-rate P]
+"""
+
+import argparse
+import logging
+import random
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, QPIGSDecoder  # noqa: E402
+from qpigs_batch import QPIGSBatchDecoder, numpy  # noqa: E402
+
+
+def synthetic_replies(count: int, odd_rate: float = 0.0, seed: int = 0) -> list[bytes]:
+    """'(...)' QPIGS replies in the fixed-width PI30 format, half per layout."""
+    rng = random.Random(seed)
+    replies = []
+    for i in range(count):
+        fields = [
+            f"{rng.uniform(0, 260):05.1f}", f"{rng.uniform(49, 51):04.1f}", f"{rng.uniform(220, 240):05.1f}",
+            f"{rng.uniform(49, 51):04.1f}", f"{rng.randrange(6000):04d}", f"{rng.randrange(6000):04d}",
+            f"{rng.randrange(120):03d}", f"{rng.randrange(500):03d}", f"{rng.uniform(40, 60):05.2f}",
+            f"{rng.randrange(200):03d}", f"{rng.randrange(101):03d}", f"{rng.randrange(80):04d}",
+            f"{rng.uniform(0, 20):04.1f}", f"{rng.uniform(0, 400):05.1f}", f"{rng.uniform(40, 60):05.2f}",
+            f"{rng.randrange(200):05d}",
+        ]
+        status = "".join(rng.choice("01") for _ in range(8))
+        if i % 2:
+            fields += [status, "00", "00", f"{rng.randrange(6000):05d}", "010"]
+        else:
+            fields += [f"{rng.randrange(200):05d}", "00", "00", f"{rng.randrange(6000):05d}", status]
+        if rng.random() < odd_rate:
+            # A value the fixed-width path cannot take, decoded one by one instead
+            fields[19] = str(rng.randrange(6000))
+        replies.append(("(" + " ".join(fields) + ")").encode())
+    return replies
+
+
+def best_of(repeat, func):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def as_rows(columns) -> list[dict]:
+    lists = {name: column.tolist() if hasattr(column, "tolist") else column for name, column in columns.items()}
+    return [dict(zip(lists, row)) for row in zip(*lists.values())]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--odd-rate", type=float, default=0.0, help="share of replies with a non fixed-width field")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    monitor = MPPSolarMonitor()
+    replies = synthetic_replies(args.samples, args.odd_rate)
+    texts = [reply.decode() for reply in replies]
+
+    def per_row():
+        return [monitor.parse_qpigs(text[1:-1].split()) for text in texts]
+
+    decoders = {}
+
+    def per_row_compiled():
+        result = []
+        for text in texts:
+            values = text[1:-1].split()
+            layout = (len(values), *monitor.detect_qpigs_layout(values))
+            decoder = decoders.get(layout) or decoders.setdefault(layout, QPIGSDecoder(*layout))
+            result.append(decoder.decode(values))
+        return result
+
+    cases = {
+        "parse_qpigs per row": per_row,
+        "layout per row": per_row_compiled,
+    }
+    if numpy is not None:
+        cases["batch, numpy"] = QPIGSBatchDecoder(monitor.parse_qpigs, use_numpy=True).decode
+    else:
+        print("NumPy not installed, skipping the NumPy decoder")
+
+    expected = per_row()
+    baseline = None
+    print(f"{args.samples} replies, odd rate {args.odd_rate:g}, best of {args.repeat}")
+    for name, func in cases.items():
+        elapsed, result = best_of(args.repeat, lambda: func(replies) if "batch" in name else func())
+        # Checked outside the timing: batches return columns, not a dict per row
+        rows = as_rows(result) if isinstance(result, dict) else result
+        assert rows == expected, f"{name} differs from parse_qpigs()"
+        baseline = baseline or elapsed
+        print(f"{name:20s} {elapsed * 1000:9.1f} ms {args.samples / elapsed:12,.0f} samples/s  x{baseline / elapsed:5.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: per-frame QPIGS decoding.
+
+Compares the generic parser, which re-detects the layout on every frame,
+with the per-layout decoder set up once the layout has been learned. The two take
+turns within each repeat so drift on a busy machine hits them alike.
+
+Usage: python benchmarks/bench_qpigs_decode.py [--number N] [--repeat N]
+"""
+
+import argparse
+import logging
+import sys
+import timeit
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, QPIGSDecoder  # noqa: E402
+
+
+LAYOUTS = {
+    "status@16 (21 fields)": (
+        "230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+        "54.00 000 00010000 00 00 00528 010"
+    ).split(),
+    "status@20 (21 fields)": (
+        "230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+        "54.00 000 00012 00 00 00528 00010110"
+    ).split(),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--number", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    monitor = MPPSolarMonitor()
+    print(f"{args.number} frames per run, best of {args.repeat}")
+    for name, values in LAYOUTS.items():
+        decoder = QPIGSDecoder(len(values), *monitor.detect_qpigs_layout(values))
+        assert decoder.decode(values) == monitor.parse_qpigs(values)
+        generic = compiled = float("inf")
+        for _ in range(args.repeat):
+            generic = min(generic, timeit.timeit(lambda: monitor.parse_qpigs(values), number=args.number))
+            compiled = min(compiled, timeit.timeit(lambda: decoder.decode(values), number=args.number))
+        generic_us = generic / args.number * 1e6
+        compiled_us = compiled / args.number * 1e6
+        print(f"{name:24s} generic {generic_us:6.2f} us  layout {compiled_us:6.2f} us  x{generic_us / compiled_us:4.1f}")
+
+
+if __name__ == "__main__":
+    main()
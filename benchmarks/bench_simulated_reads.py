@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""
+End-to-end read behaviour against the PI30 simulator.
+
+For each impairment profile and read deadline, polls QPIGS through the
+real HIDSession/FrameReader path and reports sample latency, deadline
+misses (no data), CRC failures, partial-frame fallbacks and the total time
+spent reading. The deadline "auto" uses the deadline learned from response
+times instead.
+
+Usage: python benchmarks/bench_simulated_reads.py [--samples N] [--deadlines 0.5,1.2,2,auto]
+                                                 [--profile NAME] [--json PATH]
+"""
+
+import argparse
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from mpp_solar_monitor import MPPSolarMonitor  # noqa: E402
+from pi30_simulator import Impairments, PI30Simulator  # noqa: E402
+
+
+PROFILES = {
+    "clean": Impairments(latency=0.02),
+    "slow_reports": Impairments(latency=0.05, report_gap=0.008),
+    "late_crc": Impairments(latency=0.05, report_gap=0.002, crc_delay=0.9),
+    "noisy": Impairments(latency=0.02, noise_rate=0.3, stale_rate=0.1),
+    "corrupt": Impairments(latency=0.02, corrupt_rate=0.1),
+    "lossy": Impairments(latency=0.02, drop_rate=0.1, silent_rate=0.05),
+}
+
+
+class MessageCounter(logging.Handler):
+    """Count monitor log lines that mark CRC failures and fallbacks."""
+
+    PATTERNS = {"crc_failures": "CRC mismatch", "partial": "Using partial", "incomplete": "Incomplete response"}
+
+    def __init__(self):
+        super().__init__(logging.DEBUG)
+        self.counts = dict.fromkeys(self.PATTERNS, 0)
+
+    def emit(self, record):
+        message = record.getMessage()
+        for key, pattern in self.PATTERNS.items():
+            if message.startswith(pattern):
+                self.counts[key] += 1
+
+
+def measure(profile: Impairments, deadline: float | None, samples: int, seed: int = 0) -> dict:
+    counter = MessageCounter()
+    monitor_logger = logging.getLogger("mpp_solar_monitor")
+    monitor_logger.addHandler(counter)
+    latencies = []
+    misses = 0
+    busy = 0.0
+    try:
+        with PI30Simulator(profile, seed=seed) as simulator:
+            os.environ["DEVICE"] = simulator.path
+            monitor = MPPSolarMonitor()
+            if deadline is not None:
+                monitor.adaptive_deadline = False
+                monitor.get_read_deadline_seconds = lambda: deadline
+            try:
+                for _ in range(samples):
+                    started = time.monotonic()
+                    data = monitor.read_command("QPIGS")
+                    busy += time.monotonic() - started
+                    if data is None:
+                        misses += 1
+                    else:
+                        latencies.append(time.monotonic() - started)
+            finally:
+                monitor.session.close()
+    finally:
+        monitor_logger.removeHandler(counter)
+
+    latencies.sort()
+    return {
+        "samples": samples,
+        "ok": len(latencies),
+        "misses": misses,
+        **counter.counts,
+        "latency_p50_ms": round(statistics.median(latencies) * 1000, 1) if latencies else None,
+        "latency_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1) if latencies else None,
+        "busy_s": round(busy, 2),
+        "final_deadline_s": round(monitor.read_deadline("QPIGS"), 3),
+        "simulator": simulator.stats,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--samples", type=int, default=40)
+    parser.add_argument("--deadlines", default="0.5,1.2,2.0,auto")
+    parser.add_argument("--profile", action="append", choices=sorted(PROFILES), help="default: all")
+    parser.add_argument("--json", metavar="PATH")
+    args = parser.parse_args()
+
+    # The monitor logs through the root handlers; keep the table readable
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logging.getLogger("mpp_solar_monitor").setLevel(logging.DEBUG)
+    logging.getLogger("mpp_solar_monitor").propagate = False
+
+    deadlines = [None if value == "auto" else float(value) for value in args.deadlines.split(",")]
+    results = {}
+    print(f"{'profile':14s} {'deadline':>8s} {'final':>6s} {'ok':>4s} {'miss':>4s} {'crc':>4s} {'part':>4s} {'p50 ms':>8s} {'p95 ms':>8s} {'busy s':>7s}")
+    for name in args.profile or PROFILES:
+        for deadline in deadlines:
+            result = measure(PROFILES[name], deadline, args.samples)
+            label = "auto" if deadline is None else f"{deadline:g}"
+            results[f"{name}@{label}"] = result
+            print(
+                f"{name:14s} {label:>8s} {result['final_deadline_s']:6.2f} {result['ok']:4d} {result['misses']:4d} "
+                f"{result['crc_failures']:4d} {result['partial']:4d} "
+                f"{result['latency_p50_ms'] or 0:8.1f} {result['latency_p95_ms'] or 0:8.1f} {result['busy_s']:7.2f}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+            f.write("\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Decode stored QPIGS replies in bulk and export them column by column.
+
+Input is frame captures (`capture_frames: true`, files or directories;
+every QPIGS frame the add-on cut out, with its time) or text files with
+one reply per line. Replies are decoded with QPIGSBatchDecoder from
+qpigs_batch.py, which follows parse_qpigs() but works on whole columns
+with NumPy (without NumPy, or with --no-numpy, reply by reply).
+
+The output format follows the file extension: .csv, .npz (NumPy) or
+.parquet (pyarrow).
+
+Usage:
+    python benchmarks/export_qpigs.py /data/captures --output qpigs.parquet
+    python benchmarks/export_qpigs.py replies.txt --output qpigs.csv [--no-numpy]
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import FrameCapture, MPPSolarMonitor, capture_name, read_capture  # noqa: E402
+from qpigs_batch import QPIGSBatchDecoder  # noqa: E402
+
+
+def captured_replies(path):
+    """(time sent, frame) of every QPIGS frame in one capture file."""
+    command = sent = None
+    for when, kind, data in read_capture(path):
+        if kind == FrameCapture.COMMAND:
+            command, sent = bytes(data[:-3]), when
+        elif kind == FrameCapture.FRAME and command == b"QPIGS":
+            yield sent, data
+
+
+def load_replies(paths):
+    """Times (None for text input) and replies from all inputs, in order."""
+    times, replies = [], []
+    for path in paths:
+        entries = sorted(os.path.join(path, entry) for entry in os.listdir(path)) if os.path.isdir(path) else [path]
+        for entry in entries:
+            if capture_name(entry) is not None:
+                for when, frame in captured_replies(entry):
+                    times.append(when)
+                    replies.append(frame)
+            elif not os.path.isdir(path):
+                with open(entry, "rb") as f:
+                    for line in f:
+                        if line.strip():
+                            times.append(None)
+                            replies.append(line)
+    return times, replies
+
+
+def write_columns(columns: dict, path: str):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".npz":
+        import numpy
+        numpy.savez_compressed(path, **columns)
+    elif extension == ".parquet":
+        import pyarrow
+        import pyarrow.parquet
+        pyarrow.parquet.write_table(pyarrow.table(columns), path)
+    elif extension == ".csv":
+        lists = [column.tolist() if hasattr(column, "tolist") else column for column in columns.values()]
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns)
+            writer.writerows(zip(*lists))
+    else:
+        raise ValueError(f"Unsupported output format {extension!r}, use .csv, .npz or .parquet")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", metavar="INPUT", help="capture files, directories or text files")
+    parser.add_argument("--output", required=True, metavar="PATH", help=".csv, .npz or .parquet")
+    parser.add_argument("--no-numpy", action="store_true", help="decode reply by reply with parse_qpigs()")
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    times, replies = load_replies(args.paths)
+    decoder = QPIGSBatchDecoder(MPPSolarMonitor().parse_qpigs, use_numpy=False if args.no_numpy else None)
+    started = time.perf_counter()
+    columns = decoder.decode(replies, times if any(when is not None for when in times) else None)
+    elapsed = time.perf_counter() - started
+    write_columns(columns, args.output)
+
+    rows = len(columns["battery_voltage"])
+    print(
+        f"{rows} of {len(replies)} replies decoded ({decoder.fallback_rows} one by one, {decoder.rejected} rejected) "
+        f"in {elapsed:.2f}s ({len(replies) / elapsed if elapsed else 0:.0f} replies/s) -> {args.output}"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Fake PI30 inverter on a pseudo-terminal.
+
+The slave side of the pty stands in for /dev/hidrawN, so the monitor can
+open it as DEVICE. Replies come from benchmarks/fixtures/pi30_replies.json
+and are delivered as NUL padded HID reports, with optional latency, slow
+reports, late CRC bytes, noise, stale replies, corruption and dropped
+bytes. Impairments are drawn from a seeded RNG so runs are repeatable.
+
+Usage: python benchmarks/pi30_simulator.py [--latency S] [--corrupt-rate P] ...
+       (prints the device path, then serves until interrupted)
+"""
+
+import argparse
+import json
+import os
+import pty
+import random
+import select
+import sys
+import threading
+import time
+import tty
+from dataclasses import dataclass
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import crc16_xmodem_update  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "pi30_replies.json"
+
+# Fixture reply used for each command; anything else is answered with NAK
+FIXTURE_REPLIES = {
+    "QPIGS": "qpigs_status16",
+    "QMOD": "qmod",
+    "QPIWS": "qpiws",
+    "QPIRI": "qpiri",
+}
+NAK_PAYLOAD = b"(NAKss"
+
+
+def default_replies(path=FIXTURES) -> dict[str, bytes]:
+    """Command -> reply payload ('(...)' without CRC and CR)."""
+    with open(path) as f:
+        replies = json.load(f)["replies"]
+    return {command: bytes.fromhex(replies[name])[:-3] for command, name in FIXTURE_REPLIES.items()}
+
+
+def frame(payload: bytes) -> bytes:
+    return payload + crc16_xmodem_update(0, payload).to_bytes(2, "big") + b"\r"
+
+
+@dataclass
+class Impairments:
+    """What can go wrong between the inverter and the host."""
+    latency: float = 0.0          # seconds before the first report
+    jitter: float = 0.0           # uniform extra latency, seconds
+    report_size: int = 8          # HID report size; replies are NUL padded to it
+    report_gap: float = 0.0       # seconds between reports
+    crc_delay: float = 0.0        # extra delay before the report carrying the CRC
+    noise_rate: float = 0.0       # probability of garbage before the reply
+    stale_rate: float = 0.0       # probability the previous reply is resent first
+    corrupt_rate: float = 0.0     # probability one payload byte is flipped
+    drop_rate: float = 0.0        # probability one byte of the frame is lost
+    silent_rate: float = 0.0      # probability of no reply at all
+
+
+class PI30Simulator:
+    """Serve PI30 replies on a raw pty until stopped."""
+
+    def __init__(self, impairments: Impairments | None = None, replies: dict[str, bytes] | None = None,
+                 seed: int | None = 0):
+        self.impairments = impairments or Impairments()
+        self.replies = replies or default_replies()
+        self.rng = random.Random(seed)
+        self.stats = dict.fromkeys(
+            ("commands", "replies", "silent", "noise", "stale", "corrupted", "dropped"), 0
+        )
+        self._master = None
+        self._slave = None
+        self.path = None
+        self._stop = threading.Event()
+        self._thread = None
+        self._last_wire = None
+
+    def start(self) -> str:
+        self._master, self._slave = pty.openpty()
+        tty.setraw(self._slave)
+        self.path = os.ttyname(self._slave)
+        self._thread = threading.Thread(target=self._serve, name="pi30-simulator", daemon=True)
+        self._thread.start()
+        return self.path
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(2.0)
+        for fd in (self._master, self._slave):
+            if fd is not None:
+                os.close(fd)
+        self._master = self._slave = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _serve(self):
+        pending = b""
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.05)
+            if not ready:
+                continue
+            try:
+                pending += os.read(self._master, 512)
+            except OSError:
+                return
+            while True:
+                command, pending = self._take_command(pending)
+                if command is None:
+                    break
+                self._answer(command)
+
+    def _take_command(self, pending: bytes):
+        """Split one '<command><crc16>\\r' off the input."""
+        # The CRC itself may contain 0x0d, so match known commands first
+        for command in self.replies:
+            size = len(command) + 3
+            if pending.startswith(command.encode()) and len(pending) >= size and pending[size - 1] == 0x0D:
+                return command, pending[size:]
+        end = pending.find(b"\r", 3)
+        if end == -1:
+            return None, pending
+        return pending[:end - 2].decode("ascii", "replace"), pending[end + 1:]
+
+    def _answer(self, command: str):
+        imp, rng = self.impairments, self.rng
+        self.stats["commands"] += 1
+        if rng.random() < imp.silent_rate:
+            self.stats["silent"] += 1
+            return
+
+        wire = bytearray(frame(self.replies.get(command, NAK_PAYLOAD)))
+        clean = bytes(wire)
+        if rng.random() < imp.corrupt_rate:
+            wire[rng.randrange(1, len(wire) - 4)] ^= 0x20
+            self.stats["corrupted"] += 1
+        if rng.random() < imp.drop_rate:
+            del wire[rng.randrange(1, len(wire))]
+            self.stats["dropped"] += 1
+        if rng.random() < imp.noise_rate:
+            wire[:0] = bytes(rng.randrange(256) for _ in range(rng.randrange(1, 8))).replace(b"(", b"")
+            self.stats["noise"] += 1
+        if self._last_wire and rng.random() < imp.stale_rate:
+            wire[:0] = self._last_wire
+            self.stats["stale"] += 1
+        self._last_wire = clean
+
+        time.sleep(imp.latency + rng.uniform(0, imp.jitter))
+        size = imp.report_size
+        reports = [bytes(wire[i:i + size]).ljust(size, b"\0") for i in range(0, len(wire), size)]
+        crc_report = (len(wire) - 3) // size
+        for index, report in enumerate(reports):
+            if index and imp.report_gap:
+                time.sleep(imp.report_gap)
+            if index == crc_report and imp.crc_delay:
+                time.sleep(imp.crc_delay)
+            if self._stop.is_set():
+                return
+            os.write(self._master, report)
+        self.stats["replies"] += 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    for name, default in vars(Impairments()).items():
+        parser.add_argument(f"--{name.replace('_', '-')}", type=type(default), default=default)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    impairments = Impairments(**{name: getattr(args, name) for name in vars(Impairments())})
+    with PI30Simulator(impairments, seed=args.seed) as simulator:
+        print(simulator.path, flush=True)
+        try:
+            while True:
+                time.sleep(60)
+                print(simulator.stats, flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,205 @@
+"""
+Bulk QPIGS decoding for offline analysis, used by export_qpigs.py.
+
+Not used by the add-on itself: it decodes one reply per cycle with
+QPIGSDecoder. This module decodes whole recordings column by column with
+NumPy; without NumPy it still works, one parse_qpigs() call per reply,
+but is no faster than that.
+"""
+
+import operator
+import sys
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import QPIGS_FIELDS  # noqa: E402
+
+try:
+    import numpy
+except ImportError:  # optional
+    numpy = None
+
+
+class QPIGSBatchDecoder:
+    """Decode many stored QPIGS payloads into columns in one pass.
+
+    For analysing long recordings, where a dict per sample is too slow.
+    PI30 fields are fixed width, so payloads are grouped by shape (their
+    field widths) and each group is parsed as one NumPy byte matrix:
+    digits are checked and weighted per field, layouts and status bits are
+    read from their columns. Layout detection and the derived fields follow
+    parse_qpigs(); rows that do not fit their group (other widths, signs,
+    garbage) are passed to parse_row one by one, and rows it rejects are
+    left out. Without NumPy every row goes to parse_row: the speedup needs
+    NumPy. Columns are in input order; NumPy arrays when NumPy is used,
+    else lists.
+    """
+
+    # Rows with the same shape (field widths and dots) share one layout
+    SHAPE = bytes.maketrans(b'123456789', b'000000000')
+
+    def __init__(self, parse_row, use_numpy: bool | None = None):
+        if use_numpy and numpy is None:
+            raise RuntimeError("NumPy is not installed")
+        self.parse_row = parse_row
+        self.np = numpy if use_numpy is not False else None
+        names = [name for name, _, _ in QPIGS_FIELDS]
+        names.insert(11, 'battery_discharge_current')
+        self.columns = (*names, 'device_status', 'pv_input_power', 'battery_power',
+                        'load_on', 'scc_charging', 'ac_charging')
+        self.dtypes = {name: conv for name, _, conv in QPIGS_FIELDS}
+        self.dtypes.update(battery_discharge_current=int, device_status=str, pv_input_power=int,
+                           battery_power=float, load_on=bool, scc_charging=bool, ac_charging=bool)
+        # Rows of the last decode() that went through parse_row, and that it rejected
+        self.fallback_rows = 0
+        self.rejected = 0
+
+    def decode(self, payloads, times=None) -> dict:
+        """Column name -> values; 'time' first when times are given."""
+        texts = [_qpigs_text(payload) for payload in payloads]
+        self.fallback_rows = self.rejected = 0
+        if self.np is not None:
+            parts, leftovers = self._decode_numpy(texts)
+        else:
+            parts, leftovers = [], list(range(len(texts)))
+        if leftovers:
+            parts.append(self._decode_rows(texts, leftovers))
+        return self._assemble(parts, times)
+
+    def _group_by_shape(self, texts):
+        groups = {}
+        for i, text in enumerate(texts):
+            groups.setdefault(text.translate(self.SHAPE), []).append(i)
+        return groups.values()
+
+    def _decode_numpy(self, texts):
+        np = self.np
+        parts, leftovers = [], []
+        for rows in self._group_by_shape(texts):
+            template = texts[rows[0]]
+            length = len(template)
+            values = template.split(b' ')
+            if len(values) < 17 or b'' in values:
+                leftovers += rows
+                continue
+            spans, start = [], 0
+            for value in values:
+                spans.append((start, start + len(value)))
+                start += len(value) + 1
+            matrix = np.frombuffer(b''.join([texts[i] for i in rows]), np.uint8).reshape(len(rows), length)
+            shape = np.frombuffer(template, np.uint8)
+            separators, dots = shape == 32, shape == 46
+            digits = ~(separators | dots)
+            # uint8 arithmetic wraps, so anything but '0'..'9' ends up above 9
+            fits = (matrix[:, separators] == 32).all(1) & (matrix[:, dots] == 46).all(1)
+            fits &= ((matrix[:, digits] - 48) <= 9).all(1)
+
+            def looks_like_status(index):
+                if index >= len(spans) or not 8 <= spans[index][1] - spans[index][0] <= 12:
+                    return np.zeros(len(rows), bool)
+                return ((matrix[:, spans[index][0]:spans[index][1]] - 48) <= 1).all(1)
+
+            status_at_20 = looks_like_status(20)
+            status_at_16 = looks_like_status(16) & ~status_at_20
+            indices = np.asarray(rows)
+            leftovers += indices[~(fits & (status_at_20 | status_at_16))].tolist()
+            for status_idx, discharge_idx, mask in ((20, 16, status_at_20), (16, 15, status_at_16)):
+                mask = mask & fits
+                if mask.any():
+                    part = self._columns_from_matrix(matrix[mask], spans, template, status_idx, discharge_idx)
+                    if part is None:
+                        leftovers += indices[mask].tolist()
+                    else:
+                        parts.append((indices[mask], part))
+        return parts, leftovers
+
+    def _columns_from_matrix(self, matrix, spans, template, status_idx, discharge_idx):
+        np = self.np
+        fields = list(QPIGS_FIELDS)
+        fields.insert(11, ('battery_discharge_current', discharge_idx, int))
+        if len(spans) > 19:
+            fields.append(('pv_input_power', 19, int))
+        columns = {}
+        for name, index, converter in fields:
+            start, end = spans[index]
+            dot = template.find(b'.', start, end)
+            if end - start > 15 or (dot != -1 and converter is int):
+                # int() would reject it, or it could overflow: leave it to parse_row
+                return None
+            places = [column for column in range(start, end) if column != dot]
+            weights = 10 ** np.arange(len(places) - 1, -1, -1, dtype=np.int64)
+            number = (matrix[:, places].astype(np.int64) - 48) @ weights
+            # One correctly rounded division, the same double float() parses
+            columns[name] = number / 10.0 ** (end - dot - 1) if dot != -1 else number.astype(converter)
+        if 'pv_input_power' not in columns:
+            power = np.rint(columns['pv_input_voltage'] * columns['pv_input_current'])
+            columns['pv_input_power'] = power.astype(np.int64)
+        start, end = spans[status_idx]
+        status = np.ascontiguousarray(matrix[:, start:end])
+        columns['device_status'] = status.view(f'S{end - start}').ravel().astype(f'U{end - start}')
+        battery_current = columns['battery_charging_current'] - columns['battery_discharge_current']
+        # numpy.round() scales by 10 first and disagrees with round() in the last digit
+        columns['battery_power'] = np.array(
+            [round(power, 1) for power in (columns['battery_voltage'] * battery_current).tolist()]
+        )
+        columns['load_on'] = status[:, 4] == 49
+        columns['scc_charging'] = status[:, 6] == 49
+        columns['ac_charging'] = status[:, 7] == 49
+        return columns
+
+    def _decode_rows(self, texts, rows):
+        self.fallback_rows = len(rows)
+        kept = []
+        columns = {name: [] for name in self.columns}
+        for i in rows:
+            data = self.parse_row(texts[i].decode('ascii', 'ignore').split())
+            if data is None:
+                self.rejected += 1
+                continue
+            kept.append(i)
+            for name, column in columns.items():
+                column.append(data[name])
+        if self.np is not None:
+            dtypes = {float: self.np.float64, int: self.np.int64, bool: bool, str: str}
+            columns = {
+                name: self.np.array(column, dtype=dtypes[self.dtypes[name]]) for name, column in columns.items()
+            }
+            kept = self.np.array(kept, dtype=self.np.int64)
+        return kept, columns
+
+    def _assemble(self, parts, times) -> dict:
+        np = self.np
+        result = {}
+        if np is not None:
+            if not parts:
+                parts = [self._decode_rows([], [])]
+            rows = np.concatenate([np.asarray(rows, dtype=np.int64) for rows, _ in parts])
+            order = np.argsort(rows, kind='stable')
+            if times is not None:
+                result['time'] = np.asarray(times)[rows[order]]
+            for name in self.columns:
+                result[name] = np.concatenate([columns[name] for _, columns in parts])[order]
+            return result
+        rows = [i for part_rows, _ in parts for i in part_rows]
+        order = sorted(range(len(rows)), key=rows.__getitem__)
+        if len(order) < 2:
+            reorder = lambda values: list(values)  # noqa: E731
+        else:
+            getter = operator.itemgetter(*order)
+            reorder = lambda values: list(getter(values))  # noqa: E731
+        if times is not None:
+            result['time'] = reorder([times[i] for i in rows])
+        for name in self.columns:
+            result[name] = reorder([value for _, columns in parts for value in columns[name]])
+        return result
+
+
+def _qpigs_text(payload) -> bytes:
+    """Fields of a QPIGS reply, '(...)' with or without CRC, as bytes."""
+    if isinstance(payload, str):
+        payload = payload.encode('ascii', 'ignore')
+    start = payload.find(b'(') + 1
+    end = payload.find(b')', start)
+    return bytes(payload[start:end if end != -1 else len(payload)]).strip()
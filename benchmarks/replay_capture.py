@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+"""
+Replay frame captures through the current framing, CRC and parsers.
+
+Captures are written by the add-on with `capture_frames: true` to
+/data/captures. Every recorded command, chunk and reset is fed through
+the real FrameReader / _finish_read path as fast as possible, so field
+data can be re-run against a new parser version. Frames cut out during
+replay are checked against the frames the add-on cut out live.
+
+Write the decoded readings with --output and compare a later run with
+--baseline; the exit status is 1 when any reading or frame differs.
+
+Usage:
+    python benchmarks/replay_capture.py CAPTURE... [--output readings.jsonl]
+    python benchmarks/replay_capture.py /data/captures --baseline readings.jsonl [--show 10]
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict, deque
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    FrameCapture,
+    FrameReader,
+    MPPSolarMonitor,
+    capture_name,
+    read_capture,
+)
+
+
+class ReplaySession:
+    """Stands in for HIDSession, serving recorded reads instead of the device."""
+
+    def __init__(self):
+        self.device = "replay"
+        self.fd = -1
+        self.buffer = b""
+        self.buffer_command = None
+        self.open_count = 1
+        self.reopen_count = 0
+        # _finish_read records the frames it cuts out here
+        self.capture = self
+        self.frames = []
+        self.pending = deque()
+        self.write_resets = 0
+
+    def open(self):
+        return self.fd
+
+    def close(self):
+        pass
+
+    def reopen(self, during="read"):
+        self.buffer = b""
+        self.reopen_count += 1
+        return self.fd
+
+    def write(self, data):
+        # The live write failed and reopened the node before it went through
+        for _ in range(self.write_resets):
+            self.reopen("write")
+        self.write_resets = 0
+        return len(data)
+
+    def read(self, size=512):
+        kind, data = self.pending.popleft()
+        if kind == FrameCapture.RESET:
+            self.reopen()
+            return b""
+        return bytes(data)
+
+    def record(self, kind, data=b"", now=None):
+        if kind == FrameCapture.FRAME:
+            self.frames.append(bytes(data))
+
+
+def replay(monitor, records):
+    """Yield (time, command, reading, frame matches) per recorded read."""
+    session = monitor.session
+    reader = command = started = None
+    live_frame = None
+
+    def finish():
+        nonlocal reader
+        count = len(session.frames)
+        reading = monitor._finish_read(reader, command)
+        frame = session.frames[-1] if len(session.frames) > count else None
+        reader = None
+        return started, command, reading, frame == live_frame
+
+    for wall, kind, data in records:
+        if kind == FrameCapture.CHUNK or (kind == FrameCapture.RESET and data != b"write"):
+            if reader is not None:
+                session.pending.append((kind, data))
+                reader.read_chunk()
+        elif kind == FrameCapture.FRAME:
+            # Recorded by the live _finish_read, so the read ended here
+            live_frame = bytes(data)
+            if reader is not None:
+                yield finish()
+        else:
+            if reader is not None:
+                live_frame = None
+                yield finish()
+            if kind == FrameCapture.RESET:
+                session.write_resets += 1
+                continue
+            command = data[:-3].decode("ascii", "replace")
+            started = wall
+            monitor._send_command(command)
+            reader = FrameReader(session)
+    if reader is not None:
+        live_frame = None
+        yield finish()
+
+
+def capture_files(paths) -> dict[str, list[str]]:
+    """Capture name -> its files in order; directories are searched."""
+    found = defaultdict(list)
+    for path in paths:
+        entries = [os.path.join(path, entry) for entry in os.listdir(path)] if os.path.isdir(path) else [path]
+        for entry in entries:
+            name = capture_name(entry)
+            if name is not None:
+                found[name].append(entry)
+    return {name: sorted(files) for name, files in sorted(found.items())}
+
+
+def replay_files(files):
+    monitor = MPPSolarMonitor(device="replay")
+    monitor.session = ReplaySession()
+    for path in files:
+        yield from replay(monitor, read_capture(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+", metavar="CAPTURE", help="capture files or directories")
+    parser.add_argument("--output", metavar="PATH", help="write the readings as JSON lines")
+    parser.add_argument("--baseline", metavar="PATH", help="compare with the readings of an earlier run")
+    parser.add_argument("--show", type=int, default=5, help="differences to print (default: 5)")
+    parser.add_argument("--verbose", action="store_true", help="keep the monitor's warnings")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.CRITICAL)
+    logging.getLogger("mpp_solar_monitor").setLevel(logging.WARNING if args.verbose else logging.CRITICAL)
+
+    captures = capture_files(args.paths)
+    if not captures:
+        parser.error("no capture files found")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = [json.loads(line) for line in f]
+    output = open(args.output, "w") if args.output else None
+
+    reads = decoded = frame_mismatches = differences = 0
+    started = time.perf_counter()
+    try:
+        for name, files in captures.items():
+            for when, command, reading, frame_ok in replay_files(files):
+                line = {"capture": name, "time": round(when, 3), "command": command, "reading": reading}
+                if output is not None:
+                    output.write(json.dumps(line, default=str) + "\n")
+                if not frame_ok:
+                    frame_mismatches += 1
+                if baseline is not None:
+                    expected = baseline[reads] if reads < len(baseline) else None
+                    actual = json.loads(json.dumps(line, default=str))
+                    if actual != expected:
+                        differences += 1
+                        if differences <= args.show:
+                            print(f"{name} {command} @ {when:.3f}:\n  baseline: {expected}\n  replayed: {actual}")
+                reads += 1
+                decoded += reading is not None
+    finally:
+        if output is not None:
+            output.close()
+    elapsed = time.perf_counter() - started
+
+    print(
+        f"{reads} reads from {sum(len(files) for files in captures.values())} files, {decoded} decoded, "
+        f"{frame_mismatches} frame mismatches, {elapsed:.2f}s ({reads / elapsed if elapsed else 0:.0f} reads/s)"
+    )
+    if baseline is not None:
+        differences += max(0, len(baseline) - reads)
+        print(f"{differences} readings differ from {args.baseline}")
+    return 1 if frame_mismatches or differences else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
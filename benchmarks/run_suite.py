@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the read/parse/publish hot path.
+
+Runs offline against the fixtures in benchmarks/fixtures, prints a table
+and optionally writes machine-readable JSON. With --baseline, every case
+is compared with a previous JSON result and the exit status is 1 when any
+case got slower by more than --threshold (a fraction, 0.25 = 25%).
+
+Usage:
+    python benchmarks/run_suite.py [--number N] [--json results.json]
+    python benchmarks/run_suite.py --baseline baseline.json [--threshold 0.25]
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import sys
+import timeit
+from pathlib import Path
+from types import SimpleNamespace
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, QPIGSDecoder  # noqa: E402
+
+FIXTURES = Path(__file__).resolve().parent / "fixtures" / "pi30_replies.json"
+
+
+def load_fixtures(path=FIXTURES):
+    with open(path) as f:
+        raw = json.load(f)
+    size = raw["report_size"]
+    replies = {name: bytes.fromhex(wire) for name, wire in raw["replies"].items()}
+    return SimpleNamespace(
+        replies=replies,
+        reports={
+            name: [wire[i:i + size].ljust(size, b"\0") for i in range(0, len(wire), size)]
+            for name, wire in replies.items()
+        },
+        noise=bytes.fromhex(raw["noise_prefix"]),
+        partial=bytes.fromhex(raw["partial_qpigs"]),
+    )
+
+
+class _DiscardingClient:
+    def publish(self, topic, payload, qos=0, retain=False):
+        return SimpleNamespace(rc=0)
+
+
+def build_cases(fixtures):
+    """Name -> zero-argument callable, one hot-path operation each."""
+    monitor = MPPSolarMonitor()
+    monitor.mqtt_client = _DiscardingClient()
+
+    qpigs = fixtures.replies["qpigs_status16"]
+    payload = qpigs[:qpigs.index(b")") + 1]
+    noisy = fixtures.noise + qpigs + fixtures.noise
+    values16 = monitor.extract_values_from_response(fixtures.replies["qpigs_status16"])
+    values20 = monitor.extract_values_from_response(fixtures.replies["qpigs_status20"])
+    decoder16 = QPIGSDecoder(len(values16), *monitor.detect_qpigs_layout(values16))
+    sample = monitor.parse_qpigs(values16)
+
+    def fragmented():
+        response = b""
+        for report in fixtures.reports["qpigs_status16"]:
+            response += report
+            frame, remaining = monitor.extract_complete_response_frame(response)
+            if frame is not None:
+                return frame
+
+    def noisy_stream():
+        return monitor.extract_complete_response_frame(noisy)
+
+    def publish_json():
+        # Defeat change detection so every call serialises and publishes
+        monitor.publish_filter.reset()
+        monitor.publish_data(dict(sample))
+
+    return {
+        "crc16_xmodem": lambda: monitor.crc16_xmodem(payload),
+        "extract_frame_fragmented": fragmented,
+        "extract_frame_noisy": noisy_stream,
+        "extract_values_complete": lambda: monitor.extract_values_from_response(qpigs),
+        "extract_values_partial": lambda: monitor.extract_values_from_response(fixtures.partial),
+        "parse_qpigs_status16": lambda: monitor.parse_qpigs(values16),
+        "parse_qpigs_status20": lambda: monitor.parse_qpigs(values20),
+        "decode_qpigs_compiled": lambda: decoder16.decode(values16),
+        "publish_data_json": publish_json,
+    }
+
+
+def run(cases, number, repeat):
+    results = {}
+    for name, func in cases.items():
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        results[name] = {"us_per_op": round(best / number * 1e6, 3), "number": number, "repeat": repeat}
+    return results
+
+
+def compare(results, baseline, threshold):
+    """Cases slower than baseline by more than threshold, as (name, ratio)."""
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before:
+            continue
+        ratio = result["us_per_op"] / before["us_per_op"]
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=5000, help="calls per timing run")
+    parser.add_argument("--repeat", type=int, default=7, help="timing runs per case; the fastest counts")
+    parser.add_argument("--json", metavar="PATH", help="write results as JSON")
+    parser.add_argument("--baseline", metavar="PATH", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown vs baseline (default 0.25)")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.CRITICAL)
+    results = run(build_cases(load_fixtures()), args.number, args.repeat)
+    report = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "results": results,
+    }
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    for name, result in results.items():
+        line = f"{name:28s} {result['us_per_op']:9.3f} us/op"
+        before = baseline and baseline.get("results", {}).get(name)
+        if before:
+            line += f"  x{result['us_per_op'] / before['us_per_op']:5.2f} vs baseline"
+        print(line)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+
+    if baseline:
+        regressions = compare(results, baseline, args.threshold)
+        for name, ratio in regressions:
+            print(f"REGRESSION {name}: {ratio:.2f}x baseline (threshold {1 + args.threshold:.2f}x)")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
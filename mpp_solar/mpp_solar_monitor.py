@@ -6,9 +6,30 @@ Reads data from MPP Solar inverter and publishes to MQTT
 
 import os
 import sys
+import csv
+import argparse
 import json
 import time
+import errno
+import asyncio
+import threading
+import contextvars
+import select
+import socket
+import termios
+import random
 import logging
+import bisect
+import ctypes
+import hashlib
+import http.server
+import urllib.parse
+import mmap
+import struct
+import zlib
+import gzip
+import math
+from collections import deque
 from datetime import datetime, timezone
 import paho.mqtt.client as mqtt
 
@@ -20,35 +41,2660 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-class MPPSolarMonitor:
+# Inverter a log line belongs to when several units are polled (see InverterFleet)
+_current_inverter: contextvars.ContextVar[str] = contextvars.ContextVar('inverter', default='')
+
+
+class _InverterLogFilter(logging.Filter):
+    def filter(self, record):
+        record.inverter = _current_inverter.get() or 'main'
+        return True
+
+
+class WarningAggregator:
+    """Collapse warnings that repeat every cycle into periodic summaries.
+
+    The first message of a kind is logged right away. Repeats within
+    `interval` seconds are only counted, and flush() then logs one line per
+    kind with the count, when it was first and last seen and the latest
+    message. Messages take %-style arguments so repeats are never
+    formatted. An interval of 0 logs every warning.
+    """
+
+    def __init__(self, interval: float, log_to: logging.Logger | None = None):
+        self.interval = interval
+        self.log_to = log_to or logger
+        # kind -> [logged_at, count, first_seen, last_seen, level, message, args]
+        self._kinds: dict[str, list] = {}
+        self.suppressed = 0
+
+    def log(self, kind: str, level: int, message: str, *args, now: float | None = None):
+        now = time.monotonic() if now is None else now
+        entry = self._kinds.get(kind)
+        if self.interval <= 0 or entry is None or (not entry[1] and now - entry[0] >= self.interval):
+            self.log_to.log(level, message, *args)
+            if self.interval > 0:
+                self._kinds[kind] = [now, 0, None, None, level, message, args]
+            return
+        wall = time.time()
+        if not entry[1]:
+            entry[2] = wall
+        entry[1] += 1
+        entry[3:] = wall, level, message, args
+        self.suppressed += 1
+        if now - entry[0] >= self.interval:
+            self._summarize(entry, now)
+
+    def flush(self, now: float | None = None, force: bool = False):
+        """Log the summaries that are due; force logs all pending ones."""
+        now = time.monotonic() if now is None else now
+        for kind, entry in list(self._kinds.items()):
+            if entry[1] and (force or now - entry[0] >= self.interval):
+                self._summarize(entry, now)
+            elif not entry[1] and now - entry[0] >= self.interval:
+                # Quiet for a whole interval: the next one is news again
+                del self._kinds[kind]
+
+    def _summarize(self, entry: list, now: float):
+        _logged_at, count, first, last, level, message, args = entry
+        self.log_to.log(
+            level, message + " (%d more since the last report, first %s, last %s)", *args, count,
+            datetime.fromtimestamp(first).strftime('%H:%M:%S'), datetime.fromtimestamp(last).strftime('%H:%M:%S'),
+        )
+        entry[:3] = now, 0, None
+
+
+# Inverter commands the monitor knows how to poll. "interval" is the default
+# cadence in seconds (0 = every cycle), "parser" the decoding method and
+# "min_values" the number of whitespace-separated fields a reply needs.
+POLL_COMMANDS = {
+    'QPIGS': {'parser': 'decode_qpigs', 'min_values': 17, 'interval': 0},
+    'QPIGS2': {'parser': 'parse_qpigs2', 'min_values': 3, 'interval': 0},
+    'QMOD': {'parser': 'parse_qmod', 'min_values': 1, 'interval': 30},
+    'QPIWS': {'parser': 'parse_qpiws', 'min_values': 1, 'interval': 30},
+    'QPIRI': {'parser': 'parse_qpiri', 'min_values': 18, 'interval': 3600},
+}
+
+DEFAULT_COMMANDS = "QPIGS,QMOD:30,QPIWS:30,QPIRI:3600"
+
+# Energy counter -> (power field, sign); only the positive part is integrated
+ENERGY_COUNTERS = {
+    'pv_energy': ('pv_input_power', 1),
+    'load_energy': ('ac_output_power', 1),
+    'battery_charge_energy': ('battery_power', 1),
+    'battery_discharge_energy': ('battery_power', -1),
+}
+
+# Consecutive frames that must agree on the QPIGS layout before it is compiled
+QPIGS_LAYOUT_CONFIRMATIONS = 3
+
+# Fixed-position QPIGS fields shared by all layouts, in publishing order
+QPIGS_FIELDS = (
+    ('ac_input_voltage', 0, float),
+    ('ac_input_frequency', 1, float),
+    ('ac_output_voltage', 2, float),
+    ('ac_output_frequency', 3, float),
+    ('ac_output_apparent_power', 4, int),
+    ('ac_output_power', 5, int),
+    ('ac_output_load', 6, int),
+    ('bus_voltage', 7, int),
+    ('battery_voltage', 8, float),
+    ('battery_charging_current', 9, int),
+    ('battery_capacity', 10, int),
+    # battery_discharge_current goes here, its index depends on the layout
+    ('inverter_temperature', 11, int),
+    ('pv_input_current', 12, float),
+    ('pv_input_voltage', 13, float),
+    ('battery_scc_voltage', 14, float),
+)
+
+# Histogram buckets (seconds) for device I/O and for in-process work
+IO_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0)
+CPU_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+# Metrics exposed on the Prometheus endpoint: name -> (type, help, buckets)
+METRIC_DEFINITIONS = {
+    'mpp_solar_first_byte_seconds': ('histogram', 'Time from sending a command to the first reply byte', IO_BUCKETS),
+    'mpp_solar_frame_seconds': ('histogram', 'Time from sending a command to a complete reply frame', IO_BUCKETS),
+    'mpp_solar_crc_seconds': ('histogram', 'Time spent scanning and CRC-checking a reply', CPU_BUCKETS),
+    'mpp_solar_parse_seconds': ('histogram', 'Time spent decoding a reply', CPU_BUCKETS),
+    'mpp_solar_publish_seconds': ('histogram', 'Time spent publishing one sample', IO_BUCKETS),
+    'mpp_solar_cycle_seconds': ('histogram', 'Reader cycle time: polling, decoding and queueing a sample', IO_BUCKETS),
+    'mpp_solar_queue_wait_seconds': ('histogram', 'Time a sample waited in the publish queue', IO_BUCKETS),
+    'mpp_solar_queue_depth': ('gauge', 'Samples waiting in the publish queue', None),
+    'mpp_solar_queue_dropped_total': ('counter', 'Samples dropped because the publish queue was full', None),
+    'mpp_solar_schedule_jitter_seconds': ('histogram', 'Lateness of a cycle start against its tick', IO_BUCKETS),
+    'mpp_solar_read_deadline_seconds': ('gauge', 'Read deadline learned from recent response times', None),
+    'mpp_solar_expected_transfer_seconds': ('gauge', 'Learned time from the first reply byte to a complete frame', None),
+    'mpp_solar_crc_mismatches_total': ('counter', 'Replies whose CRC did not match', None),
+    'mpp_solar_partial_frames_total': ('counter', 'Replies decoded from a partial frame', None),
+    'mpp_solar_timeouts_total': ('counter', 'Commands without a complete reply before the deadline', None),
+    'mpp_solar_device_reopens_total': ('counter', 'Times the device node was reopened', None),
+    'mpp_solar_mqtt_disconnects_total': ('counter', 'Unexpected MQTT disconnections', None),
+    'mpp_solar_time_to_first_publish_seconds': ('gauge', 'Seconds from start-up to the first published sample', None),
+    'mpp_solar_mqtt_connect_failures_total': ('counter', 'Failed MQTT connection attempts', None),
+    'mpp_solar_missed_ticks_total': ('counter', 'Cycle ticks skipped because a cycle overran', None),
+    'mpp_solar_warnings_total': ('counter', 'Read problems by kind, also those left out of the log', None),
+    'mpp_solar_publish_sent_total': ('counter', 'State messages sent (entity values with per-sensor topics)', None),
+    'mpp_solar_publish_suppressed_total': (
+        'counter', 'State messages (entity values) not sent because nothing moved past its deadband', None,
+    ),
+    'mpp_solar_publish_failed_total': (
+        'counter', 'State messages (entity values) the MQTT client did not accept', None,
+    ),
+}
+
+# hidraw nodes in sysfs, used to find an inverter by USB vendor/product id
+HIDRAW_SYSFS = '/sys/class/hidraw'
+# How long to wait for a missing device before giving up
+DEVICE_WAIT_SECONDS = 300
+
+# How long to collect retained discovery configs after (re)connecting
+DISCOVERY_SETTLE_SECONDS = 1.0
+
+# How long a replayed sample may wait for the broker's PUBACK before it is sent again
+BACKFILL_ACK_SECONDS = 30.0
+
+DEVICE_MODES = {
+    'P': 'Power On',
+    'S': 'Standby',
+    'L': 'Line',
+    'B': 'Battery',
+    'F': 'Fault',
+    'H': 'Power Saving',
+    'D': 'Shutdown',
+}
+
+# QPIWS bit positions (PI30); bit 1 turns most warnings into faults
+QPIWS_WARNINGS = {
+    1: 'Inverter fault',
+    2: 'Bus over',
+    3: 'Bus under',
+    4: 'Bus soft fail',
+    5: 'Line fail',
+    6: 'OPV short',
+    7: 'Inverter voltage too low',
+    8: 'Inverter voltage too high',
+    9: 'Over temperature',
+    10: 'Fan locked',
+    11: 'Battery voltage high',
+    12: 'Battery low alarm',
+    14: 'Battery under shutdown',
+    16: 'Overload',
+    17: 'EEPROM fault',
+    18: 'Inverter over current',
+    19: 'Inverter soft fail',
+    20: 'Self test fail',
+    21: 'OP DC voltage over',
+    22: 'Battery open',
+    23: 'Current sensor fail',
+    24: 'Battery short',
+    25: 'Power limit',
+    26: 'PV voltage high',
+    27: 'MPPT overload fault',
+    28: 'MPPT overload warning',
+    29: 'Battery too low to charge',
+}
+
+# Home Assistant rejects sensor states longer than this
+HA_STATE_MAX_LENGTH = 255
+
+
+def join_names(names: list[str], limit: int = HA_STATE_MAX_LENGTH) -> str:
+    """Comma-join names, ending in "+N more" where the full list would not fit."""
+    text = ", ".join(names)
+    if len(text) <= limit:
+        return text
+    for shown in range(len(names) - 1, -1, -1):
+        text = ", ".join(names[:shown] + [f"+{len(names) - shown} more"])
+        if len(text) <= limit:
+            return text
+    return f"+{len(names)} more"
+
+BATTERY_TYPES = {'0': 'AGM', '1': 'Flooded', '2': 'User'}
+OUTPUT_SOURCE_PRIORITIES = {'0': 'Utility first', '1': 'Solar first', '2': 'SBU first'}
+CHARGER_SOURCE_PRIORITIES = {
+    '0': 'Utility first',
+    '1': 'Solar first',
+    '2': 'Solar and utility',
+    '3': 'Only solar',
+}
+
+
+# Home Assistant discovery definitions. "command" names the inverter command
+# that provides the value (QPIGS when omitted).
+SENSORS = [
+    # Power sensors
+    {
+        "id": "pv_input_power",
+        "name": "PV Input Power",
+        "unit": "W",
+        "icon": "mdi:solar-power",
+        "device_class": "power",
+        "state_class": "measurement"
+    },
+    {
+        "id": "ac_output_power",
+        "name": "AC Output Power",
+        "unit": "W",
+        "icon": "mdi:flash",
+        "device_class": "power",
+        "state_class": "measurement"
+    },
+    {
+        "id": "battery_power",
+        "name": "Battery Power",
+        "unit": "W",
+        "icon": "mdi:battery-charging",
+        "device_class": "power",
+        "state_class": "measurement"
+    },
+
+    # Voltage sensors
+    {
+        "id": "pv_input_voltage",
+        "name": "PV Input Voltage",
+        "unit": "V",
+        "icon": "mdi:flash",
+        "device_class": "voltage",
+        "state_class": "measurement"
+    },
+    {
+        "id": "battery_voltage",
+        "name": "Battery Voltage",
+        "unit": "V",
+        "icon": "mdi:battery",
+        "device_class": "voltage",
+        "state_class": "measurement"
+    },
+    {
+        "id": "ac_output_voltage",
+        "name": "AC Output Voltage",
+        "unit": "V",
+        "icon": "mdi:power-socket",
+        "device_class": "voltage",
+        "state_class": "measurement"
+    },
+
+    # Other sensors
+    {
+        "id": "battery_capacity",
+        "name": "Battery Capacity",
+        "unit": "%",
+        "icon": "mdi:battery-50",
+        "device_class": "battery",
+        "state_class": "measurement"
+    },
+    {
+        "id": "ac_output_load",
+        "name": "AC Output Load",
+        "unit": "%",
+        "icon": "mdi:gauge",
+        "state_class": "measurement"
+    },
+    {
+        "id": "inverter_temperature",
+        "name": "Inverter Temperature",
+        "unit": "°C",
+        "icon": "mdi:thermometer",
+        "device_class": "temperature",
+        "state_class": "measurement"
+    },
+
+    # Energy counters integrated from the power readings
+    {
+        "id": "pv_energy",
+        "name": "PV Energy",
+        "unit": "kWh",
+        "icon": "mdi:solar-power",
+        "device_class": "energy",
+        "state_class": "total_increasing"
+    },
+    {
+        "id": "load_energy",
+        "name": "Load Energy",
+        "unit": "kWh",
+        "icon": "mdi:home-lightning-bolt",
+        "device_class": "energy",
+        "state_class": "total_increasing"
+    },
+    {
+        "id": "battery_charge_energy",
+        "name": "Battery Charge Energy",
+        "unit": "kWh",
+        "icon": "mdi:battery-arrow-up",
+        "device_class": "energy",
+        "state_class": "total_increasing"
+    },
+    {
+        "id": "battery_discharge_energy",
+        "name": "Battery Discharge Energy",
+        "unit": "kWh",
+        "icon": "mdi:battery-arrow-down",
+        "device_class": "energy",
+        "state_class": "total_increasing"
+    },
+
+    # QPIGS2 (second PV input)
+    {
+        "id": "pv2_input_power",
+        "name": "PV2 Input Power",
+        "unit": "W",
+        "icon": "mdi:solar-power",
+        "device_class": "power",
+        "state_class": "measurement",
+        "command": "QPIGS2"
+    },
+    {
+        "id": "pv2_input_voltage",
+        "name": "PV2 Input Voltage",
+        "unit": "V",
+        "icon": "mdi:flash",
+        "device_class": "voltage",
+        "state_class": "measurement",
+        "command": "QPIGS2"
+    },
+
+    # QMOD / QPIWS
+    {
+        "id": "device_mode",
+        "name": "Device Mode",
+        "icon": "mdi:state-machine",
+        "command": "QMOD"
+    },
+    {
+        "id": "warnings",
+        "name": "Warnings",
+        "icon": "mdi:alert",
+        "command": "QPIWS",
+        # The state may be shortened; the full list is an attribute
+        "attributes": "warning_list"
+    },
+
+    # QPIRI (ratings and settings)
+    {
+        "id": "ac_output_rating_active_power",
+        "name": "AC Output Rated Power",
+        "unit": "W",
+        "icon": "mdi:flash",
+        "device_class": "power",
+        "command": "QPIRI"
+    },
+    {
+        "id": "battery_float_voltage",
+        "name": "Battery Float Voltage",
+        "unit": "V",
+        "icon": "mdi:battery",
+        "device_class": "voltage",
+        "command": "QPIRI"
+    },
+    {
+        "id": "battery_bulk_voltage",
+        "name": "Battery Bulk Voltage",
+        "unit": "V",
+        "icon": "mdi:battery",
+        "device_class": "voltage",
+        "command": "QPIRI"
+    },
+    {
+        "id": "battery_under_voltage",
+        "name": "Battery Cut-off Voltage",
+        "unit": "V",
+        "icon": "mdi:battery-alert",
+        "device_class": "voltage",
+        "command": "QPIRI"
+    },
+    {
+        "id": "max_charging_current",
+        "name": "Max Charging Current",
+        "unit": "A",
+        "icon": "mdi:current-dc",
+        "device_class": "current",
+        "command": "QPIRI"
+    },
+    {
+        "id": "max_ac_charging_current",
+        "name": "Max AC Charging Current",
+        "unit": "A",
+        "icon": "mdi:current-ac",
+        "device_class": "current",
+        "command": "QPIRI"
+    },
+    {
+        "id": "output_source_priority",
+        "name": "Output Source Priority",
+        "icon": "mdi:source-branch",
+        "command": "QPIRI"
+    },
+    {
+        "id": "charger_source_priority",
+        "name": "Charger Source Priority",
+        "icon": "mdi:battery-charging-wireless",
+        "command": "QPIRI"
+    },
+    {
+        "id": "battery_type",
+        "name": "Battery Type",
+        "icon": "mdi:battery-unknown",
+        "command": "QPIRI"
+    },
+]
+
+# Binary sensors
+BINARY_SENSORS = [
+    {
+        "id": "load_on",
+        "name": "Load On",
+        "icon": "mdi:power",
+        "device_class": "power"
+    },
+    {
+        "id": "scc_charging",
+        "name": "Solar Charging",
+        "icon": "mdi:solar-power",
+        "device_class": "battery_charging"
+    },
+    {
+        "id": "ac_charging",
+        "name": "AC Charging",
+        "icon": "mdi:power-plug",
+        "device_class": "battery_charging"
+    },
+    {
+        "id": "fault_active",
+        "name": "Inverter Fault",
+        "icon": "mdi:alert-octagon",
+        "device_class": "problem",
+        "command": "QPIWS"
+    },
+]
+
+# Numeric sensors kept in the local history
+HISTORY_FIELDS = tuple(s['id'] for s in SENSORS if s.get('state_class') in ('measurement', 'total_increasing'))
+# Downsampled history tiers: name, bucket width and retention in seconds
+HISTORY_TIERS = (('1m', 60, 14 * 86400), ('15m', 900, 400 * 86400))
+
+
+def parse_command_intervals(spec: str) -> dict[str, float]:
+    """Parse "QPIGS,QMOD:30,QPIRI:3600" into {command: cadence seconds}.
+
+    QPIGS is always polled and always first; unknown commands are skipped.
+    """
+    intervals = {'QPIGS': 0.0}
+    for item in spec.split(','):
+        item = item.strip().upper()
+        if not item:
+            continue
+        name, _, cadence = item.partition(':')
+        if name not in POLL_COMMANDS:
+            logger.warning(f"Ignoring unknown inverter command: {name}")
+            continue
+        try:
+            intervals[name] = float(cadence) if cadence else float(POLL_COMMANDS[name]['interval'])
+        except ValueError:
+            logger.warning(f"Invalid interval for {name}: {cadence!r}, using default")
+            intervals[name] = float(POLL_COMMANDS[name]['interval'])
+    return intervals
+
+
+def parse_deadbands(spec: str) -> dict[str, tuple[float, bool]]:
+    """Parse "pv_input_power:10,battery_voltage:0.1,ac_output_power:5%".
+
+    Returns {field: (band, is_percent)}; malformed entries are skipped.
+    """
+    deadbands = {}
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, band = item.partition(':')
+        band = band.strip()
+        percent = band.endswith('%')
+        try:
+            deadbands[name.strip()] = (abs(float(band.rstrip('%'))), percent)
+        except ValueError:
+            logger.warning(f"Ignoring invalid deadband: {item!r}")
+    return deadbands
+
+
+def _build_crc16_xmodem_table() -> tuple[int, ...]:
+    """Precompute the CRC16-XMODEM (poly 0x1021) value for every byte."""
+    table = []
+    for byte in range(256):
+        crc = byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+        table.append(crc & 0xFFFF)
+    return tuple(table)
+
+
+CRC16_XMODEM_TABLE = _build_crc16_xmodem_table()
+
+
+def crc16_xmodem_update(crc: int, data) -> int:
+    """Fold data into a running CRC16-XMODEM value (start with 0)."""
+    table = CRC16_XMODEM_TABLE
+    for byte in data:
+        crc = ((crc << 8) & 0xFF00) ^ table[(crc >> 8) ^ byte]
+    return crc
+
+
+_STATUS_CHARS = frozenset("01")
+
+
+def looks_like_status_field(s: str) -> bool:
+    """PI30 device status: 8..12 characters of only 0/1."""
+    return 8 <= len(s) <= 12 and _STATUS_CHARS.issuperset(s)
+
+
+def detect_qpigs_layout(values) -> tuple[int | None, int | None]:
+    """Locate the variant-dependent status and discharge current fields."""
+    # Detect status index first (variant-dependent)
+    status_idx = None
+    if len(values) > 20 and looks_like_status_field(values[20]):
+        status_idx = 20
+    elif len(values) > 16 and looks_like_status_field(values[16]):
+        status_idx = 16
+
+    # Map battery discharge current index based on detected status layout
+    # If status at 20 → discharge current typically at 16 (older mapping that worked for you)
+    # If status at 16 → discharge current at 15 (newer PI30 mapping)
+    if status_idx == 20 and len(values) > 16:
+        batt_discharge_idx = 16
+    elif status_idx == 16 and len(values) > 15:
+        batt_discharge_idx = 15
+    else:
+        # Fallback: prefer 15 if present else 16
+        batt_discharge_idx = 15 if len(values) > 15 else (16 if len(values) > 16 else None)
+    return status_idx, batt_discharge_idx
+
+
+class QPIGSLayoutMismatch(ValueError):
+    """A frame does not fit the layout a QPIGSDecoder was compiled for."""
+
+
+class QPIGSDecoder:
+    """QPIGS decoder for one detected frame layout.
+
+    The layout (field count, status and discharge current positions) is
+    fixed per inverter, so the index and converter of every field are
+    looked up once and decode() only checks the length and status field
+    before converting. It raises QPIGSLayoutMismatch when a frame does not
+    fit, so the caller can fall back to detection.
+    """
+
+    def __init__(self, length: int, status_idx: int, discharge_idx: int):
+        self.layout = (length, status_idx, discharge_idx)
+        self.length = length
+        self.status_idx = status_idx
+        fields = list(QPIGS_FIELDS)
+        fields.insert(11, ('battery_discharge_current', discharge_idx, int))
+        self.fields = tuple(fields)
+        # PV power is reported at 19 when the frame is long enough
+        self.pv_power_idx = 19 if length > 19 else None
+
+    def decode(self, values) -> dict:
+        if len(values) != self.length:
+            raise QPIGSLayoutMismatch(f"{len(values)} fields, layout has {self.length}")
+        status = values[self.status_idx]
+        if not looks_like_status_field(status):
+            raise QPIGSLayoutMismatch(f"no status field at {self.status_idx}: {status!r}")
+        try:
+            # Keys in the order parse_qpigs() publishes them
+            data = {name: conv(values[index]) for name, index, conv in self.fields}
+            data['device_status'] = status
+            if self.pv_power_idx is not None:
+                data['pv_input_power'] = int(values[self.pv_power_idx])
+            else:
+                data['pv_input_power'] = int(round(data['pv_input_voltage'] * data['pv_input_current']))
+        except ValueError as e:
+            raise QPIGSLayoutMismatch(str(e)) from e
+        data['battery_power'] = round(
+            data['battery_voltage'] * (data['battery_charging_current'] - data['battery_discharge_current']), 1
+        )
+        data['load_on'] = status[4] == '1'
+        data['scc_charging'] = status[6] == '1'
+        data['ac_charging'] = status[7] == '1'
+        return data
+
+
+class MetricsRegistry:
+    """Counters and histograms rendered in the Prometheus text format.
+
+    Recording is a dict lookup and a bisect under a lock, cheap enough to
+    leave on; the text is only rendered when the endpoint is scraped.
+    """
+
+    def __init__(self, definitions: dict):
+        self.definitions = definitions
+        # (name, labels) -> count, or per-bucket counts followed by sum and count
+        self._values: dict = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, amount: float = 1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def set(self, name: str, value: float, **labels):
+        """Set a gauge."""
+        with self._lock:
+            self._values[(name, tuple(sorted(labels.items())))] = float(value)
+
+    def set_total(self, name: str, value: float, **labels):
+        """Mirror a monotonic count that is kept elsewhere."""
+        self.set(name, value, **labels)
+
+    def observe(self, name: str, value: float, **labels):
+        buckets = self.definitions[name][2]
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(buckets) + 1) + [0.0, 0]
+            state[bisect.bisect_left(buckets, value)] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def value(self, name: str, **labels):
+        with self._lock:
+            return self._values.get((name, tuple(sorted(labels.items()))))
+
+    def render(self) -> str:
+        with self._lock:
+            values = {key: (list(state) if isinstance(state, list) else state)
+                      for key, state in self._values.items()}
+        lines = []
+        for name, (kind, help_text, buckets) in self.definitions.items():
+            series = [(labels, state) for (metric, labels), state in values.items() if metric == name]
+            if not series:
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for labels, state in series:
+                if kind != 'histogram':
+                    lines.append(f"{name}{_format_labels(labels)} {state:g}")
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (float('inf'),), state):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else f"{bound:g}"
+                    lines.append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_format_labels(labels)} {state[-2]:.6f}")
+                lines.append(f"{name}_count{_format_labels(labels)} {state[-1]}")
+        return "\n".join(lines) + "\n"
+
+
+def _format_labels(labels) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels) + "}"
+
+
+METRICS = MetricsRegistry(METRIC_DEFINITIONS)
+
+
+class _MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path in ('/', '/metrics'):
+            self._reply(200, METRICS.render(), 'text/plain; version=0.0.4; charset=utf-8')
+        elif path == '/history':
+            params = {key: values[-1] for key, values in urllib.parse.parse_qs(query).items()}
+            try:
+                status, result = 200, query_history(HISTORY, params, time.time())
+            except ValueError as e:
+                status, result = 400, {'error': str(e)}
+            self._reply(status, json.dumps(result), 'application/json')
+        else:
+            self.send_error(404)
+
+    def _reply(self, status: int, text: str, content_type: str):
+        body = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes every few seconds would flood the add-on log
+        pass
+
+
+def start_metrics_server(port: int):
+    """Serve METRICS on http://<host>:port/metrics and HISTORY on /history from a daemon thread.
+
+    Returns None, and the monitor runs without the endpoint, if the port cannot be bound.
+    """
+    try:
+        server = http.server.ThreadingHTTPServer(('', port), _MetricsHandler)
+    except OSError as e:
+        logger.error(f"Cannot serve metrics on port {port}: {e}; continuing without the metrics endpoint")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    logger.info(f"Metrics endpoint listening on port {server.server_address[1]}")
+    return server
+
+
+class StreamingFrameCRC:
+    """Track the first '(payload)CRC\\r' frame in a growing buffer.
+
+    Each call to feed() only looks at bytes appended since the previous
+    call and folds the payload into the CRC as it arrives, so the verdict
+    is available as soon as the trailing CRC and carriage return land.
+    Offsets refer to the buffer passed to feed(), which must only grow.
+    """
+
+    def __init__(self):
+        self.crc = 0
+        self.frame_start = -1
+        self.payload_end = -1
+        self._scanned = 0
+
+    @property
+    def frame_end(self) -> int:
+        """Offset just past the trailing carriage return."""
+        return self.payload_end + 4
+
+    def feed(self, buffer: bytes) -> bool:
+        """Advance over new bytes; return True once the frame is complete."""
+        if self.frame_start == -1:
+            start = buffer.find(b'(', self._scanned)
+            if start == -1:
+                self._scanned = len(buffer)
+                return False
+            self.frame_start = self._scanned = start
+
+        if self.payload_end == -1:
+            end = buffer.find(b')', max(self._scanned, self.frame_start + 1))
+            stop = len(buffer) if end == -1 else end + 1
+            self.crc = crc16_xmodem_update(self.crc, buffer[self._scanned:stop])
+            self._scanned = stop
+            if end == -1:
+                return False
+            self.payload_end = end
+
+        if self.frame_end > len(buffer):
+            return False
+        return buffer[self.payload_end + 3:self.frame_end] == b'\r'
+
+    def expected_crc(self, buffer: bytes) -> int:
+        """CRC transmitted after the closing parenthesis."""
+        return int.from_bytes(buffer[self.payload_end + 1:self.payload_end + 3], 'big')
+
+
+class FrameCapture:
+    """Compact binary log of the raw device stream, for offline replay.
+
+    Records are a little-endian (monotonic time, kind, length) header and
+    the bytes: commands as written, every chunk read, the frames cut out
+    of them and session resets (data b'read' or b'write', where the reopen
+    happened). Files are gzip compressed, rotate after max_bytes of records
+    and only the newest `keep` files are kept. The stream is flushed every
+    FLUSH_SECONDS, so a crash loses at most that much.
+    """
+
+    MAGIC = b'MPPCAP1\n'
+    # Magic, wall clock and monotonic time when the file was started
+    HEADER = struct.Struct('<8sdd')
+    RECORD = struct.Struct('<dBH')
+    COMMAND, CHUNK, FRAME, RESET = 1, 2, 3, 4
+    FLUSH_SECONDS = 10.0
+
+    def __init__(self, directory: str, name: str, max_bytes: int = 8 << 20, keep: int = 8):
+        self.directory = directory
+        self.name = name
+        self.max_bytes = max_bytes
+        self.keep = keep
+        self.path: str | None = None
+        self.written = 0
+        self.failed = False
+        self._file = None
+        self._flushed_at = 0.0
+
+    def record(self, kind: int, data=b'', now: float | None = None):
+        if self.failed:
+            return
+        now = time.monotonic() if now is None else now
+        try:
+            if self._file is None or self.written >= self.max_bytes:
+                self._rotate(now)
+            self._file.write(self.RECORD.pack(now, kind, len(data)))
+            self._file.write(data)
+            self.written += self.RECORD.size + len(data)
+            if now - self._flushed_at >= self.FLUSH_SECONDS:
+                self._file.flush()
+                self._flushed_at = now
+        except OSError as e:
+            logger.warning(f"Frame capture stopped: {e}")
+            self.failed = True
+            self.close()
+
+    def _rotate(self, now: float):
+        self.close()
+        wall = time.time()
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(wall)) + f"{int(wall * 1000) % 1000:03d}"
+        self.path = os.path.join(self.directory, f"{self.name}_{stamp}.cap.gz")
+        self._file = gzip.open(self.path, 'wb', compresslevel=6)
+        self._file.write(self.HEADER.pack(self.MAGIC, wall, now))
+        self.written = self.HEADER.size
+        self._flushed_at = now
+        logger.info(f"Capturing frames to {self.path}")
+        for old in self.files()[:-self.keep]:
+            try:
+                os.unlink(old)
+            except OSError as e:
+                logger.debug(f"Cannot remove old capture {old}: {e}")
+
+    def files(self) -> list[str]:
+        """This capture's files, oldest first."""
+        return sorted(
+            os.path.join(self.directory, entry) for entry in os.listdir(self.directory)
+            if capture_name(entry) == self.name
+        )
+
+    def close(self):
+        if self._file is None:
+            return
+        file, self._file = self._file, None
+        try:
+            file.close()
+        except OSError as e:
+            logger.debug(f"Error closing capture {self.path}: {e}")
+
+
+def capture_name(path: str) -> str | None:
+    """Name part of '<name>_<YYYYmmddTHHMMSSmmm>.cap.gz', None for other files."""
+    entry = os.path.basename(path)
+    if not entry.endswith('.cap.gz'):
+        return None
+    name, _, stamp = entry[:-len('.cap.gz')].rpartition('_')
+    if len(stamp) != 18 or stamp[8] != 'T' or not (stamp[:8] + stamp[9:]).isdigit():
+        return None
+    return name
+
+
+def read_capture(path: str):
+    """Yield the (wall time, kind, data) records of one FrameCapture file.
+
+    A file cut short by a crash or power loss ends at its last complete
+    record instead of raising.
+    """
+    with open(path, 'rb') as f:
+        raw = f.read()
+    data = zlib.decompressobj(wbits=31).decompress(raw)
+    header, record = FrameCapture.HEADER, FrameCapture.RECORD
+    if len(data) < header.size or data[:len(FrameCapture.MAGIC)] != FrameCapture.MAGIC:
+        raise ValueError(f"{path} is not a frame capture")
+    _, wall, started = header.unpack_from(data)
+    pos, end = header.size, len(data)
+    while pos + record.size <= end:
+        now, kind, length = record.unpack_from(data, pos)
+        pos += record.size
+        if pos + length > end:
+            break
+        yield wall + now - started, kind, data[pos:pos + length]
+        pos += length
+
+
+def resolve_device(spec: str, sysfs: str | None = None) -> str | None:
+    """Map 'usb:VVVV:PPPP[@N]' to the Nth hidraw node with that USB id.
+
+    Plain paths are returned unchanged; None means no such device is
+    plugged in (yet).
+    """
+    if not spec.lower().startswith('usb:'):
+        return spec
+    ident, _, nth = spec[4:].partition('@')
+    try:
+        vid, pid = (int(part, 16) for part in ident.split(':'))
+        index = int(nth) - 1 if nth else 0
+    except ValueError:
+        logger.error(f"Invalid device {spec}, expected usb:VID:PID[@N]")
+        return None
+    sysfs = sysfs or HIDRAW_SYSFS
+    try:
+        names = sorted(os.listdir(sysfs), key=lambda name: (len(name), name))
+    except OSError:
+        return None
+    matches = []
+    for name in names:
+        try:
+            with open(os.path.join(sysfs, name, 'device', 'uevent')) as f:
+                uevent = f.read()
+        except OSError:
+            continue
+        for line in uevent.splitlines():
+            # HID_ID=<bus>:<vendor>:<product>, all hex
+            if line.startswith('HID_ID='):
+                _bus, vendor, product = line[7:].split(':')
+                if (int(vendor, 16), int(product, 16)) == (vid, pid):
+                    matches.append(os.path.join('/dev', name))
+    return matches[index] if 0 <= index < len(matches) else None
+
+
+class DeviceWatcher:
+    """inotify watch on the directory holding the device node.
+
+    Lets device waits wake up as soon as a node is created, removed or has
+    its permissions changed, instead of polling on a timer.
+    """
+
+    IN_ATTRIB = 0x004
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    MASK = IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, fd: int, directory: str):
+        self.fd = fd
+        self.directory = directory
+        self.events = 0
+
+    @classmethod
+    def create(cls, directory: str):
+        """Watch a directory; None where inotify is not available."""
+        try:
+            libc = ctypes.CDLL(None, use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+            if fd < 0:
+                raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+            if libc.inotify_add_watch(fd, os.fsencode(directory), cls.MASK) < 0:
+                err = ctypes.get_errno()
+                os.close(fd)
+                raise OSError(err, f"inotify_add_watch({directory}) failed")
+        except (OSError, AttributeError) as e:
+            logger.info(f"Cannot watch {directory} for device events ({e}), polling instead")
+            return None
+        return cls(fd, directory)
+
+    def fileno(self) -> int:
+        return self.fd
+
+    def wait(self, timeout: float) -> bool:
+        """Block until something changed in the directory or timeout."""
+        ready, _, _ = select.select([self.fd], [], [], max(0.0, timeout))
+        return bool(ready) and bool(self.read_events())
+
+    def read_events(self) -> list[str]:
+        """Drain pending events; returns the names they were about."""
+        names = []
+        while True:
+            try:
+                data = os.read(self.fd, 4096)
+            except BlockingIOError:
+                return names
+            offset = 0
+            # struct inotify_event: wd, mask, cookie, len, name[len]
+            while offset + 16 <= len(data):
+                _wd, _mask, _cookie, length = struct.unpack_from('iIII', data, offset)
+                names.append(data[offset + 16:offset + 16 + length].rstrip(b'\0').decode(errors='replace'))
+                offset += 16 + length
+            self.events += len(names)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class HIDSession:
+    """Long-lived handle on the inverter's hidraw node.
+
+    The fd, its poll registration and the receive buffer survive across
+    monitoring cycles. Errors that mean the node went away (EIO/ENODEV)
+    trigger a transparent reopen on the next access.
+
+    Other transports (SerialSession, TCPSession) only change how the fd is
+    opened and closed; framing, deadlines and the receive buffer work on
+    any non-blocking fd.
+    """
+
+    REOPEN_ERRNOS = (errno.EIO, errno.ENODEV)
+    # A read of 0 bytes means the other end hung up (streams, not hidraw)
+    EOF_IS_DISCONNECT = False
+    # The device is a node in /dev that can disappear and come back
+    HAS_NODE = True
+
+    def __init__(self, device: str):
+        self.device = device
+        self.fd: int | None = None
+        # Unconsumed bytes left over from the last reply
+        self.buffer = b""
+        # Command whose reply the buffered bytes belong to
+        self.buffer_command: str | None = None
+        self.open_count = 0
+        self.reopen_count = 0
+        self._poller = None
+        # Optional FrameCapture recording everything written and read
+        self.capture: FrameCapture | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.fd is not None
+
+    def open(self) -> int:
+        """Open the device if needed and return its fd."""
+        if self.fd is None:
+            self._opened(self._open_fd())
+        return self.fd
+
+    async def open_async(self) -> int:
+        """open() for the asyncio engine; opening a device node does not block."""
+        return self.open()
+
+    def _opened(self, fd: int):
+        self.fd = fd
+        self._poller = select.poll()
+        self._poller.register(fd, select.POLLIN)
+        self.open_count += 1
+        logger.debug(f"Opened device {self.device} (fd={fd}, opens={self.open_count})")
+
+    def close(self):
+        """Close the fd; the receive buffer is kept."""
+        if self.fd is None:
+            return
+        fd, self.fd = self.fd, None
+        self._poller = None
+        try:
+            self._close_fd(fd)
+        except OSError as e:
+            logger.debug(f"Error closing device {self.device}: {e}")
+
+    def _open_fd(self) -> int:
+        return os.open(self.device, os.O_RDWR | os.O_NONBLOCK)
+
+    def _close_fd(self, fd: int):
+        os.close(fd)
+
+    def reset(self, during: str = 'read'):
+        """Drop the current fd; the next access opens the node again."""
+        self.close()
+        # Bytes buffered from the old fd cannot be trusted to continue a frame
+        self.buffer = b""
+        self.reopen_count += 1
+        if self.capture is not None:
+            self.capture.record(FrameCapture.RESET, during.encode())
+        logger.info(f"Reopening device {self.device} (reopens={self.reopen_count})")
+
+    def reopen(self, during: str = 'read') -> int:
+        """Drop the current fd and open the node again."""
+        self.reset(during)
+        return self.open()
+
+    def write(self, data: bytes) -> int:
+        """Write to the device, reopening once if the node was reset."""
+        try:
+            count = os.write(self.open(), data)
+        except OSError as e:
+            if e.errno not in self.REOPEN_ERRNOS:
+                raise
+            logger.warning(f"Write to {self.device} failed ({e}), reopening")
+            count = os.write(self.reopen('write'), data)
+        if self.capture is not None:
+            self.capture.record(FrameCapture.COMMAND, data)
+        return count
+
+    def wait_readable(self, timeout: float) -> bool:
+        """Block up to timeout seconds until the device has data."""
+        self.open()
+        return bool(self._poller.poll(max(0, int(timeout * 1000))))
+
+    def read(self, size: int = 512) -> bytes:
+        """Read available bytes; returns b"" after a reopen."""
+        try:
+            data = os.read(self.open(), size)
+            if self.capture is not None and data:
+                self.capture.record(FrameCapture.CHUNK, data)
+            if not data and self.EOF_IS_DISCONNECT:
+                self._disconnected()
+            return data
+        except BlockingIOError:
+            return b""
+        except OSError as e:
+            if e.errno not in self.REOPEN_ERRNOS:
+                raise
+            self._disconnected(e)
+            return b""
+
+    def _disconnected(self, error: OSError | None = None):
+        """The fd stopped working: a hang-up (error None) or a reset node."""
+        if error is None:
+            logger.warning(f"Connection to {self.device} closed by the other end, reconnecting")
+        else:
+            logger.warning(f"Read from {self.device} failed ({error}), reopening")
+        self.reopen()
+
+
+# Rates every termios build defines; the add-on schema offers the same list
+SERIAL_BAUD_RATES = (1200, 2400, 4800, 9600, 19200, 38400, 57600, 115200)
+
+
+class SerialSession(HIDSession):
+    """Inverter on an RS232 or USB-serial adapter (/dev/ttyUSBn).
+
+    The tty is switched to raw 8N1 at the configured baud rate (PI30 uses
+    2400) without flow control or modem lines, so bytes arrive exactly as
+    sent and reads never block.
+    """
+
+    def __init__(self, device: str, baud_rate: int = 2400):
+        super().__init__(device)
+        self.baud_rate = baud_rate
+        self.speed = getattr(termios, f'B{baud_rate}', None)
+        if self.speed is None:
+            raise ValueError(f"Unsupported baud rate {baud_rate}")
+
+    def _open_fd(self) -> int:
+        fd = os.open(self.device, os.O_RDWR | os.O_NONBLOCK | os.O_NOCTTY)
+        try:
+            iflag, oflag, cflag, lflag, ispeed, ospeed, cc = termios.tcgetattr(fd)
+            cc[termios.VMIN] = 0
+            cc[termios.VTIME] = 0
+            termios.tcsetattr(fd, termios.TCSANOW, [
+                termios.IGNPAR,  # no CR/NL translation, no XON/XOFF
+                0,  # no output processing
+                termios.CS8 | termios.CREAD | termios.CLOCAL,
+                0,  # no echo, no line editing, no signals
+                self.speed, self.speed, cc,
+            ])
+            # Whatever was sent before we opened belongs to no command of ours
+            termios.tcflush(fd, termios.TCIOFLUSH)
+        except termios.error as e:
+            os.close(fd)
+            raise OSError(e.args[0], f"Cannot set up {self.device}: {e.args[-1]}") from e
+        return fd
+
+
+class TCPSession(HIDSession):
+    """Inverter behind a serial-to-TCP bridge (ser2net, ESP-Link, ...).
+
+    The connection is kept open across cycles, with TCP keepalive so a
+    bridge that went away silently is noticed, and re-established on the
+    next access after the bridge hangs up or the connection fails.
+    """
+
+    REOPEN_ERRNOS = HIDSession.REOPEN_ERRNOS + (
+        errno.ECONNRESET, errno.ECONNABORTED, errno.EPIPE, errno.ETIMEDOUT, errno.EHOSTUNREACH,
+    )
+    EOF_IS_DISCONNECT = True
+    HAS_NODE = False
+    CONNECT_TIMEOUT = 5.0
+    # Keepalive probes after 30 s idle, every 10 s, giving up after 3
+    KEEPALIVE = (30, 10, 3)
+
+    def __init__(self, device: str):
+        super().__init__(device)
+        host, _, port = device.rpartition(':')
+        if not host or not port.isdigit():
+            raise ValueError(f"Invalid TCP device {device}, expected tcp://HOST:PORT")
+        self.address = (host.strip('[]'), int(port))
+        self._sock: socket.socket | None = None
+
+    def _open_fd(self) -> int:
+        return self._adopt(socket.create_connection(self.address, timeout=self.CONNECT_TIMEOUT))
+
+    async def open_async(self) -> int:
+        """Connect without blocking the event loop (DNS lookup included)."""
+        if self._sock is not None and self._peer_closed():
+            self._disconnected()
+        if self.fd is None:
+            try:
+                sock = await asyncio.wait_for(self._connect_async(), self.CONNECT_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise TimeoutError(errno.ETIMEDOUT, f"Connection to {self.device} timed out") from None
+            self._opened(self._adopt(sock))
+        return self.fd
+
+    async def _connect_async(self) -> socket.socket:
+        loop = asyncio.get_running_loop()
+        host, port = self.address
+        error = OSError(f"No address for {host}")
+        for family, kind, proto, _, address in await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+            sock = socket.socket(family, kind, proto)
+            sock.setblocking(False)
+            try:
+                await loop.sock_connect(sock, address)
+                return sock
+            except BaseException as e:
+                sock.close()
+                if not isinstance(e, OSError):
+                    raise
+                error = e
+        raise error
+
+    def _adopt(self, sock: socket.socket) -> int:
+        """Set up a connected socket as the session fd."""
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            for option, value in zip(('TCP_KEEPIDLE', 'TCP_KEEPINTVL', 'TCP_KEEPCNT'), self.KEEPALIVE):
+                if hasattr(socket, option):
+                    sock.setsockopt(socket.IPPROTO_TCP, getattr(socket, option), value)
+            sock.setblocking(False)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        logger.info(f"Connected to {self.device}")
+        return sock.fileno()
+
+    def write(self, data: bytes) -> int:
+        """Write a command, reconnecting first if the bridge hung up meanwhile."""
+        if self._sock is not None and self._peer_closed():
+            self._disconnected()
+        return super().write(data)
+
+    def _disconnected(self, error: OSError | None = None):
+        # Reconnect on the next command, not here: this may run in an event loop callback
+        reason = 'closed by the other end' if error is None else f'failed ({error})'
+        logger.warning(f"Connection to {self.device} {reason}, reconnecting before the next command")
+        self.reset()
+
+    def _peer_closed(self) -> bool:
+        try:
+            return self._sock.recv(1, socket.MSG_PEEK) == b''
+        except BlockingIOError:
+            return False
+        except OSError as e:
+            return e.errno in self.REOPEN_ERRNOS
+
+    def _close_fd(self, fd: int):
+        sock, self._sock = self._sock, None
+        if sock is not None:
+            sock.close()
+
+
+def parse_transport(spec: str) -> tuple[str, str]:
+    """Split a device option into its transport and what to open.
+
+    'tcp://HOST:PORT' is a serial bridge, 'serial:PATH' and tty paths
+    (/dev/ttyUSB0, /dev/serial/by-id/...) are serial ports, anything else
+    is a hidraw path or usb:VID:PID.
+    """
+    if spec.lower().startswith('tcp://'):
+        return 'tcp', spec[6:].rstrip('/')
+    if spec.lower().startswith('serial:'):
+        return 'serial', spec[7:]
+    if os.path.basename(spec).startswith('tty') or spec.startswith('/dev/serial/'):
+        return 'serial', spec
+    return 'hidraw', spec
+
+
+class FrameReader:
+    """Accumulate one reply, starting from the session's leftover bytes.
+
+    Chunks are appended to one bytearray; the frame is only scanned (and
+    its CRC folded) once a carriage return has arrived, so the HID reports
+    before the end of a reply cost one find() each. Used by both the
+    blocking and the asyncio read loops so they share the same framing and
+    CRC logic.
+    """
+
+    def __init__(self, session: HIDSession):
+        self.session = session
+        self.response = bytearray(session.buffer)
+        self.tracker = StreamingFrameCRC()
+        # Stage timestamps (time.monotonic) and CRC time for the metrics
+        self.started = time.monotonic()
+        self.first_byte_at = None
+        self.completed_at = None
+        self.crc_seconds = 0.0
+        self._reopens = session.reopen_count
+        self.complete = False
+        if b'\r' in self.response:
+            self._feed()
+        # A frame left over from the previous cycle says nothing about timing
+        self.buffered = self.complete
+        if len(self.response):
+            self.first_byte_at = self.started
+
+    def _feed(self):
+        crc_started = time.perf_counter()
+        self.complete = self.tracker.feed(self.response)
+        self.crc_seconds += time.perf_counter() - crc_started
+        if self.complete and self.completed_at is None:
+            self.completed_at = time.monotonic()
+
+    def read_chunk(self, size: int = 512) -> bool:
+        """Read once from the session; return True once the frame is complete."""
+        chunk = self.session.read(size)
+        if self.session.reopen_count != self._reopens:
+            # Partial bytes from the old fd cannot continue a frame
+            self._reopens = self.session.reopen_count
+            self.response = bytearray()
+            self.tracker = StreamingFrameCRC()
+        if chunk:
+            if self.first_byte_at is None:
+                self.first_byte_at = time.monotonic()
+            self.response += chunk
+            logger.debug("Received chunk: %d bytes, total=%d", len(chunk), len(self.response))
+            if self.response.find(b'\r', len(self.response) - len(chunk)) != -1:
+                self._feed()
+        return self.complete
+
+
+class PublishFilter:
+    """Suppress state messages that carry no meaningful change.
+
+    A sample is sent when any field moved past its deadband relative to the
+    last *sent* value (so slow drift still gets through), when a
+    non-numeric field changed, or when the heartbeat interval expired.
+    Numeric fields without a deadband are sent on any change. A heartbeat
+    of 0 never forces a re-send; deadbands still apply. With neither a
+    heartbeat nor deadbands, every whole sample is sent.
+    """
+
+    IGNORED_FIELDS = ('timestamp',)
+
+    def __init__(self, deadbands: dict[str, tuple[float, bool]], heartbeat: float):
+        self.deadbands = deadbands
+        self.heartbeat = heartbeat
+        # Whole samples are only filtered when asked for
+        self.filtering = heartbeat > 0 or bool(deadbands)
+        self.sent = 0
+        self.suppressed = 0
+        self.failed = 0
+        self._last: dict | None = None
+        self._last_sent_at = 0.0
+
+    def reset(self):
+        """Force the next sample out, e.g. after a reconnect."""
+        self._last = None
+
+    def should_publish(self, data: dict, now: float) -> bool:
+        """Whole-sample decision for the single JSON state topic."""
+        if not self.filtering or self.changed_fields(data, now):
+            return True
+        self.suppressed += 1
+        return False
+
+    def changed_fields(self, data: dict, now: float) -> list[str]:
+        """Fields to send now: all on first sample or heartbeat, else changed ones."""
+        fields = [key for key in data if key not in self.IGNORED_FIELDS]
+        if self._last is None or (self.heartbeat > 0 and now - self._last_sent_at >= self.heartbeat):
+            return fields
+        return [key for key in fields if self._changed(key, data[key], self._last.get(key))]
+
+    def mark_sent(self, data: dict, now: float, fields: list[str] | None = None, failed: list[str] = ()):
+        """Remember what went out; fields=None means the whole sample as one message.
+
+        Failed fields are neither remembered nor counted as suppressed, so
+        they are retried with the next sample.
+        """
+        if fields is None:
+            self._last = dict(data)
+            self._last_sent_at = now
+            self.sent += 1
+            return
+        if self._last is None or len(fields) == len(data):
+            self._last_sent_at = now
+        self._last = {**(self._last or {}), **{key: data[key] for key in fields}}
+        self.sent += len(fields)
+        self.failed += len(failed)
+        self.suppressed += len(data) - len(fields) - len(failed)
+
+    def mark_failed(self):
+        """Count a whole-sample message the client did not accept."""
+        self.failed += 1
+
+    def _changed(self, key, value, last) -> bool:
+        numeric = (int, float)
+        if (isinstance(value, bool) or isinstance(last, bool)
+                or not isinstance(value, numeric) or not isinstance(last, numeric)):
+            return value != last
+        band = self.deadbands.get(key)
+        if band is None:
+            return value != last
+        limit, percent = band
+        if percent:
+            limit = abs(last) * limit / 100.0
+        return abs(value - last) > limit
+
+
+class SampleBuffer:
+    """Bounded, crash-safe ring of serialized samples in a memory-mapped file.
+
+    The file is sized once (header + slots * slot_size) and never grows;
+    when full the oldest samples are overwritten. A record starts at a slot
+    with its length and a CRC32, so a record torn by a crash is skipped on
+    replay, and continues over as many following slots as it needs. Head
+    and tail are monotonically increasing slot sequence numbers stored in
+    the header, which is only updated after the record has been written. The
+    mapping is synced to disk at most every SYNC_SECONDS and on close, not
+    per sample: the kernel keeps the pages if only the process dies.
+    """
+
+    SYNC_SECONDS = 30.0
+
+    MAGIC = b'MPPRING1'
+    HEADER = struct.Struct('<8sIIQQ')  # magic, slots, slot_size, head, tail
+    RECORD = struct.Struct('<II')      # payload length, crc32
+
+    def __init__(self, path: str, slots: int, slot_size: int = 2048):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        self.dropped = 0
+        self.corrupt = 0
+        self._lock = threading.Lock()
+        self._map = None
+        self._head = 0
+        self._tail = 0
+        self._count = 0
+        self._synced_at: float | None = None
+
+    def open(self):
+        size = self.HEADER.size + self.slots * self.slot_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, slots, slot_size, head, tail = self.HEADER.unpack_from(self._map, 0)
+        if (magic, slots, slot_size) != (self.MAGIC, self.slots, self.slot_size) or not 0 <= head - tail <= self.slots:
+            if magic != b'\0' * 8:
+                logger.warning(f"Backfill buffer {self.path} has a different layout, starting empty")
+            self._head = self._tail = 0
+            self._write_header()
+        else:
+            self._head, self._tail = head, tail
+        seq = self._tail
+        while seq < self._head:
+            span, payload = self._record_at(seq)
+            self._count += payload is not None
+            seq += span
+        if len(self):
+            logger.info(f"Backfill buffer holds {len(self)} samples from a previous run")
+
+    def close(self):
+        if self._map is not None:
+            self._map.flush()
+            self._map.close()
+            self._map = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def _span(self, length: int) -> int:
+        """Slots taken by a record with a payload of this length"""
+        return -(-(self.RECORD.size + length) // self.slot_size)
+
+    def append(self, payload: bytes) -> bool:
+        """Store one sample, overwriting the oldest when full."""
+        span = self._span(len(payload))
+        if span > self.slots:
+            logger.warning(f"Sample of {len(payload)} bytes is larger than the backfill buffer, dropped")
+            self.dropped += 1
+            return False
+        with self._lock:
+            while self._head + span - self._tail > self.slots:
+                evicted, old = self._record_at(self._tail)
+                if old is not None:
+                    self._count -= 1
+                    self.dropped += 1
+                self._tail += evicted
+            record = self.RECORD.pack(len(payload), zlib.crc32(payload)) + payload
+            for n in range(span):
+                chunk = record[n * self.slot_size:(n + 1) * self.slot_size]
+                offset = self._slot_offset(self._head + n)
+                self._map[offset:offset + len(chunk)] = chunk
+            self._head += span
+            self._count += 1
+            self._write_header()
+        return True
+
+    def _record_at(self, seq: int) -> tuple[int, bytes | None]:
+        """(slots to skip, payload) of the record starting at seq; payload is None if torn."""
+        length, crc = self.RECORD.unpack_from(self._map, self._slot_offset(seq))
+        span = self._span(length)
+        if not length or span > self._head - seq:
+            return 1, None
+        chunks = []
+        for n in range(span):
+            offset = self._slot_offset(seq + n)
+            chunks.append(self._map[offset:offset + self.slot_size])
+        payload = b''.join(chunks)[self.RECORD.size:self.RECORD.size + length]
+        if zlib.crc32(payload) != crc:
+            # Continue at the next slot until a record checks out again
+            return 1, None
+        return span, payload
+
+    def peek(self, count: int) -> list[tuple[int, bytes]]:
+        """Oldest samples as (sequence, payload), skipping corrupt slots."""
+        items = []
+        with self._lock:
+            seq = self._tail
+            while seq < self._head and len(items) < count:
+                span, payload = self._record_at(seq)
+                if payload is not None:
+                    items.append((seq, payload))
+                else:
+                    self.corrupt += 1
+                    if seq == self._tail:
+                        self._tail += 1
+                seq += span
+        return items
+
+    def pop(self, seq: int):
+        """Release every sample up to and including the one starting at seq."""
+        with self._lock:
+            if seq < self._tail:
+                return
+            while self._tail <= seq and self._tail < self._head:
+                span, payload = self._record_at(self._tail)
+                self._count -= payload is not None
+                self._tail += span
+            self._write_header()
+
+    def _slot_offset(self, seq: int) -> int:
+        return self.HEADER.size + (seq % self.slots) * self.slot_size
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.slots, self.slot_size, self._head, self._tail)
+        now = time.monotonic()
+        if self._synced_at is None or now - self._synced_at >= self.SYNC_SECONDS:
+            self._map.flush()
+            self._synced_at = now
+
+
+class SampleAggregator:
+    """Mean, min and max of numeric fields over one publish interval.
+
+    Fields listed in `fields` are published as their mean plus `<field>_min`
+    and `<field>_max`; everything else keeps the value of the latest sample.
+    The mean of a field reported as integers is rounded to an integer, so
+    the published types do not change with oversampling.
+    """
+
+    def __init__(self, fields):
+        self.fields = set(fields)
+        self.count = 0
+        self._counts: dict[str, int] = {}
+        self._sums: dict[str, float] = {}
+        self._floats: set[str] = set()
+        self._mins: dict = {}
+        self._maxs: dict = {}
+        self._last: dict | None = None
+
+    def add(self, data: dict):
+        self.count += 1
+        self._last = data
+        for key in self.fields.intersection(data):
+            value = data[key]
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            if isinstance(value, float):
+                self._floats.add(key)
+            if key in self._sums:
+                self._counts[key] += 1
+                self._sums[key] += value
+                self._mins[key] = min(self._mins[key], value)
+                self._maxs[key] = max(self._maxs[key], value)
+            else:
+                self._counts[key] = 1
+                self._sums[key] = value
+                self._mins[key] = self._maxs[key] = value
+
+    def rollup(self) -> dict | None:
+        """The aggregated sample; starts a new interval."""
+        if self._last is None:
+            return None
+        result = dict(self._last)
+        for key, total in self._sums.items():
+            mean = total / self._counts[key]
+            result[key] = round(mean, 2) if key in self._floats else round(mean)
+            result[f"{key}_min"] = self._mins[key]
+            result[f"{key}_max"] = self._maxs[key]
+        self.count = 0
+        self._counts, self._sums, self._mins, self._maxs = {}, {}, {}, {}
+        self._floats = set()
+        self._last = None
+        return result
+
+
+class EnergyIntegrator:
+    """kWh counters integrated from every power sample, persisted across restarts.
+
+    Uses the trapezoidal rule between consecutive samples; gaps longer than
+    max_gap (device unplugged, add-on stopped) are not integrated. The
+    counters are written atomically at most every save_interval seconds.
+    """
+
+    def __init__(self, path: str | None, max_gap: float = 60.0, save_interval: float = 60.0):
+        self.path = path
+        self.max_gap = max_gap
+        self.save_interval = save_interval
+        self.totals = {counter: 0.0 for counter in ENERGY_COUNTERS}
+        self._last_at: float | None = None
+        self._last_power: dict[str, float] = {}
+        self._saved_at: float | None = None
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path) as f:
+                stored = json.load(f)
+            for counter in self.totals:
+                self.totals[counter] = float(stored.get(counter, 0.0))
+            logger.info(f"Energy counters restored from {self.path}")
+        except (OSError, ValueError, TypeError, AttributeError) as e:
+            logger.warning(f"Cannot restore energy counters from {self.path}: {e}")
+
+    def add(self, data: dict, now: float):
+        power = {}
+        for counter, (field, sign) in ENERGY_COUNTERS.items():
+            value = data.get(field)
+            if isinstance(value, (int, float)):
+                power[counter] = max(0.0, sign * value)
+        if self._last_at is not None and 0 < now - self._last_at <= self.max_gap:
+            hours = (now - self._last_at) / 3600
+            for counter, watts in power.items():
+                if counter in self._last_power:
+                    self.totals[counter] += (watts + self._last_power[counter]) / 2 * hours / 1000
+        self._last_at = now
+        self._last_power = power
+
+    def values(self) -> dict[str, float]:
+        return {counter: round(total, 3) for counter, total in self.totals.items()}
+
+    def maybe_save(self, now: float):
+        if self._saved_at is None:
+            self._saved_at = now
+        elif now - self._saved_at >= self.save_interval:
+            self.save()
+            self._saved_at = now
+
+    def save(self):
+        # Nothing integrated yet: keep whatever is on disk
+        if not self.path or self._last_at is None:
+            return
+        tmp = f"{self.path}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                json.dump(self.totals, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"Cannot save energy counters to {self.path}: {e}")
+
+
+class HistoryRing:
+    """Fixed-width, time-ordered records in a memory-mapped ring file.
+
+    The header carries the field names, so a reader does not depend on the
+    add-on version that wrote the file. Records start with their time and
+    are appended in time order, so ranges are found by binary search. The
+    head is stored after the record it covers, as in SampleBuffer.
+    """
+
+    MAGIC = b'MPPHIST1'
+    HEADER = struct.Struct('<8sIIQI')  # magic, slots, record size, head, length of the field names
+    HEADER_SIZE = 4096
+    TIME = struct.Struct('<d')
+
+    def __init__(self, path: str, fields: tuple[str, ...] = (), record_size: int = 0, slots: int = 0):
+        self.path = path
+        self.fields = fields
+        self.record_size = record_size
+        self.slots = slots
+        self.head = 0
+        self.readonly = False
+        self._names = json.dumps(list(fields)).encode()
+        self._map = None
+
+    def open(self, readonly: bool = False):
+        self.readonly = readonly
+        if readonly:
+            with open(self.path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            magic, self.slots, self.record_size, self.head, length = self.HEADER.unpack_from(self._map, 0)
+            if magic != self.MAGIC:
+                raise ValueError(f"{self.path} is not a history file")
+            self.fields = tuple(json.loads(self._map[self.HEADER.size:self.HEADER.size + length]))
+            return
+        size = self.HEADER_SIZE + self.slots * self.record_size
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            if os.fstat(fd).st_size != size:
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, slots, record_size, head, length = self.HEADER.unpack_from(self._map, 0)
+        names = self._map[self.HEADER.size:self.HEADER.size + min(length, self.HEADER_SIZE)]
+        if (magic, slots, record_size, names) != (self.MAGIC, self.slots, self.record_size, self._names):
+            if magic != b'\0' * 8:
+                logger.warning(f"History file {self.path} has a different layout, starting empty")
+            self._map[self.HEADER.size:self.HEADER.size + len(self._names)] = self._names
+            self.head = 0
+            self._write_header()
+        else:
+            self.head = head
+
+    def close(self):
+        if self._map is not None:
+            self.flush()
+            self._map.close()
+            self._map = None
+
+    def flush(self):
+        if not self.readonly:
+            self._map.flush()
+
+    def __len__(self) -> int:
+        return min(self.head, self.slots)
+
+    def append(self, record: bytes):
+        offset = self._offset(self.head)
+        self._map[offset:offset + self.record_size] = record
+        self.head += 1
+        self._write_header()
+
+    def time_at(self, seq: int) -> float:
+        return self.TIME.unpack_from(self._map, self._offset(seq))[0]
+
+    def first_time(self) -> float | None:
+        return self.time_at(self.head - len(self)) if len(self) else None
+
+    def find(self, start: float, end: float) -> range:
+        """Sequence numbers of the records from start to end, inclusive."""
+        seqs = range(self.head - len(self), self.head)
+        first = bisect.bisect_left(seqs, start, key=self.time_at)
+        last = bisect.bisect_right(seqs, end, lo=first, key=self.time_at)
+        return seqs[first:last]
+
+    def unpack(self, layout: struct.Struct, seq: int) -> tuple:
+        return layout.unpack_from(self._map, self._offset(seq))
+
+    def _offset(self, seq: int) -> int:
+        return self.HEADER_SIZE + (seq % self.slots) * self.record_size
+
+    def _write_header(self):
+        self.HEADER.pack_into(self._map, 0, self.MAGIC, self.slots, self.record_size, self.head, len(self._names))
+
+
+class _HistoryBucket:
+    """Running count, sum, min and max per field of one time bucket."""
+
+    def __init__(self, start: float, width: int):
+        self.start = start
+        self.samples = 0
+        self.counts = [0] * width
+        self.sums = [0.0] * width
+        self.mins = [math.inf] * width
+        self.maxs = [-math.inf] * width
+
+    def add(self, values):
+        self.samples += 1
+        for i, value in enumerate(values):
+            if value == value:  # NaN marks a missing field
+                self.counts[i] += 1
+                self.sums[i] += value
+                if value < self.mins[i]:
+                    self.mins[i] = value
+                if value > self.maxs[i]:
+                    self.maxs[i] = value
+
+    def columns(self):
+        for count, total, low, high in zip(self.counts, self.sums, self.mins, self.maxs):
+            if count:
+                yield from (total / count, low, high)
+            else:
+                yield from (math.nan, math.nan, math.nan)
+
+
+class HistoryStore:
+    """Local time series of one inverter's readings, in tiers of rings.
+
+    Raw readings are kept in a ring sized for `raw_slots` readings. Every
+    reading is also folded into per-minute and per-quarter-hour buckets
+    (mean, min and max of each field), kept as long as HISTORY_TIERS says.
+    Each tier is a HistoryRing of fixed size, so disk use is fixed when the
+    store is created. A bucket is written once a reading of the next bucket
+    arrives; buckets still open are lost on a crash. Values are stored as
+    float32, missing ones as NaN.
+    """
+
+    FLUSH_SECONDS = 60.0
+
+    def __init__(self, directory: str, name: str, raw_slots: int = 0, fields=HISTORY_FIELDS):
+        self.directory = directory
+        self.name = name
+        self.raw_slots = raw_slots
+        self.fields = tuple(fields)
+        self.tiers: dict[str, tuple[int, HistoryRing]] = {}
+        self._buckets: dict[str, _HistoryBucket | None] = {}
+        self._lock = threading.Lock()
+        self._last = 0.0
+        self._flushed_at = 0.0
+
+    def path(self, tier: str) -> str:
+        return os.path.join(self.directory, f"{self.name}_{tier}.ring")
+
+    def open(self, readonly: bool = False):
+        if readonly:
+            raw = HistoryRing(self.path('raw'))
+            raw.open(readonly=True)
+            self.fields = raw.fields
+        self._layouts()
+        width = len(self.fields)
+        self.tiers = {'raw': (0, HistoryRing(self.path('raw'), self.fields, self._raw.size, self.raw_slots))}
+        for tier, resolution, retention in HISTORY_TIERS:
+            self.tiers[tier] = (resolution, HistoryRing(self.path(tier), self.fields, self._agg.size, retention // resolution))
+            self._buckets[tier] = None
+        for _, ring in self.tiers.values():
+            ring.open(readonly)
+            if readonly and len(ring.fields) != width:
+                raise ValueError(f"{ring.path} does not match {self.path('raw')}")
+        newest = self.tiers['raw'][1]
+        if len(newest):
+            self._last = newest.time_at(newest.head - 1)
+
+    def _layouts(self):
+        width = len(self.fields)
+        self._raw = struct.Struct(f'<d{width}f')
+        self._agg = struct.Struct(f'<dI{3 * width}f')
+
+    def close(self):
+        with self._lock:
+            for _, ring in self.tiers.values():
+                ring.close()
+            self.tiers = {}
+
+    def add(self, when: float, *sources: dict):
+        """Store one reading; fields are looked up in sources, first wins."""
+        values = []
+        for field in self.fields:
+            value = math.nan
+            for source in sources:
+                found = source.get(field)
+                if isinstance(found, (int, float)) and not isinstance(found, bool):
+                    value = found
+                    break
+            values.append(value)
+        with self._lock:
+            if not self.tiers:
+                return
+            # Rings must stay in time order when the clock is stepped back
+            when = max(when, self._last)
+            self._last = when
+            self.tiers['raw'][1].append(self._raw.pack(when, *values))
+            for tier, (resolution, ring) in self.tiers.items():
+                if not resolution:
+                    continue
+                start = when - when % resolution
+                bucket = self._buckets[tier]
+                if bucket is not None and bucket.start != start:
+                    ring.append(self._agg.pack(bucket.start, bucket.samples, *bucket.columns()))
+                    bucket = None
+                if bucket is None:
+                    bucket = self._buckets[tier] = _HistoryBucket(start, len(values))
+                bucket.add(values)
+            if when - self._flushed_at >= self.FLUSH_SECONDS:
+                for _, ring in self.tiers.values():
+                    ring.flush()
+                self._flushed_at = when
+
+    def pick_tier(self, start: float) -> str:
+        """Finest tier that reaches back to start, else the one reaching furthest."""
+        oldest, best = math.inf, 'raw'
+        for tier, (_, ring) in self.tiers.items():
+            first = ring.first_time()
+            if first is None:
+                continue
+            if first <= start:
+                return tier
+            if first < oldest:
+                oldest, best = first, tier
+        return best
+
+    def query(self, start: float, end: float, fields=None, step: float | None = None, tier: str | None = None):
+        """(tier, rows) between start and end, optionally regrouped into step buckets.
+
+        Raw rows are {'time', <field>: value}; aggregated rows are
+        {'time', 'count', <field>: mean, <field>_min, <field>_max}.
+        """
+        fields = list(fields or self.fields)
+        unknown = set(fields).difference(self.fields)
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+        columns = [self.fields.index(field) for field in fields]
+        with self._lock:
+            tier = tier or self.pick_tier(start)
+            if tier not in self.tiers:
+                raise ValueError(f"Unknown tier {tier!r}, expected one of {', '.join(self.tiers)}")
+            resolution, ring = self.tiers[tier]
+            rows = []
+            # Buckets are included when they overlap the range
+            for seq in ring.find(start - start % resolution if resolution else start, end):
+                if resolution:
+                    record = ring.unpack(self._agg, seq)
+                    row = {'time': record[0], 'count': record[1]}
+                    for field, column in zip(fields, columns):
+                        mean, low, high = record[2 + 3 * column:5 + 3 * column]
+                        row[field] = _history_value(mean)
+                        row[f"{field}_min"] = _history_value(low)
+                        row[f"{field}_max"] = _history_value(high)
+                else:
+                    record = ring.unpack(self._raw, seq)
+                    row = {'time': record[0]}
+                    for field, column in zip(fields, columns):
+                        row[field] = _history_value(record[1 + column])
+                rows.append(row)
+        if step:
+            rows = _regroup_history(rows, fields, step)
+        return tier, rows
+
+
+def _history_value(value: float):
+    return None if value != value else round(value, 3)
+
+
+def _regroup_history(rows: list[dict], fields: list[str], step: float) -> list[dict]:
+    """Merge rows into step-wide buckets, weighting means by sample count."""
+    buckets: dict[float, dict] = {}
+    for row in rows:
+        start = row['time'] - row['time'] % step
+        count = row.get('count', 1)
+        bucket = buckets.setdefault(start, {'time': start, 'count': 0, 'weights': {}})
+        bucket['count'] += count
+        for field in fields:
+            value = row[field]
+            if value is None:
+                continue
+            low, high = row.get(f"{field}_min", value), row.get(f"{field}_max", value)
+            weight = bucket['weights'].get(field, 0)
+            if weight:
+                bucket[field] += value * count
+                bucket[f"{field}_min"] = min(bucket[f"{field}_min"], low)
+                bucket[f"{field}_max"] = max(bucket[f"{field}_max"], high)
+            else:
+                bucket[field] = value * count
+                bucket[f"{field}_min"], bucket[f"{field}_max"] = low, high
+            bucket['weights'][field] = weight + count
+    result = []
+    for bucket in buckets.values():
+        weights = bucket.pop('weights')
+        row = {'time': bucket['time'], 'count': bucket['count']}
+        for field in fields:
+            if field in weights:
+                row[field] = round(bucket[field] / weights[field], 3)
+                row[f"{field}_min"] = bucket[f"{field}_min"]
+                row[f"{field}_max"] = bucket[f"{field}_max"]
+            else:
+                row[field] = row[f"{field}_min"] = row[f"{field}_max"] = None
+        result.append(row)
+    return result
+
+
+def parse_duration(value: str) -> float:
+    """'90', '90s', '15m', '6h' or '30d' in seconds."""
+    units = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+    value = value.strip().lower()
+    if value and value[-1] in units:
+        return float(value[:-1]) * units[value[-1]]
+    return float(value)
+
+
+def parse_history_time(value: str, now: float) -> float:
+    """Epoch seconds, an ISO 8601 time, 'now' or an offset like '-6h'."""
+    value = value.strip()
+    if value == 'now':
+        return now
+    if value.startswith('-'):
+        return now - parse_duration(value[1:])
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
+
+
+def query_history(stores: dict, params: dict, now: float) -> dict:
+    """Run a history query given as strings (HTTP parameters, CLI options)."""
+    inverter = params.get('inverter') or next(iter(stores), None)
+    if inverter not in stores:
+        raise ValueError(f"No history for inverter {inverter!r}")
+    start = parse_history_time(params.get('start') or '-1h', now)
+    end = parse_history_time(params.get('end') or 'now', now)
+    fields = [field for field in (params.get('fields') or '').split(',') if field]
+    step = parse_duration(params['step']) if params.get('step') else None
+    tier, rows = stores[inverter].query(start, end, fields or None, step, params.get('tier') or None)
+    return {'inverter': inverter, 'tier': tier, 'start': start, 'end': end, 'rows': rows}
+
+
+# Stores of the running monitors by node id, for the /history endpoint
+HISTORY: dict[str, HistoryStore] = {}
+
+
+class ResponseTimes:
+    """Learn how fast each command is answered to size its read deadline.
+
+    Keeps the most recent response times (command sent to complete frame)
+    and transfer times (first reply byte to complete frame). The deadline
+    is a high percentile of the response times plus a margin, never above
+    the configured ceiling. A read that ran into its deadline counts as a
+    sample at the deadline, so repeated timeouts push it back up.
+    """
+
+    WINDOW = 64
+    MIN_SAMPLES = 8
+    PERCENTILE = 0.95
+    MARGIN = 0.15
+    FLOOR = 0.25
+
     def __init__(self):
+        self.response: dict[str, deque] = {}
+        self.transfer: dict[str, deque] = {}
+
+    def record(self, command: str, response: float, transfer: float | None = None):
+        self.response.setdefault(command, deque(maxlen=self.WINDOW)).append(response)
+        if transfer is not None:
+            self.transfer.setdefault(command, deque(maxlen=self.WINDOW)).append(transfer)
+
+    def deadline(self, command: str, ceiling: float) -> float:
+        """Read deadline for the command; the ceiling until enough is known."""
+        samples = self.response.get(command)
+        if not samples or len(samples) < self.MIN_SAMPLES:
+            return ceiling
+        learned = _percentile(samples, self.PERCENTILE) * 1.25 + self.MARGIN
+        return min(ceiling, max(self.FLOOR, learned))
+
+    def transfer_time(self, command: str) -> float | None:
+        """Time after the first byte by which most replies are complete."""
+        samples = self.transfer.get(command)
+        if not samples or len(samples) < self.MIN_SAMPLES:
+            return None
+        # Wake a little early rather than late; stragglers are still read
+        return _percentile(samples, 0.1)
+
+
+def _percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class SampleQueue:
+    """Bounded hand-off from the reader to the publishing sink.
+
+    put() never blocks the reader: when the queue is full, 'drop_oldest'
+    discards the oldest waiting sample and 'drop_newest' the one being
+    added. The sink waits in get() on a thread, or in get_async() when it
+    runs on the reader's event loop.
+    """
+
+    POLICIES = ('drop_oldest', 'drop_newest')
+
+    def __init__(self, size: int, policy: str = 'drop_oldest'):
+        self.size = max(1, size)
+        self.policy = policy if policy in self.POLICIES else 'drop_oldest'
+        self.closed = False
+        self.dropped = 0
+        self.high_water = 0
+        self._items: deque = deque()
+        self._cond = threading.Condition()
+        self._ready: asyncio.Event | None = None
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def put(self, sample: dict, now: float) -> bool:
+        """Queue a sample stamped with its monotonic time; False if one was dropped."""
+        with self._cond:
+            dropped = len(self._items) >= self.size
+            if dropped:
+                self.dropped += 1
+                if self.policy == 'drop_newest':
+                    return False
+                self._items.popleft()
+            self._items.append((now, sample))
+            self.high_water = max(self.high_water, len(self._items))
+            self._cond.notify()
+        if self._ready is not None:
+            self._ready.set()
+        return not dropped
+
+    def get_nowait(self):
+        with self._cond:
+            return self._items.popleft() if self._items else None
+
+    def get(self, timeout: float):
+        """Next (enqueued_at, sample), or None after timeout or once closed and empty."""
+        with self._cond:
+            if not self._items and not self.closed:
+                self._cond.wait(timeout)
+            return self._items.popleft() if self._items else None
+
+    async def get_async(self, timeout: float):
+        """get() for a sink on the same event loop as the reader"""
+        item = self.get_nowait()
+        if item is None and not self.closed:
+            if self._ready is None:
+                self._ready = asyncio.Event()
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            item = self.get_nowait()
+        return item
+
+    def close(self):
+        """Let the sink finish what is queued and stop."""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+        if self._ready is not None:
+            self._ready.set()
+
+
+class CycleClock:
+    """Absolute monotonic deadlines for the monitoring loop.
+
+    Tick k is due at origin + k * period, so time spent in a cycle and
+    wake-up jitter never accumulate. The origin can be aligned to wall-clock
+    multiples of the period, and shifted by a phase to stagger inverters.
+    When a cycle overruns later ticks, 'skip' resumes at the next tick in
+    the future and 'catch_up' runs the missed ticks back to back, at most
+    CATCH_UP_LIMIT of them.
+    """
+
+    POLICIES = ('skip', 'catch_up')
+    CATCH_UP_LIMIT = 3
+
+    def __init__(self, period: float, phase: float = 0.0, align: bool = False, policy: str = 'skip'):
+        self.period = period
+        self.phase = phase % period if period > 0 else 0.0
+        self.align = align
+        self.policy = policy if policy in self.POLICIES else 'skip'
+        self.ticks = 0
+        self.missed = 0
+        self.lateness = 0.0
+        self.max_lateness = 0.0
+
+    def start(self, now: float, wall: float | None = None) -> float:
+        """Monotonic time of the first tick."""
+        if self.align and self.period > 0:
+            wall = time.time() if wall is None else wall
+            return now + (self.phase - wall) % self.period
+        return now + self.phase
+
+    def begin(self, tick: float, now: float) -> float:
+        """Record that the cycle for a tick started; return its lateness."""
+        self.ticks += 1
+        self.lateness = max(0.0, now - tick)
+        self.max_lateness = max(self.max_lateness, self.lateness)
+        return self.lateness
+
+    def advance(self, tick: float, now: float) -> float:
+        """The tick after this one, following the missed-tick policy."""
+        if self.period <= 0:
+            return now
+        following = tick + self.period
+        if following > now:
+            return following
+        # Ticks following .. tick + behind * period are already in the past
+        behind = int((now - tick) // self.period)
+        keep = self.CATCH_UP_LIMIT if self.policy == 'catch_up' else 0
+        skipped = max(0, behind - keep)
+        self.missed += skipped
+        return following + skipped * self.period
+
+
+class CommandScheduler:
+    """Decide which inverter commands go on the bus in each cycle.
+
+    Every command has its own cadence. Commands are considered in priority
+    order (QPIGS first) and one that would push the cycle past its bus-time
+    budget, judged by its recent response time, is deferred to the next
+    cycle. The first due command is always sent.
+    """
+
+    def __init__(self, intervals: dict[str, float], budget: float, stagger: float = 0.0, slack: float = 0.0):
+        self.intervals = dict(intervals)
+        self.budget = budget
+        # Cadenced commands are offset by one stagger step each so they do
+        # not all land in the same cycle; slack absorbs cycle start jitter
+        cadenced = [cmd for cmd, interval in self.intervals.items() if interval > 0]
+        self.phase = {cmd: (i * stagger) % self.intervals[cmd] for i, cmd in enumerate(cadenced)}
+        self.slack = slack
+        self._cycle_at = None
+        self.next_due = {cmd: 0.0 for cmd in self.intervals}
+        self.cost: dict[str, float] = {}
+        self.sent = {cmd: 0 for cmd in self.intervals}
+        self.failed = {cmd: 0 for cmd in self.intervals}
+        self.deferred = {cmd: 0 for cmd in self.intervals}
+
+    def due(self, now: float) -> list[str]:
+        """Commands whose cadence has elapsed, in priority order."""
+        self._cycle_at = now
+        return [cmd for cmd in self.intervals if now >= self.next_due[cmd] - self.slack]
+
+    def fits(self, command: str, spent: float) -> bool:
+        """True if the command's expected bus time still fits the budget."""
+        if spent + self.cost.get(command, 0.0) <= self.budget:
+            return True
+        self.deferred[command] += 1
+        return False
+
+    def record(self, command: str, now: float, duration: float, ok: bool):
+        """Update the cost estimate and schedule the next poll.
+
+        Polls stay on the grid of the first one (plus the command's phase)
+        rather than drifting by the time each read took; polls that were
+        missed entirely are skipped.
+        """
+        previous = self.cost.get(command)
+        self.cost[command] = duration if previous is None else 0.7 * previous + 0.3 * duration
+        self.sent[command] += 1
+        if not ok:
+            self.failed[command] += 1
+        interval = self.intervals[command]
+        if interval <= 0:
+            self.next_due[command] = now
+            return
+        due = self.next_due[command]
+        if not due:
+            due = (now if self._cycle_at is None else min(self._cycle_at, now)) + self.phase.get(command, 0.0)
+        due += interval
+        if due <= now:
+            due += interval * ((now - due) // interval + 1)
+        self.next_due[command] = due
+
+    def request(self, command: str):
+        """Poll a command again in the next cycle regardless of its cadence."""
+        if command in self.next_due:
+            self.next_due[command] = 0.0
+
+    def disable(self, command: str):
+        """Stop polling a command the inverter does not support."""
+        if command != 'QPIGS' and command in self.intervals:
+            del self.intervals[command]
+            del self.next_due[command]
+
+
+class Backoff:
+    """Exponential backoff with jitter for reconnect attempts.
+
+    Each delay is drawn from the upper half of an exponentially growing
+    window, so clients restarted together do not hit the broker in step.
+    """
+
+    def __init__(self, initial: float = 1.0, cap: float = 60.0):
+        self.initial = initial
+        self.cap = cap
+        self.attempts = 0
+
+    def next(self) -> float:
+        window = min(self.cap, self.initial * 2 ** self.attempts)
+        self.attempts += 1
+        return random.uniform(window / 2, window)
+
+    def reset(self):
+        self.attempts = 0
+
+
+class TokenBucket:
+    """Rate limit by elapsed time: `rate` tokens per second, at most `burst` saved up.
+
+    How often take() is called does not matter, so a caller woken on every
+    sample tick gets the same average rate as one woken once per interval.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self._at: float | None = None
+
+    def available(self, now: float) -> int:
+        """Whole tokens that may be spent at `now`."""
+        if self._at is not None and now > self._at:
+            self.tokens = min(self.burst, self.tokens + (now - self._at) * self.rate)
+        self._at = now if self._at is None else max(now, self._at)
+        return int(self.tokens)
+
+    def spend(self, count: int):
+        self.tokens -= count
+
+
+class MQTTLoopThread:
+    """Run paho's network loop on a thread, connecting in the background.
+
+    Replaces loop_start(): the first connection attempt does not block
+    start-up, failed attempts are retried with jittered backoff for as long
+    as it takes, and a dropped connection is re-established the same way.
+    """
+
+    def __init__(self, client, host: str, port: int, keepalive: int = 60):
+        self.client = client
+        self.host = host
+        self.port = port
+        self.keepalive = keepalive
+        self.backoff = Backoff()
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='mqtt', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        """Disconnect cleanly (flushing queued messages) and end the thread."""
+        if self.client.is_connected():
+            self.client.disconnect()
+        self._stopping.set()
+        self._thread.join(timeout)
+
+    def _run(self):
+        client = self.client
+        session_up = False
+        while True:
+            if client.socket() is None:
+                if self._stopping.is_set():
+                    return
+                try:
+                    client.connect(self.host, self.port, self.keepalive)
+                    session_up = False
+                except Exception as e:
+                    self._retry_later(f"MQTT connection to {self.host}:{self.port} failed: {e}")
+                    continue
+            client.loop(timeout=1.0)
+            if client.is_connected():
+                session_up = True
+                self.backoff.reset()
+            elif self._stopping.is_set():
+                if client.socket() is not None:
+                    # Still waiting for CONNACK: give up instead
+                    client.disconnect()
+                return
+            elif client.socket() is None and not session_up:
+                # The broker closed the connection before accepting it
+                self._retry_later("MQTT connection refused")
+
+    def _retry_later(self, reason: str):
+        METRICS.inc('mpp_solar_mqtt_connect_failures_total')
+        delay = self.backoff.next()
+        logger.warning(f"{reason}, retrying in {delay:.1f}s")
+        self._stopping.wait(delay)
+
+
+class AsyncioMQTTBridge:
+    """Drive a paho client from an asyncio loop instead of its network thread.
+
+    Socket readiness is dispatched by the event loop (paho's external loop
+    hooks), and publish() can be awaited until paho has handed the message
+    to the broker. connect() blocks on DNS and the TCP handshake, so it runs
+    on an executor thread; the socket hooks it triggers there are handed
+    back to the loop.
+    """
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, client):
+        self.loop = loop
+        self.client = client
+        self._loop_thread = threading.get_ident()
+        self.connected = asyncio.Event()
+        self._pending: dict[int, asyncio.Future] = {}
+        self._misc_task = None
+        self._on_connect = client.on_connect
+        client.on_connect = self._handle_connect
+        client.on_publish = self._handle_publish
+        client.on_socket_open = self._in_loop(self._on_socket_open)
+        client.on_socket_close = self._in_loop(self._on_socket_close)
+        client.on_socket_register_write = self._in_loop(self._on_socket_register_write)
+        client.on_socket_unregister_write = self._in_loop(self._on_socket_unregister_write)
+
+    def _in_loop(self, callback):
+        """Wrap a paho hook so it always runs on the event loop thread."""
+        def hook(*args):
+            if threading.get_ident() == self._loop_thread:
+                callback(*args)
+            else:
+                self.loop.call_soon_threadsafe(callback, *args)
+        return hook
+
+    def _handle_connect(self, client, userdata, flags, rc):
+        if rc == 0:
+            self.connected.set()
+        if self._on_connect:
+            self._on_connect(client, userdata, flags, rc)
+
+    def _handle_publish(self, client, userdata, mid):
+        future = self._pending.pop(mid, None)
+        if future is not None and not future.done():
+            future.set_result(True)
+
+    def _on_socket_open(self, client, userdata, sock):
+        self.loop.add_reader(sock, client.loop_read)
+        self._misc_task = self.loop.create_task(self._misc_loop())
+
+    def _on_socket_close(self, client, userdata, sock):
+        self.connected.clear()
+        self.loop.remove_reader(sock)
+        if self._misc_task is not None:
+            self._misc_task.cancel()
+            self._misc_task = None
+        # QoS 0 messages still queued on a dead socket will never complete
+        for future in self._pending.values():
+            if not future.done():
+                future.set_result(False)
+        self._pending.clear()
+
+    def _on_socket_register_write(self, client, userdata, sock):
+        self.loop.add_writer(sock, client.loop_write)
+
+    def _on_socket_unregister_write(self, client, userdata, sock):
+        self.loop.remove_writer(sock)
+
+    async def _misc_loop(self):
+        """Keepalive and retry housekeeping paho normally does in its thread."""
+        while self.client.loop_misc() == mqtt.MQTT_ERR_SUCCESS:
+            await asyncio.sleep(1)
+
+    async def maintain(self, host: str, port: int, keepalive: int = 60):
+        """Connect, then reconnect whenever the socket drops."""
+        backoff = Backoff()
+        while True:
+            if self.client.socket() is None:
+                try:
+                    await self.loop.run_in_executor(None, self.client.connect, host, port, keepalive)
+                except Exception as e:
+                    METRICS.inc('mpp_solar_mqtt_connect_failures_total')
+                    delay = backoff.next()
+                    logger.warning(f"MQTT connection failed: {e}, retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+                    continue
+            await asyncio.sleep(1)
+            if self.connected.is_set():
+                backoff.reset()
+
+    async def publish(self, topic: str, payload, qos: int = 0, retain: bool = False,
+                      timeout: float = 5.0) -> bool:
+        """Publish and wait until paho reports the message as sent."""
+        info = self.client.publish(topic, payload, qos=qos, retain=retain)
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            logger.debug(f"Publish to {topic} not queued: rc={info.rc}")
+            return False
+        if info.is_published():
+            return True
+        future = self.loop.create_future()
+        self._pending[info.mid] = future
+        try:
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Publish to {topic} not confirmed within {timeout:.1f}s")
+            return False
+        finally:
+            self._pending.pop(info.mid, None)
+
+
+def parse_device_list(spec: str) -> list[str]:
+    """Split the comma separated device option into hidraw paths."""
+    devices = [item.strip() for item in spec.split(',') if item.strip()]
+    return devices or ['/dev/hidraw0']
+
+
+class MPPSolarMonitor:
+    def __init__(self, device: str | None = None, index: int = 0):
         # Get config from environment
-        self.device = os.environ.get('DEVICE', '/dev/hidraw0')
+        # A path, or usb:VID:PID[@N] resolved to whichever hidraw node it has now
+        self.device_spec = device or parse_device_list(os.environ.get('DEVICE', '/dev/hidraw0'))[0]
+        # hidraw, serial (tty) or tcp (ser2net and similar bridges)
+        self.transport, target = parse_transport(self.device_spec)
+        self.device = resolve_device(target) or target if self.transport == 'hidraw' else target
+        self.index = index
         self.interval = int(os.environ.get('INTERVAL', '30'))
         self.mqtt_host = os.environ.get('MQTT_HOST', 'localhost')
         self.mqtt_port = int(os.environ.get('MQTT_PORT', '1883'))
         self.mqtt_user = os.environ.get('MQTT_USERNAME', '')
         self.mqtt_pass = os.environ.get('MQTT_PASSWORD', '')
-        self.mqtt_topic = os.environ.get('MQTT_TOPIC', 'mpp_solar')
+        # The first inverter keeps the historic topic and entity ids; further
+        # units get a numeric suffix so they show up as separate HA devices
+        suffix = f"_{index + 1}" if index else ""
+        self.base_topic = os.environ.get('MQTT_TOPIC', 'mpp_solar')
+        self.mqtt_topic = f"{self.base_topic}{suffix}"
+        self.node_id = f"mpp_solar{suffix}"
+        self.device_name = f"MPP Solar PIP5048MG {index + 1}" if index else "MPP Solar PIP5048MG"
         self.debug = os.environ.get('DEBUG', 'false').lower() == 'true'
         self.crc_strict = os.environ.get('CRC_STRICT', 'false').lower() == 'true'
+        self.engine = os.environ.get('ENGINE', 'threaded').lower()
+        self.commands = parse_command_intervals(os.environ.get('COMMANDS', DEFAULT_COMMANDS))
+        self.poll_budget = float(os.environ.get('POLL_BUDGET', '0') or 0)
+        self.publish_heartbeat = float(os.environ.get('PUBLISH_HEARTBEAT', '0') or 0)
+        self.deadbands = parse_deadbands(os.environ.get('DEADBANDS', ''))
+        self.state_topics = os.environ.get('STATE_TOPICS', 'json').lower()
+        self.backfill_samples = int(os.environ.get('BACKFILL_SAMPLES', '2880') or 0)
+        self.backfill_rate = float(os.environ.get('BACKFILL_RATE', '10') or 10)
+        self.data_dir = os.environ.get('DATA_DIR', '/data')
+        sample_interval = float(os.environ.get('SAMPLE_INTERVAL', '0') or 0)
+        self.sample_interval = min(sample_interval, self.interval) if sample_interval > 0 else self.interval
+        # Up to one interval's worth in one go, then backfill_rate/s however often the drain runs
+        self.backfill_limiter = TokenBucket(self.backfill_rate, max(1.0, self.backfill_rate * self.interval))
+        self.metrics_port = int(os.environ.get('METRICS_PORT', '0') or 0)
+        self.align_to_clock = os.environ.get('ALIGN_TO_CLOCK', 'false').lower() == 'true'
+        self.missed_ticks = os.environ.get('MISSED_TICKS', 'skip').lower()
+        self.publish_queue = int(os.environ.get('PUBLISH_QUEUE', '16') or 0)
+        self.queue_policy = os.environ.get('QUEUE_POLICY', 'drop_oldest').lower()
+        self.adaptive_deadline = os.environ.get('ADAPTIVE_DEADLINE', 'true').lower() == 'true'
+        self.capture_frames = os.environ.get('CAPTURE_FRAMES', 'false').lower() == 'true'
+        self.capture_max_mb = int(os.environ.get('CAPTURE_MAX_MB', '64') or 64)
+        self.history_hours = float(os.environ.get('HISTORY_HOURS', '24') or 0)
+        self.baud_rate = int(os.environ.get('BAUD_RATE', '2400') or 2400)
+        if self.baud_rate not in SERIAL_BAUD_RATES:
+            raise ValueError(
+                f"Unsupported baud_rate {self.baud_rate}, expected one of "
+                + ", ".join(map(str, SERIAL_BAUD_RATES))
+            )
+        self.log_summary_interval = float(os.environ.get('LOG_SUMMARY_INTERVAL', '300') or 0)
         
         if self.debug:
             logger.setLevel(logging.DEBUG)
             
         logger.info("MPP Solar Monitor starting...")
-        logger.info(f"Device: {self.device}")
+        if self.device_spec != self.device:
+            logger.info(f"Device: {self.device_spec} ({self.device})")
+        else:
+            logger.info(f"Device: {self.device}")
+        if self.transport == 'serial':
+            logger.info(f"Serial: {self.baud_rate} baud 8N1")
         logger.info(f"MQTT: {self.mqtt_host}:{self.mqtt_port}")
         logger.info(f"Topic: {self.mqtt_topic}")
         logger.info(f"Interval: {self.interval}s")
+        if self.sample_interval < self.interval:
+            logger.info(f"Sampling every {self.sample_interval:g}s, publishing mean/min/max per interval")
+        logger.info(f"Engine: {self.engine}")
+        logger.info("Commands: " + ", ".join(
+            f"{cmd} every {'cycle' if cadence <= 0 else f'{cadence:g}s'}"
+            for cmd, cadence in self.commands.items()
+        ))
         
         self.mqtt_client = None
+        self.mqtt_bridge = None
+        self.mqtt_loop: MQTTLoopThread | None = None
+        self.started_at = time.monotonic()
+        self.first_published_at: float | None = None
         self.device_available = False
-        self.response_buffer = b""
+        # Device presence; shares the LWT topic unless a fleet moves it
+        self.availability_topic = f"{self.mqtt_topic}/availability"
+        # Fleet units wait for their device again instead of giving up
+        self.keep_waiting = False
+        if self.transport == 'serial':
+            self.session = SerialSession(self.device, self.baud_rate)
+        elif self.transport == 'tcp':
+            self.session = TCPSession(self.device)
+        else:
+            self.session = HIDSession(self.device)
+        self.watcher: DeviceWatcher | None = None
+        self.stop_event = threading.Event()
+        self._command_cache: dict[str, bytes] = {}
+        self.scheduler = CommandScheduler(
+            self.commands, self.get_poll_budget_seconds(),
+            stagger=self.sample_interval, slack=self.sample_interval / 2,
+        )
+        self.clock = CycleClock(self.sample_interval, align=self.align_to_clock, policy=self.missed_ticks)
+        self.response_times = ResponseTimes()
+        # Per-cycle read problems are logged once, then summarised periodically
+        self.warnings = WarningAggregator(self.log_summary_interval)
+        self.discovery_prefix = 'homeassistant'
+        self.discovery_stats: dict[str, int] = {}
+        self._discovery_key = None
+        self._discovery_cache: dict[str, str] = {}
+        self._discovery_hashes: dict[str, str] = {}
+        self._broker_discovery: dict[str, str] = {}
+        self._discovery_timer = None
+        self.backfill: SampleBuffer | None = None
+        # Replayed samples awaiting their PUBACK: (sequence, message info), oldest first
+        self._backfill_unacked: list = []
+        self._backfill_sent_at = 0.0
+        self.history: HistoryStore | None = None
+        # Without a queue, samples are published inline by the reader
+        self.queue = SampleQueue(self.publish_queue, self.queue_policy) if self.publish_queue > 0 else None
+        self._dropping = False
+        self.aggregator = SampleAggregator(
+            s["id"] for s in SENSORS if s.get("state_class") == "measurement"
+        )
+        self.energy = EnergyIntegrator(
+            os.path.join(self.data_dir, f"energy_{self.node_id}.json")
+            if os.path.isdir(self.data_dir) else None,
+            max_gap=max(60.0, 3 * self.sample_interval),
+        )
+        self._window_started: float | None = None
+        self.publish_filter = PublishFilter(self.deadbands, self.publish_heartbeat)
+        # Last decoded values of commands that are not polled every cycle
+        self.extra_state: dict = {}
+        self.qpigs_decoder: QPIGSDecoder | None = None
+        self._qpigs_layout = None
+        self._qpigs_layout_votes = 0
 
     def get_read_deadline_seconds(self) -> float:
         """Bound inverter read time so the loop can stay responsive."""
-        return max(1.2, min(2.0, self.interval * 0.4))
+        # A cycle lasts one sample_interval when oversampling, else one interval
+        return max(1.2, min(2.0, self.sample_interval * 0.4))
+
+    def read_deadline(self, command: str) -> float:
+        """Deadline for one command, learned from its response times."""
+        ceiling = self.get_read_deadline_seconds()
+        if not self.adaptive_deadline:
+            return ceiling
+        return self.response_times.deadline(command, ceiling)
+
+    def expected_transfer_seconds(self, command: str) -> float | None:
+        """How long after the first reply byte to wait before reading on."""
+        if not self.adaptive_deadline:
+            return None
+        return self.response_times.transfer_time(command)
+
+    def get_poll_budget_seconds(self) -> float:
+        """Bus time per cycle shared by all due commands."""
+        if self.poll_budget > 0:
+            return self.poll_budget
+        return max(self.get_read_deadline_seconds(), self.sample_interval * 0.5)
 
     def get_poll_timeout_seconds(self) -> float:
         """Short poll slices let us stop as soon as a full frame is available."""
@@ -59,7 +2705,7 @@ class MPPSolarMonitor:
         if finished_at is None:
             finished_at = time.monotonic()
         elapsed = max(0.0, finished_at - started_at)
-        return max(0.0, self.interval - elapsed)
+        return max(0.0, self.sample_interval - elapsed)
 
     def has_complete_response_frame(self, response: bytes) -> bool:
         """Return True only when the full '(payload)CRC\\r' frame is present."""
@@ -101,8 +2747,8 @@ class MPPSolarMonitor:
             remaining = remaining[next_start:]
         return frame, remaining
 
-    def extract_values_from_response(self, response: bytes) -> list[str] | None:
-        """Extract QPIGS values from a complete or partial ASCII response."""
+    def extract_values_from_response(self, response: bytes, min_values: int = 17) -> list[str] | None:
+        """Extract reply values (QPIGS by default) from a complete or partial ASCII response."""
         if not response:
             return None
 
@@ -122,7 +2768,7 @@ class MPPSolarMonitor:
             data_str = text[1:].rstrip('\r\n')
 
         values = data_str.split()
-        if len(values) >= 17:
+        if len(values) >= min_values:
             return values
         return None
 
@@ -134,204 +2780,480 @@ class MPPSolarMonitor:
                 s = str(s)
             except Exception:
                 return False
-        if len(s) < 8 or len(s) > 12:
-            return False
-        return set(s) <= {"0", "1"}
+        return looks_like_status_field(s)
         
-    def crc16_xmodem(self, data):
-        """Calculate CRC16 XMODEM"""
-        crc = 0x0000
-        for byte in data:
-            crc ^= byte << 8
-            for _ in range(8):
-                if crc & 0x8000:
-                    crc = (crc << 1) ^ 0x1021
-                else:
-                    crc <<= 1
-                crc &= 0xFFFF
-        return crc
+    def crc16_xmodem(self, data, crc=0x0000):
+        """Calculate CRC16 XMODEM, optionally continuing from a previous value"""
+        return crc16_xmodem_update(crc, data)
     
     def create_command(self, cmd_str):
-        """Create command with CRC"""
-        cmd_bytes = cmd_str.encode('ascii')
-        crc = self.crc16_xmodem(cmd_bytes)
-        return cmd_bytes + crc.to_bytes(2, 'big') + b'\r'
+        """Create command with CRC (encoded once per command string)"""
+        cmd = self._command_cache.get(cmd_str)
+        if cmd is None:
+            cmd_bytes = cmd_str.encode('ascii')
+            crc = self.crc16_xmodem(cmd_bytes)
+            cmd = cmd_bytes + crc.to_bytes(2, 'big') + b'\r'
+            self._command_cache[cmd_str] = cmd
+        return cmd
     
+    def _resolve_device(self):
+        """Follow a USB id to the node it was (re-)enumerated as"""
+        if self.transport != 'hidraw':
+            return
+        device = resolve_device(self.device_spec)
+        if device and device != self.device:
+            logger.info(f"Device {self.device_spec} is now {device}")
+            self.session.close()
+            self.session.buffer = b""
+            self.device = self.session.device = device
+
+    def _watch_device(self):
+        """Start watching the device's directory for node events"""
+        if self.watcher is None and self.session.HAS_NODE:
+            self.watcher = DeviceWatcher.create(os.path.dirname(self.device) or '/dev')
+
+    def _device_removed(self) -> bool:
+        """True if the device node is gone (or now belongs to another id)"""
+        if not self.session.HAS_NODE:
+            # A dropped connection is re-established by the session itself
+            return False
+        if self.watcher is not None:
+            self.watcher.read_events()
+        if not os.path.exists(self.device):
+            return True
+        return (
+            self.transport == 'hidraw' and self.device_spec != self.device
+            and resolve_device(self.device_spec) != self.device
+        )
+
+    def _device_accessible(self) -> bool:
+        """Check once whether the device is available (connect to a bridge)"""
+        if not self.session.HAS_NODE:
+            # Connect now; the connection is kept for the first read
+            try:
+                self.session.open()
+                return True
+            except OSError as e:
+                logger.warning(f"Cannot connect to {self.device}: {e}")
+                return False
+        return self._device_node_accessible()
+
+    async def _device_accessible_async(self) -> bool:
+        """_device_accessible() that connects without blocking the event loop"""
+        if not self.session.HAS_NODE:
+            try:
+                await self.session.open_async()
+                return True
+            except OSError as e:
+                logger.warning(f"Cannot connect to {self.device}: {e}")
+                return False
+        return self._device_node_accessible()
+
+    def _device_node_accessible(self) -> bool:
+        """Check once whether the device node exists and can be opened"""
+        self._resolve_device()
+        if os.path.exists(self.device):
+            try:
+                # Check permissions (no chmod in container)
+                if not os.access(self.device, os.R_OK | os.W_OK):
+                    logger.warning(f"Device {self.device} not accessible")
+                else:
+                    logger.info(f"Device {self.device} found and accessible")
+                    return True
+            except Exception as e:
+                logger.warning(f"Cannot access device: {e}")
+        return False
+
     def wait_for_device(self):
-        """Wait for device to be available"""
+        """Wait for device to be available, woken by /dev events when possible"""
+        self._watch_device()
+        deadline = time.monotonic() + DEVICE_WAIT_SECONDS
         retry_count = 0
-        while retry_count < 30:  # Try for 5 minutes
-            if os.path.exists(self.device):
-                try:
-                    # Check permissions (no chmod in container)
-                    if not os.access(self.device, os.R_OK | os.W_OK):
-                        logger.warning(f"Device {self.device} not accessible")
-                    else:
-                        logger.info(f"Device {self.device} found and accessible")
-                        return True
-                except Exception as e:
-                    logger.warning(f"Cannot access device: {e}")
+        announced = False
+        while retry_count < 30 and time.monotonic() < deadline:  # Try for 5 minutes
+            if self._device_accessible():
+                self._set_device_available(True)
+                return True
             
-            if retry_count == 0:
-                logger.info(f"Waiting for device {self.device}...")
+            if not announced:
+                logger.info(f"Waiting for device {self.device_spec}...")
+                self._set_device_available(False)
+                announced = True
             
-            time.sleep(10)
-            retry_count += 1
+            if self.watcher is not None and not os.path.exists(self.device):
+                # Wakes as soon as a node is created or gets its permissions
+                self.watcher.wait(min(10, deadline - time.monotonic()))
+            else:
+                time.sleep(10)
+                retry_count += 1
             
-        logger.error(f"Device {self.device} not found after 5 minutes")
+        logger.error(f"Device {self.device_spec} not found after 5 minutes")
         return False
+
+    async def wait_for_device_async(self):
+        """Wait for device to be available without blocking the event loop"""
+        self._watch_device()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + DEVICE_WAIT_SECONDS
+        retry_count = 0
+        announced = False
+        while retry_count < 30 and loop.time() < deadline:  # Try for 5 minutes
+            if await self._device_accessible_async():
+                self._set_device_available(True)
+                return True
+            if not announced:
+                logger.info(f"Waiting for device {self.device_spec}...")
+                self._set_device_available(False)
+                announced = True
+            if self.watcher is not None and not os.path.exists(self.device):
+                await self._watcher_wait_async(min(10, deadline - loop.time()))
+            else:
+                await asyncio.sleep(10)
+                retry_count += 1
+
+        logger.error(f"Device {self.device_spec} not found after 5 minutes")
+        return False
+
+    def _set_device_available(self, available: bool):
+        """Track device presence and mirror changes on the availability topic"""
+        if available == self.device_available:
+            return
+        self.device_available = available
+        if self.mqtt_client:
+            self.mqtt_client.publish(
+                self.availability_topic,
+                "online" if available else "offline",
+                qos=1,
+                retain=True
+            )
+
+    async def _watcher_wait_async(self, timeout: float) -> bool:
+        """DeviceWatcher.wait() driven by the event loop"""
+        loop = asyncio.get_running_loop()
+        changed = asyncio.Event()
+        loop.add_reader(self.watcher.fileno(), changed.set)
+        try:
+            await asyncio.wait_for(changed.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            loop.remove_reader(self.watcher.fileno())
+        return bool(self.watcher.read_events())
     
     def read_inverter_data(self):
         """Read data from inverter via HID"""
+        return self.read_command('QPIGS')
+
+    async def read_inverter_data_async(self):
+        """Read data from inverter without blocking the event loop"""
+        return await self.read_command_async('QPIGS')
+
+    def read_command(self, command):
+        """Send one command and decode its reply"""
         try:
-            logger.debug(f"Opening device {self.device}")
-            
-            # Use non-blocking approach with timeout
-            import select
-            import os
-            
-            fd = os.open(self.device, os.O_RDWR | os.O_NONBLOCK)
-            try:
-                logger.debug("Device opened successfully")
-                
-                # Send QPIGS command
-                cmd = self.create_command('QPIGS')
-                logger.debug(f"Sending QPIGS command: {cmd.hex()}")
-                os.write(fd, cmd)
-                
-                # Read until full frame is available or deadline is reached
-                logger.debug("Waiting for response...")
-                response = self.response_buffer
-                deadline = time.monotonic() + self.get_read_deadline_seconds()
+            session = self.session
+            self._send_command(command)
+
+            # Read until full frame is available or deadline is reached
+            logger.debug("Waiting for response...")
+            reader = FrameReader(session)
+            deadline = time.monotonic() + self.read_deadline(command)
+            settle = self.expected_transfer_seconds(command)
+            # Once the timing is known, block until bytes or the deadline
+            if settle is None:
                 poll_timeout = self.get_poll_timeout_seconds()
-                frame = None
+            else:
+                poll_timeout = max(0.0, deadline - time.monotonic())
+
+            while not reader.complete and time.monotonic() < deadline:
+                remaining = max(0.0, deadline - time.monotonic())
+                if not session.wait_readable(min(poll_timeout, remaining)):
+                    continue
+                reader.read_chunk()
+                if settle is not None and reader.first_byte_at is not None and not reader.complete:
+                    # Let the rest of the reply arrive instead of waking per HID report
+                    time.sleep(max(0.0, min(reader.first_byte_at + settle, deadline) - time.monotonic()))
+                    settle = None
+
+            return self._finish_read(reader, command)
+        except Exception as e:
+            self._handle_read_error(e)
+        return None
+
+    async def read_command_async(self, command):
+        """Send one command, woken by the event loop as reply bytes arrive"""
+        loop = asyncio.get_running_loop()
+        try:
+            session = self.session
+            await session.open_async()
+            self._send_command(command)
+
+            logger.debug("Waiting for response...")
+            reader = FrameReader(session)
+            if not reader.complete:
+                done = loop.create_future()
+                watched_fd = session.fd
+                settle = self.expected_transfer_seconds(command)
+                resume = None
+
+                def on_resume():
+                    loop.add_reader(watched_fd, on_readable)
+
+                def on_readable():
+                    nonlocal watched_fd, settle, resume
+                    try:
+                        complete = reader.read_chunk()
+                    except Exception as e:
+                        loop.remove_reader(watched_fd)
+                        if not done.done():
+                            done.set_exception(e)
+                        return
+                    if session.fd is None:
+                        # Connection dropped; a new one would not carry this reply
+                        loop.remove_reader(watched_fd)
+                        if not done.done():
+                            done.set_result(False)
+                        return
+                    if session.fd != watched_fd:
+                        # Session reopened the node; follow the new fd
+                        loop.remove_reader(watched_fd)
+                        watched_fd = session.fd
+                        loop.add_reader(watched_fd, on_readable)
+                    if complete:
+                        # Stop reading; a hang-up right after the reply would reopen and drop it
+                        loop.remove_reader(watched_fd)
+                        if not done.done():
+                            done.set_result(True)
+                    elif settle is not None and reader.first_byte_at is not None:
+                        # Let the rest of the reply arrive instead of waking per HID report
+                        delay = reader.first_byte_at + settle - time.monotonic()
+                        settle = None
+                        if delay > 0:
+                            loop.remove_reader(watched_fd)
+                            resume = loop.call_later(delay, on_resume)
+
+                loop.add_reader(watched_fd, on_readable)
+                try:
+                    await asyncio.wait_for(done, self.read_deadline(command))
+                except asyncio.TimeoutError:
+                    pass
+                finally:
+                    if resume is not None:
+                        resume.cancel()
+                    loop.remove_reader(watched_fd)
+
+            return self._finish_read(reader, command)
+        except Exception as e:
+            self._handle_read_error(e)
+        return None
+
+    def _send_command(self, cmd_str):
+        """Open the session if needed and send one command"""
+        cmd = self.create_command(cmd_str)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Sending {cmd_str} command: {cmd.hex()}")
+        session = self.session
+        if session.buffer and session.buffer_command != cmd_str:
+            # Leftovers of another command's reply would be misread as ours
+            logger.debug("Dropping %d buffered bytes from %s", len(session.buffer), session.buffer_command)
+            session.buffer = b""
+        session.buffer_command = cmd_str
+        session.open()
+        session.write(cmd)
+
+    def warn(self, kind: str, message: str, *args, level: int = logging.WARNING):
+        """Log a problem that can recur every cycle, aggregated by kind"""
+        METRICS.inc('mpp_solar_warnings_total', inverter=self.node_id, kind=kind)
+        self.warnings.log(kind, level, message, *args)
+
+    def _handle_read_error(self, e):
+        """Log a failed read; a missing node marks the device unavailable"""
+        if isinstance(e, FileNotFoundError):
+            logger.error(f"Device {self.device} not found")
+            self._set_device_available(False)
+            return
+        logger.error(f"Error reading inverter: {e}")
+        import traceback
+        logger.debug(f"Traceback: {traceback.format_exc()}")
+
+    def _finish_read(self, reader, command='QPIGS'):
+        """Keep leftover bytes for the next cycle and decode the command reply"""
+        spec = POLL_COMMANDS[command]
+        response = reader.response
+        tracker = reader.tracker
+        frame = None
+        self._record_read_metrics(reader, command)
+        if reader.complete:
+            frame = bytes(response[tracker.frame_start:tracker.frame_end])
+            if self.session.capture is not None:
+                self.session.capture.record(FrameCapture.FRAME, frame)
+            computed_crc = tracker.crc
+            expected_crc = tracker.expected_crc(response)
+            response = response[tracker.frame_end:]
+        # Skip hidraw NUL padding (and noise) up to the next frame
+        start = response.find(b'(')
+        response = response[start:] if start != -1 else b""
+        self.session.buffer = bytes(response[-512:])
+
+        if frame is not None:
+            response = frame
+            debug = logger.isEnabledFor(logging.DEBUG)
+            if debug:
+                logger.debug(f"Received response: {len(response)} bytes")
+
+            if len(response) > 5:
+                if debug:
+                    logger.debug(f"Response hex: {response[:80].hex()}")
+
+                # CRC was computed while streaming; verify against the trailer
+                try:
+                    frame = response[:-3]  # includes parentheses
+                    if computed_crc != expected_crc:
+                        self.warn(
+                            'crc_mismatch', "CRC mismatch: expected=0x%04X computed=0x%04X",
+                            expected_crc, computed_crc,
+                        )
+                        METRICS.inc('mpp_solar_crc_mismatches_total', inverter=self.node_id)
+                        if self.crc_strict:
+                            return None
+
+                    # Decode ASCII payload between parentheses
+                    parse_started = time.perf_counter()
+                    text = str(frame, 'ascii', errors='ignore')
+                    if debug:
+                        logger.debug(f"Decoded text: {text[:100]}")
+                    if not text.startswith('(') or not text.endswith(')'):
+                        self.warn('malformed_frame', "Malformed frame text, skipping")
+                        return None
+
+                    data_str = text[1:-1]
+                    values = data_str.split()
+                    if debug:
+                        logger.debug(f"Parsed values count: {len(values)}")
+
+                    if len(values) >= spec['min_values']:
+                        if debug:
+                            logger.debug(f"Successfully parsed {command} data")
+                        decoded = self._decode_values(command, values)
+                        METRICS.observe(
+                            'mpp_solar_parse_seconds', time.perf_counter() - parse_started,
+                            inverter=self.node_id, command=command,
+                        )
+                        return decoded
+                    else:
+                        self.warn(
+                            f'short_{command}', "Invalid %s response length: %d (need >=%d), values: %s",
+                            command, len(values), spec['min_values'], values,
+                        )
+                except Exception as e:
+                    self.warn('parse_error', "Frame/CRC parse error: %s", e)
+            else:
+                self.warn('short_response', "Short response: %d bytes: %s", len(response), bytes(response).hex())
+        elif response:
+            # Partial frame: leave out the NUL padding of the last HID report
+            end = len(response)
+            while end and response[end - 1] == 0:
+                end -= 1
+            response = response[:end]
+            if response[:4] == b'(NAK':
+                # "(NAKss" has no closing parenthesis, so it never frames
+                return self._decode_values(command, ['NAK'])
+            values = self.extract_values_from_response(response, spec['min_values'])
+            if values is not None:
+                METRICS.inc('mpp_solar_partial_frames_total', inverter=self.node_id)
+                self.warn(
+                    'partial_frame', "Using partial %s response with %d values", command, len(values),
+                    level=logging.INFO,
+                )
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"Partial response hex: {response[:80].hex()}")
+                return self._decode_values(command, values)
+            self.warn('incomplete_frame', "Incomplete %s response frame, skipping this cycle", command)
+        else:
+            self.warn(
+                f'timeout_{command}', "No response from inverter within %.2fs timeout", self.read_deadline(command),
+            )
+        return None
 
-                while time.monotonic() < deadline:
-                    frame, response = self.extract_complete_response_frame(response)
-                    if frame is not None:
-                        break
+    def _record_read_metrics(self, reader, command):
+        """Stage latencies of one command and the session counters"""
+        labels = {'inverter': self.node_id, 'command': command}
+        if reader.first_byte_at is not None:
+            METRICS.observe('mpp_solar_first_byte_seconds', reader.first_byte_at - reader.started, **labels)
+        if reader.complete:
+            METRICS.observe('mpp_solar_frame_seconds', reader.completed_at - reader.started, **labels)
+            if not reader.buffered:
+                self.response_times.record(
+                    command, reader.completed_at - reader.started, reader.completed_at - reader.first_byte_at
+                )
+        else:
+            METRICS.inc('mpp_solar_timeouts_total', **labels)
+            self.response_times.record(command, self.read_deadline(command))
+        METRICS.observe('mpp_solar_crc_seconds', reader.crc_seconds, **labels)
+        METRICS.set('mpp_solar_read_deadline_seconds', self.read_deadline(command), **labels)
+        transfer = self.expected_transfer_seconds(command)
+        if transfer is not None:
+            METRICS.set('mpp_solar_expected_transfer_seconds', transfer, **labels)
+        METRICS.set_total('mpp_solar_device_reopens_total', self.session.reopen_count, inverter=self.node_id)
 
-                    remaining = max(0.0, deadline - time.monotonic())
-                    ready, _, _ = select.select([fd], [], [], min(poll_timeout, remaining))
-                    if not ready:
-                        continue
+    def _decode_values(self, command, values):
+        """Run the command's parser; a NAK disables the command"""
+        if values[0].startswith('NAK'):
+            logger.warning(f"Inverter rejected {command} (NAK), no longer polling it")
+            self.scheduler.disable(command)
+            return None
+        return getattr(self, POLL_COMMANDS[command]['parser'])(values)
 
-                    chunk = os.read(fd, 512)
-                    if not chunk:
-                        continue
+    def detect_qpigs_layout(self, values):
+        """Locate the variant-dependent status and discharge current fields"""
+        return detect_qpigs_layout(values)
 
-                    response += chunk
-                    logger.debug(f"Received chunk: {len(chunk)} bytes, total={len(response)}")
+    def decode_qpigs(self, values):
+        """Decode QPIGS with the compiled layout, learning it from the first frames"""
+        decoder = self.qpigs_decoder
+        if decoder is not None:
+            try:
+                data = decoder.decode(values)
+                # Another layout has to be confirmed by consecutive frames
+                self._qpigs_layout_votes = 0
+                return data
+            except QPIGSLayoutMismatch as e:
+                # Keep the layout: a partial or garbled frame says nothing about it
+                logger.debug("QPIGS frame does not match the learned layout (%s), detecting", e)
 
-                    frame, response = self.extract_complete_response_frame(response)
-                    if frame is not None:
-                        break
+        data = self.parse_qpigs(values)
+        if data is None:
+            self._qpigs_layout_votes = 0
+            return None
+        status_idx, discharge_idx = self.detect_qpigs_layout(values)
+        layout = (len(values), status_idx, discharge_idx)
+        if status_idx is None:
+            # Without a status field there is nothing to confirm a layout by
+            self._qpigs_layout_votes = 0
+        elif layout == self._qpigs_layout:
+            self._qpigs_layout_votes += 1
+        else:
+            self._qpigs_layout = layout
+            self._qpigs_layout_votes = 1
+        if self._qpigs_layout_votes >= QPIGS_LAYOUT_CONFIRMATIONS and (decoder is None or decoder.layout != layout):
+            self.qpigs_decoder = QPIGSDecoder(*layout)
+            logger.info(
+                f"QPIGS layout learned: {layout[0]} fields, status at {status_idx}, "
+                f"discharge current at {discharge_idx}"
+            )
+        return data
 
-                self.response_buffer = response[-512:]
-
-                if frame is not None:
-                    response = frame
-                    logger.debug(f"Received response: {len(response)} bytes")
-
-                    if len(response) > 10:
-                        logger.debug(f"Response hex: {response[:80].hex()}")
-
-                        # Find frame boundaries in raw bytes and verify CRC if present
-                        try:
-                            start = response.find(b'(')
-                            end = response.find(b')', start + 1)
-                            if start == -1 or end == -1 or end + 3 > len(response):
-                                logger.warning("Incomplete response frame, skipping this cycle")
-                                return None
-
-                            frame = response[start:end + 1]  # includes parentheses
-                            crc_bytes = response[end + 1:end + 3]
-                            expected_crc = int.from_bytes(crc_bytes, 'big')
-
-                            computed_crc = self.crc16_xmodem(frame)
-                            if computed_crc != expected_crc:
-                                logger.warning(
-                                    f"CRC mismatch: expected=0x{expected_crc:04X} computed=0x{computed_crc:04X}"
-                                )
-                                if self.crc_strict:
-                                    return None
-
-                            # Decode ASCII payload between parentheses
-                            text = frame.decode('ascii', errors='ignore')
-                            logger.debug(f"Decoded text: {text[:100]}")
-                            if not text.startswith('(') or not text.endswith(')'):
-                                logger.warning("Malformed frame text, skipping")
-                                return None
-
-                            data_str = text[1:-1]
-                            values = data_str.split()
-                            logger.debug(f"Parsed values count: {len(values)}")
-
-                            if len(values) >= 17:
-                                logger.debug("Successfully parsed inverter data")
-                                return self.parse_qpigs(values)
-                            else:
-                                logger.warning(f"Invalid response length: {len(values)} (need >=17)")
-                                logger.warning(f"Values: {values}")
-                        except Exception as e:
-                            logger.warning(f"Frame/CRC parse error: {e}")
-                    else:
-                        logger.warning(f"Short response: {len(response)} bytes")
-                        if response:
-                            logger.warning(f"Response hex: {response.hex()}")
-                elif response:
-                    values = self.extract_values_from_response(response)
-                    if values is not None:
-                        logger.info(f"Using partial inverter response with {len(values)} values")
-                        logger.debug(f"Partial response hex: {response[:80].hex()}")
-                        return self.parse_qpigs(values)
-                    logger.warning("Incomplete response frame, skipping this cycle")
-                else:
-                    logger.warning(
-                        f"No response from inverter within {self.get_read_deadline_seconds():.2f}s timeout"
-                    )
-                    
-            finally:
-                os.close(fd)
-                    
-        except FileNotFoundError:
-            logger.error(f"Device {self.device} not found")
-            self.device_available = False
-        except Exception as e:
-            logger.error(f"Error reading inverter: {e}")
-            import traceback
-            logger.debug(f"Traceback: {traceback.format_exc()}")
-            
-        return None
-    
     def parse_qpigs(self, values):
         """Parse QPIGS response into dict"""
         try:
             # Ensure minimum length; don't pad with artificial zeros
             if len(values) < 17:
-                logger.warning(f"Too few values in QPIGS: {len(values)}")
+                self.warn('short_QPIGS', "Too few values in QPIGS: %d", len(values))
                 return None
 
-            if self.debug:
-                logger.debug(f"QPIGS values: {values}")
-
-            # Detect status index first (variant-dependent)
-            status_idx = None
-            if len(values) > 20 and self._looks_like_status_field(values[20]):
-                status_idx = 20
-            elif len(values) > 16 and self._looks_like_status_field(values[16]):
-                status_idx = 16
-
-            # Map battery discharge current index based on detected status layout
-            # If status at 20 → discharge current typically at 16 (older mapping that worked for you)
-            # If status at 16 → discharge current at 15 (newer PI30 mapping)
-            if status_idx == 20 and len(values) > 16:
-                batt_discharge_idx = 16
-            elif status_idx == 16 and len(values) > 15:
-                batt_discharge_idx = 15
-            else:
-                # Fallback: prefer 15 if present else 16
-                batt_discharge_idx = 15 if len(values) > 15 else (16 if len(values) > 16 else None)
+            logger.debug("QPIGS values: %s", values)
+
+            status_idx, batt_discharge_idx = self.detect_qpigs_layout(values)
 
             data = {
                 # AC Input
@@ -375,9 +3297,9 @@ class MPPSolarMonitor:
                 try:
                     data['pv_input_power'] = int(values[19])
                     pv_power_set = True
-                    logger.debug(f"PV power from pos[19]: {data['pv_input_power']}W")
+                    logger.debug("PV power from pos[19]: %dW", data['pv_input_power'])
                 except Exception as e:
-                    logger.debug(f"Failed to parse PV power from pos[19]: {e}")
+                    logger.debug("Failed to parse PV power from pos[19]: %s", e)
             # Safe fallback when position 19 is missing or unparsable
             if not pv_power_set:
                 try:
@@ -412,294 +3334,761 @@ class MPPSolarMonitor:
             logger.debug(f"Raw values: {values}")
             return None
     
-    def setup_mqtt(self):
-        """Setup MQTT connection"""
-        try:
-            # Use MQTT v1 callback API for compatibility with current callbacks
-            self.mqtt_client = mqtt.Client(
-                client_id=f"mpp_solar_{os.getpid()}",
-                protocol=mqtt.MQTTv311,
-                callback_api_version=mqtt.CallbackAPIVersion.VERSION1,
-            )
-            # Set LWT before connecting so broker marks offline on unexpected disconnects
-            self.mqtt_client.will_set(
-                f"{self.mqtt_topic}/availability",
-                "offline",
-                qos=1,
-                retain=True
-            )
+    def parse_qpigs2(self, values):
+        """Parse QPIGS2 (second PV input) response into dict"""
+        try:
+            return {
+                'pv2_input_current': float(values[0]),
+                'pv2_input_voltage': float(values[1]),
+                'pv2_input_power': int(values[2]),
+            }
+        except Exception as e:
+            logger.error(f"Error parsing QPIGS2: {e}")
+            logger.debug(f"Raw values: {values}")
+            return None
+
+    def parse_qmod(self, values):
+        """Parse QMOD (device mode) response into dict"""
+        code = values[0][:1].upper()
+        if code not in DEVICE_MODES:
+            self.warn('unknown_mode', "Unknown device mode: %r", values[0])
+            return None
+        return {'device_mode': DEVICE_MODES[code]}
+
+    def parse_qpiws(self, values):
+        """Parse QPIWS (warning status) bit string into dict"""
+        bits = values[0]
+        if not set(bits) <= {"0", "1"}:
+            self.warn('malformed_QPIWS', "Malformed QPIWS status: %r", bits)
+            return None
+        active = [name for bit, name in QPIWS_WARNINGS.items() if bit < len(bits) and bits[bit] == '1']
+        return {
+            'warning_status': bits,
+            'warnings': join_names(active) if active else "None",
+            'warning_list': active,
+            'warning_count': len(active),
+            'fault_active': len(bits) > 1 and bits[1] == '1',
+        }
+
+    def parse_qpiri(self, values):
+        """Parse QPIRI (device rating information) response into dict"""
+        try:
+            return {
+                'ac_output_rating_voltage': float(values[2]),
+                'ac_output_rating_apparent_power': int(values[5]),
+                'ac_output_rating_active_power': int(values[6]),
+                'battery_rating_voltage': float(values[7]),
+                'battery_recharge_voltage': float(values[8]),
+                'battery_under_voltage': float(values[9]),
+                'battery_bulk_voltage': float(values[10]),
+                'battery_float_voltage': float(values[11]),
+                'battery_type': BATTERY_TYPES.get(values[12], values[12]),
+                'max_ac_charging_current': int(values[13]),
+                'max_charging_current': int(values[14]),
+                'output_source_priority': OUTPUT_SOURCE_PRIORITIES.get(values[16], values[16]),
+                'charger_source_priority': CHARGER_SOURCE_PRIORITIES.get(values[17], values[17]),
+            }
+        except Exception as e:
+            logger.error(f"Error parsing QPIRI: {e}")
+            logger.debug(f"Raw values: {values}")
+            return None
+
+    def poll_cycle(self):
+        """Send every due command within the bus budget; return merged QPIGS data"""
+        data = None
+        spent = 0.0
+        for command in self.scheduler.due(time.monotonic()):
+            if command != 'QPIGS' and not self.scheduler.fits(command, spent):
+                logger.debug("Deferring %s: bus budget %.2fs used", command, self.scheduler.budget)
+                continue
+            started = time.monotonic()
+            result = self.read_command(command)
+            finished = time.monotonic()
+            spent += finished - started
+            self.scheduler.record(command, finished, finished - started, result is not None)
+            if command == 'QPIGS':
+                data = result
+            elif result:
+                self._merge_extra_state(result)
+        if data:
+            data.update(self.extra_state)
+        return data
+
+    async def poll_cycle_async(self):
+        """poll_cycle() for the asyncio engine"""
+        loop = asyncio.get_running_loop()
+        data = None
+        spent = 0.0
+        for command in self.scheduler.due(loop.time()):
+            if command != 'QPIGS' and not self.scheduler.fits(command, spent):
+                logger.debug("Deferring %s: bus budget %.2fs used", command, self.scheduler.budget)
+                continue
+            started = loop.time()
+            result = await self.read_command_async(command)
+            finished = loop.time()
+            spent += finished - started
+            self.scheduler.record(command, finished, finished - started, result is not None)
+            if command == 'QPIGS':
+                data = result
+            elif result:
+                self._merge_extra_state(result)
+        if data:
+            data.update(self.extra_state)
+        return data
+
+    def collect_sample(self, data, now: float):
+        """Integrate energy from a polled sample; return what to publish, if anything.
+
+        Without oversampling every sample is published. With a sample_interval
+        shorter than the interval, samples are rolled up and one aggregated
+        sample is returned per interval.
+        """
+        self.energy.add(data, now)
+        if self.history is not None:
+            self.history.add(time.time(), data, self.energy.values())
+        if self.sample_interval < self.interval:
+            self.aggregator.add(data)
+            if self._window_started is None:
+                # The first sample covers the period before it
+                self._window_started = now - self.sample_interval
+            # Half a sample of slack so jitter does not push the rollup a whole sample late
+            if now - self._window_started < self.interval - self.sample_interval / 2:
+                return None
+            self._window_started = now
+            data = self.aggregator.rollup()
+        data.update(self.energy.values())
+        self.energy.maybe_save(now)
+        return data
+
+    def _merge_extra_state(self, result):
+        """Remember slow-command values; a mode change refreshes the ratings"""
+        mode = result.get('device_mode')
+        if mode is not None and self.extra_state.get('device_mode') not in (None, mode):
+            logger.info(f"Device mode changed: {self.extra_state['device_mode']} -> {mode}")
+            self.scheduler.request('QPIRI')
+        self.extra_state.update(result)
+
+    def setup_mqtt(self, monitors=None):
+        """Create the MQTT client and start connecting in the background.
+
+        Returns at once; samples published before the broker is reachable
+        go to the backfill buffer. Only a client that cannot be created
+        (bad settings) is a failure.
+        """
+        try:
+            self.mqtt_client = self._create_mqtt_client(monitors)
+        except Exception as e:
+            logger.error(f"MQTT setup failed: {e}")
+            return False
+        for monitor in monitors or [self]:
+            monitor.mqtt_client = self.mqtt_client
+        self.mqtt_loop = MQTTLoopThread(self.mqtt_client, self.mqtt_host, self.mqtt_port, 60)
+        self.mqtt_loop.start()
+        return True
+
+    def stop_mqtt(self):
+        """Stop the background connection started by setup_mqtt()"""
+        if self.mqtt_loop is not None:
+            self.mqtt_loop.stop()
+
+    def _create_mqtt_client(self, monitors=None):
+        """Build the paho client with LWT, credentials and callbacks.
+
+        All monitors sharing the client get their availability and discovery
+        published on (re)connect; the LWT belongs to this one.
+        """
+        monitors = monitors or [self]
+        # Use MQTT v1 callback API for compatibility with current callbacks
+        client = mqtt.Client(
+            client_id=f"mpp_solar_{os.getpid()}",
+            protocol=mqtt.MQTTv311,
+            callback_api_version=mqtt.CallbackAPIVersion.VERSION1,
+        )
+        # Set LWT before connecting so broker marks offline on unexpected disconnects
+        client.will_set(
+            f"{self.mqtt_topic}/availability",
+            "offline",
+            qos=1,
+            retain=True
+        )
+        
+        # Set authentication if provided
+        if self.mqtt_user and self.mqtt_pass:
+            client.username_pw_set(self.mqtt_user, self.mqtt_pass)
+            logger.info(f"Using MQTT authentication for user: {self.mqtt_user}")
+        else:
+            logger.info("No MQTT authentication provided, trying anonymous")
             
-            # Set authentication if provided
-            if self.mqtt_user and self.mqtt_pass:
-                self.mqtt_client.username_pw_set(self.mqtt_user, self.mqtt_pass)
-                logger.info(f"Using MQTT authentication for user: {self.mqtt_user}")
-            else:
-                logger.info("No MQTT authentication provided, trying anonymous")
-                
-            def on_connect(client, userdata, flags, rc):
-                if rc == 0:
-                    logger.info("Connected to MQTT broker")
-                    # Publish online status
+        def on_connect(client, userdata, flags, rc):
+            if rc == 0:
+                logger.info("Connected to MQTT broker")
+                if self.availability_topic != f"{self.mqtt_topic}/availability":
+                    # The LWT topic only tracks the connection itself
+                    client.publish(f"{self.mqtt_topic}/availability", "online", qos=1, retain=True)
+                for monitor in monitors:
+                    # A unit is online only while its device is present
                     client.publish(
-                        f"{self.mqtt_topic}/availability",
-                        "online",
+                        monitor.availability_topic,
+                        "online" if monitor.device_available else "offline",
                         qos=1,
                         retain=True
                     )
-                    # Publish discovery
-                    self.publish_discovery()
-                else:
-                    logger.error(f"MQTT connection failed with code: {rc}")
-                    
-            def on_disconnect(client, userdata, rc):
-                if rc != 0:
-                    logger.warning(f"Unexpected MQTT disconnection: {rc}")
-                    
-            self.mqtt_client.on_connect = on_connect
-            self.mqtt_client.on_disconnect = on_disconnect
-            
-            # Connect with retry
-            connected = False
-            for i in range(5):
-                try:
-                    self.mqtt_client.connect(self.mqtt_host, self.mqtt_port, 60)
-                    self.mqtt_client.loop_start()
-                    connected = True
-                    break
-                except Exception as e:
-                    logger.warning(f"MQTT connection attempt {i+1} failed: {e}")
-                    time.sleep(5)
-                    
-            return connected
-            
-        except Exception as e:
-            logger.error(f"MQTT setup failed: {e}")
-            return False
+                    # Discovery is diffed against the broker and sent
+                    # after the callback returns
+                    monitor.mqtt_client = client
+                    monitor.start_discovery_sync(client)
+                    # State is not retained; resend the next sample in full
+                    monitor.publish_filter.reset()
+            else:
+                logger.error(f"MQTT connection failed with code: {rc}")
+                
+        def on_message(client, userdata, message):
+            parts = message.topic.split('/')
+            for monitor in monitors:
+                if len(parts) == 5 and parts[2] == monitor.node_id:
+                    monitor.on_discovery_message(message.topic, message.payload)
+                
+        def on_disconnect(client, userdata, rc):
+            if rc != 0:
+                METRICS.inc('mpp_solar_mqtt_disconnects_total')
+                logger.warning(f"Unexpected MQTT disconnection: {rc}")
+                
+        client.on_connect = on_connect
+        client.on_message = on_message
+        client.on_disconnect = on_disconnect
+        return client
     
     def publish_discovery(self):
         """Publish Home Assistant MQTT discovery messages"""
+        for topic, payload in self.discovery_messages().items():
+            self.mqtt_client.publish(topic, payload, qos=1, retain=True)
+        logger.info("Published MQTT discovery messages")
+
+    def discovery_messages(self) -> dict[str, str]:
+        """Discovery payloads by topic, built once per entity set"""
+        key = (tuple(self.scheduler.intervals), self.state_topics)
+        if key != self._discovery_key:
+            self._discovery_cache = self._build_discovery_messages()
+            self._discovery_hashes = {
+                topic: hashlib.sha1(payload.encode()).hexdigest()
+                for topic, payload in self._discovery_cache.items()
+            }
+            self._discovery_key = key
+        return self._discovery_cache
+
+    def start_discovery_sync(self, client):
+        """Collect the retained configs the broker holds for this device.
+
+        Called from on_connect; the diff is published later by
+        sync_discovery() so the callback returns immediately.
+        """
+        self._broker_discovery = {}
+        client.subscribe(f"{self.discovery_prefix}/+/{self.node_id}/+/config", qos=1)
+        # A reconnect storm only needs the sync from the latest connect
+        if self._discovery_timer is not None:
+            self._discovery_timer.cancel()
+        if self.mqtt_bridge is not None:
+            self._discovery_timer = self.mqtt_bridge.loop.call_later(
+                DISCOVERY_SETTLE_SECONDS, self.sync_discovery
+            )
+        else:
+            self._discovery_timer = threading.Timer(DISCOVERY_SETTLE_SECONDS, self.sync_discovery)
+            self._discovery_timer.daemon = True
+            self._discovery_timer.start()
+
+    def on_discovery_message(self, topic: str, payload: bytes):
+        """Record the hash of a retained config seen on the broker"""
+        if payload:
+            self._broker_discovery[topic] = hashlib.sha1(payload).hexdigest()
+        else:
+            self._broker_discovery.pop(topic, None)
+
+    def sync_discovery(self):
+        """Publish only configs that differ from the broker, drop stale ones"""
+        try:
+            client = self.mqtt_client
+            client.unsubscribe(f"{self.discovery_prefix}/+/{self.node_id}/+/config")
+            messages = self.discovery_messages()
+            held = dict(self._broker_discovery)
+            changed = [topic for topic in messages if held.get(topic) != self._discovery_hashes[topic]]
+            stale = [topic for topic in held if topic not in messages]
+            for topic in changed:
+                client.publish(topic, messages[topic], qos=1, retain=True)
+            for topic in stale:
+                # Empty retained payload removes the entity from Home Assistant
+                client.publish(topic, "", qos=1, retain=True)
+            self.discovery_stats = {
+                'published': len(changed),
+                'unchanged': len(messages) - len(changed),
+                'removed': len(stale),
+            }
+            logger.info(
+                f"MQTT discovery: {len(changed)} published, "
+                f"{len(messages) - len(changed)} unchanged, {len(stale)} removed"
+            )
+        except Exception as e:
+            logger.error(f"Discovery sync failed: {e}")
+
+    def _build_discovery_messages(self) -> dict[str, str]:
+        """Render every discovery config for the currently polled entities"""
+        messages = {}
         device_info = {
-            "identifiers": ["mpp_solar_pip5048mg"],
-            "name": "MPP Solar PIP5048MG",
+            "identifiers": [f"{self.node_id}_pip5048mg"],
+            "name": self.device_name,
             "model": "PIP5048MG",
             "manufacturer": "MPP Solar",
             "sw_version": "2.1.0"
         }
         
-        # Sensor definitions
-        sensors = [
-            # Power sensors
-            {
-                "id": "pv_input_power",
-                "name": "PV Input Power",
-                "unit": "W",
-                "icon": "mdi:solar-power",
-                "device_class": "power",
-                "state_class": "measurement"
-            },
-            {
-                "id": "ac_output_power",
-                "name": "AC Output Power",
-                "unit": "W",
-                "icon": "mdi:flash",
-                "device_class": "power",
-                "state_class": "measurement"
-            },
-            {
-                "id": "battery_power",
-                "name": "Battery Power",
-                "unit": "W",
-                "icon": "mdi:battery-charging",
-                "device_class": "power",
-                "state_class": "measurement"
-            },
-            
-            # Voltage sensors
-            {
-                "id": "pv_input_voltage",
-                "name": "PV Input Voltage",
-                "unit": "V",
-                "icon": "mdi:flash",
-                "device_class": "voltage",
-                "state_class": "measurement"
-            },
-            {
-                "id": "battery_voltage",
-                "name": "Battery Voltage",
-                "unit": "V",
-                "icon": "mdi:battery",
-                "device_class": "voltage",
-                "state_class": "measurement"
-            },
-            {
-                "id": "ac_output_voltage",
-                "name": "AC Output Voltage",
-                "unit": "V",
-                "icon": "mdi:power-socket",
-                "device_class": "voltage",
-                "state_class": "measurement"
-            },
-            
-            # Other sensors
-            {
-                "id": "battery_capacity",
-                "name": "Battery Capacity",
-                "unit": "%",
-                "icon": "mdi:battery-50",
-                "device_class": "battery",
-                "state_class": "measurement"
-            },
-            {
-                "id": "ac_output_load",
-                "name": "AC Output Load",
-                "unit": "%",
-                "icon": "mdi:gauge",
-                "state_class": "measurement"
-            },
-            {
-                "id": "inverter_temperature",
-                "name": "Inverter Temperature",
-                "unit": "°C",
-                "icon": "mdi:thermometer",
-                "device_class": "temperature",
-                "state_class": "measurement"
-            },
-        ]
-        
-        # Binary sensors
-        binary_sensors = [
-            {
-                "id": "load_on",
-                "name": "Load On",
-                "icon": "mdi:power",
-                "device_class": "power"
-            },
-            {
-                "id": "scc_charging",
-                "name": "Solar Charging",
-                "icon": "mdi:solar-power",
-                "device_class": "battery_charging"
-            },
-            {
-                "id": "ac_charging",
-                "name": "AC Charging",
-                "icon": "mdi:power-plug",
-                "device_class": "battery_charging"
-            },
-        ]
+        sensors, binary_sensors = self._polled_entities()
+        per_sensor = self.state_topics == 'per_sensor'
+
+        if self.availability_topic != f"{self.base_topic}/availability":
+            # Fleet units are only available while the shared connection
+            # (LWT on the base topic) and their own device are both online
+            availability = {
+                "availability": [
+                    {"topic": f"{self.base_topic}/availability"},
+                    {"topic": self.availability_topic},
+                ],
+                "availability_mode": "all",
+            }
+        else:
+            availability = {"availability_topic": f"{self.mqtt_topic}/availability"}
         
-        # Publish sensor discovery
+        # Sensor discovery
         for sensor in sensors:
-            topic = f"homeassistant/sensor/mpp_solar/{sensor['id']}/config"
+            topic = f"{self.discovery_prefix}/sensor/{self.node_id}/{sensor['id']}/config"
             config = {
                 "name": sensor["name"],
                 "state_topic": f"{self.mqtt_topic}/state",
                 "value_template": f"{{{{ value_json.{sensor['id']} }}}}",
-                "unique_id": f"mpp_solar_{sensor['id']}",
+                "unique_id": f"{self.node_id}_{sensor['id']}",
                 "device": device_info,
-                "unit_of_measurement": sensor["unit"],
                 "icon": sensor["icon"],
-                "availability_topic": f"{self.mqtt_topic}/availability"
+                **availability
             }
+            if per_sensor:
+                # Plain value on its own topic, no template to render
+                config["state_topic"] = f"{self.mqtt_topic}/{sensor['id']}"
+                del config["value_template"]
             
+            if "unit" in sensor:
+                config["unit_of_measurement"] = sensor["unit"]
             if "device_class" in sensor:
                 config["device_class"] = sensor["device_class"]
             if "state_class" in sensor:
                 config["state_class"] = sensor["state_class"]
+            if "attributes" in sensor:
+                attribute = sensor["attributes"]
+                if per_sensor:
+                    config["json_attributes_topic"] = f"{self.mqtt_topic}/{attribute}"
+                else:
+                    config["json_attributes_topic"] = f"{self.mqtt_topic}/state"
+                    config["json_attributes_template"] = (
+                        f"{{{{ {{'{attribute}': value_json.{attribute}}} | tojson }}}}"
+                    )
                 
-            self.mqtt_client.publish(topic, json.dumps(config), qos=1, retain=True)
-            logger.debug(f"Published discovery for {sensor['id']}")
+            messages[topic] = json.dumps(config)
             
-        # Publish binary sensor discovery
+        # Binary sensor discovery
         for sensor in binary_sensors:
-            topic = f"homeassistant/binary_sensor/mpp_solar/{sensor['id']}/config"
+            topic = f"{self.discovery_prefix}/binary_sensor/{self.node_id}/{sensor['id']}/config"
             config = {
                 "name": sensor["name"],
                 "state_topic": f"{self.mqtt_topic}/state",
                 "value_template": f"{{{{ 'ON' if value_json.{sensor['id']} else 'OFF' }}}}",
-                "unique_id": f"mpp_solar_{sensor['id']}",
+                "unique_id": f"{self.node_id}_{sensor['id']}",
                 "device": device_info,
                 "icon": sensor["icon"],
-                "availability_topic": f"{self.mqtt_topic}/availability"
+                **availability
             }
+            if per_sensor:
+                # Payload is already ON/OFF, matching HA's defaults
+                config["state_topic"] = f"{self.mqtt_topic}/{sensor['id']}"
+                del config["value_template"]
             
             if "device_class" in sensor:
                 config["device_class"] = sensor["device_class"]
                 
-            self.mqtt_client.publish(topic, json.dumps(config), qos=1, retain=True)
-            logger.debug(f"Published discovery for binary_{sensor['id']}")
+            messages[topic] = json.dumps(config)
             
-        logger.info("Published MQTT discovery messages")
+        return messages
     
+    def _polled_entities(self):
+        """Sensor and binary sensor definitions backed by a polled command"""
+        polled = self.scheduler.intervals
+        sensors = [s for s in SENSORS if s.get("command", "QPIGS") in polled]
+        binary_sensors = [s for s in BINARY_SENSORS if s.get("command", "QPIGS") in polled]
+        if self.sample_interval < self.interval:
+            # Rollups also carry the extremes of every averaged sensor
+            sensors += [
+                {**sensor, "id": f"{sensor['id']}_{bound}", "name": f"{sensor['name']} {bound.title()}"}
+                for sensor in sensors if sensor["id"] in self.aggregator.fields
+                for bound in ("min", "max")
+            ]
+        return sensors, binary_sensors
+
+    def _sensor_messages(self, data, now):
+        """Changed entity values as (field, topic, payload) for per-sensor topics"""
+        sensors, binary_sensors = self._polled_entities()
+        binary_ids = {s["id"] for s in binary_sensors}
+        attribute_ids = {s["attributes"] for s in sensors if "attributes" in s}
+        values = {
+            key: data[key] for key in [s["id"] for s in sensors + binary_sensors] + sorted(attribute_ids)
+            if key in data
+        }
+        fields = self.publish_filter.changed_fields(values, now)
+        messages = []
+        for key in fields:
+            value = values[key]
+            if key in attribute_ids:
+                # json_attributes_topic takes a JSON object
+                payload = json.dumps({key: value})
+            elif key in binary_ids:
+                payload = "ON" if value else "OFF"
+            else:
+                payload = str(value)
+            messages.append((key, f"{self.mqtt_topic}/{key}", payload))
+        return values, messages
+
     def publish_data(self, data):
         """Publish data to MQTT"""
-        if self.mqtt_client and data:
-            # Add timestamp
-            data['timestamp'] = datetime.now(timezone.utc).isoformat()
-            
+        if self.mqtt_client and data and self.state_topics == 'per_sensor':
+            now = time.monotonic()
+            values, messages = self._sensor_messages(data, now)
+            sent, failed = [], []
+            for key, topic, payload in messages:
+                ok = self.mqtt_client.publish(topic, payload, retain=True).rc == mqtt.MQTT_ERR_SUCCESS
+                (sent if ok else failed).append(key)
+            self.publish_filter.mark_sent(values, now, sent, failed)
+            self._export_publish_counts()
+            logger.debug("Published %d of %d sensor topics", len(sent), len(values))
+            if sent:
+                self._log_published(data)
+            elif messages:
+                self._buffer_sample(self._encode_state(data))
+        elif self.mqtt_client and data:
+            now = time.monotonic()
+            if not self.publish_filter.should_publish(data, now):
+                self._export_publish_counts()
+                logger.debug("Sample within deadbands, not published")
+                return
             # Publish state
-            self.mqtt_client.publish(
+            payload = self._encode_state(data)
+            info = self.mqtt_client.publish(
                 f"{self.mqtt_topic}/state",
-                json.dumps(data),
+                payload,
                 retain=False
             )
-            
-            # Log summary
-            logger.info(
-                f"Published: PV={data['pv_input_power']}W, "
-                f"Battery={data['battery_voltage']:.1f}V/{data['battery_capacity']}%, "
-                f"Load={data['ac_output_power']}W, "
-                f"Temp={data['inverter_temperature']}°C"
+            if info.rc == mqtt.MQTT_ERR_SUCCESS:
+                self.publish_filter.mark_sent(data, now)
+                self._export_publish_counts()
+                self._log_published(data)
+            else:
+                self.publish_filter.mark_failed()
+                self._export_publish_counts()
+                self._buffer_sample(payload)
+
+    async def publish_data_async(self, data):
+        """Publish data to MQTT and wait until paho has written it"""
+        if self.mqtt_bridge and data and self.state_topics == 'per_sensor':
+            now = time.monotonic()
+            values, messages = self._sensor_messages(data, now)
+            results = await asyncio.gather(*(
+                self.mqtt_bridge.publish(topic, payload, retain=True)
+                for _, topic, payload in messages
+            ))
+            sent = [key for (key, _, _), ok in zip(messages, results) if ok]
+            failed = [key for (key, _, _), ok in zip(messages, results) if not ok]
+            self.publish_filter.mark_sent(values, now, sent, failed)
+            self._export_publish_counts()
+            logger.debug("Published %d of %d sensor topics", len(sent), len(values))
+            if sent:
+                self._log_published(data)
+            elif messages:
+                self._buffer_sample(self._encode_state(data))
+        elif self.mqtt_bridge and data:
+            now = time.monotonic()
+            if not self.publish_filter.should_publish(data, now):
+                self._export_publish_counts()
+                logger.debug("Sample within deadbands, not published")
+                return
+            payload = self._encode_state(data)
+            sent = await self.mqtt_bridge.publish(
+                f"{self.mqtt_topic}/state",
+                payload,
+                retain=False
             )
+            if sent:
+                self.publish_filter.mark_sent(data, now)
+                self._export_publish_counts()
+                self._log_published(data)
+            else:
+                self.publish_filter.mark_failed()
+                self._export_publish_counts()
+                self._buffer_sample(payload)
+
+    def _export_publish_counts(self):
+        METRICS.set_total('mpp_solar_publish_sent_total', self.publish_filter.sent, inverter=self.node_id)
+        METRICS.set_total('mpp_solar_publish_suppressed_total', self.publish_filter.suppressed, inverter=self.node_id)
+        METRICS.set_total('mpp_solar_publish_failed_total', self.publish_filter.failed, inverter=self.node_id)
+
+    def open_backfill(self):
+        """Open the store-and-forward buffer under the add-on data directory"""
+        if self.backfill is not None or self.backfill_samples <= 0:
+            return
+        if not os.path.isdir(self.data_dir):
+            logger.warning(f"{self.data_dir} not found, samples taken while MQTT is down will be lost")
+            return
+        buffer = SampleBuffer(os.path.join(self.data_dir, f"backfill_{self.node_id}.ring"), self.backfill_samples)
+        try:
+            buffer.open()
+        except OSError as e:
+            logger.warning(f"Cannot open backfill buffer {buffer.path}: {e}")
+            return
+        self.backfill = buffer
+
+    def open_history(self):
+        """Open the local time-series store under the add-on data directory"""
+        if self.history is not None or self.history_hours <= 0:
+            return
+        if not os.path.isdir(self.data_dir):
+            logger.warning(f"{self.data_dir} not found, readings will not be kept in the local history")
+            return
+        directory = os.path.join(self.data_dir, 'history')
+        store = HistoryStore(
+            directory, f"history_{self.node_id}", math.ceil(self.history_hours * 3600 / self.sample_interval)
+        )
+        try:
+            os.makedirs(directory, exist_ok=True)
+            store.open()
+        except OSError as e:
+            logger.warning(f"Cannot open history store in {directory}: {e}")
+            return
+        self.history = store
+        HISTORY[self.node_id] = store
+
+    def open_capture(self):
+        """Start logging the raw device stream under the add-on data directory"""
+        if not self.capture_frames or self.session.capture is not None:
+            return
+        directory = os.path.join(self.data_dir, 'captures')
+        try:
+            os.makedirs(directory, exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Cannot create {directory}, frames will not be captured: {e}")
+            return
+        # The size limit is shared by the rotated files that are kept
+        files = 8
+        self.session.capture = FrameCapture(
+            directory, f"frames_{self.node_id}", max_bytes=(self.capture_max_mb << 20) // files, keep=files
+        )
+
+    def _buffer_sample(self, payload: str):
+        """Keep a sample that could not be published for replay"""
+        if self.backfill is not None:
+            self.backfill.append(payload.encode())
+            logger.debug("MQTT unavailable, buffered sample (%d waiting)", len(self.backfill))
+
+    def _backfill_batch(self, now: float | None) -> int:
+        """Samples that may be replayed now so the average stays at backfill_rate/s"""
+        return self.backfill_limiter.available(time.monotonic() if now is None else now)
+
+    def drain_backfill(self, now: float | None = None) -> int:
+        """Replay buffered samples to <topic>/backfill with their original timestamps"""
+        if not self.backfill:
+            return 0
+        now = time.monotonic() if now is None else now
+        self._release_acked_backfill()
+        if not self.mqtt_client or not self.mqtt_client.is_connected():
+            return 0
+        if self._backfill_unacked and now - self._backfill_sent_at >= BACKFILL_ACK_SECONDS:
+            # Lost with the connection: send them again (the consumer may see duplicates)
+            logger.warning(f"{len(self._backfill_unacked)} replayed samples not acknowledged, sending again")
+            self._backfill_unacked = []
+        batch = self._backfill_batch(now)
+        if not batch:
+            return 0
+        unacked = self._backfill_unacked
+        after = unacked[-1][0] if unacked else -1
+        sent = 0
+        for seq, payload in self.backfill.peek(len(unacked) + batch):
+            if seq <= after:
+                continue
+            info = self.mqtt_client.publish(f"{self.mqtt_topic}/backfill", payload, qos=1)
+            if info.rc != mqtt.MQTT_ERR_SUCCESS:
+                break
+            unacked.append((seq, info))
+            self._backfill_sent_at = now
+            sent += 1
+        self.backfill_limiter.spend(sent)
+        self._release_acked_backfill()
+        if sent:
+            logger.info(f"Replayed {sent} buffered samples, {len(self.backfill)} left")
+        return sent
+
+    def _release_acked_backfill(self):
+        """Drop replayed samples from the buffer once the broker has acknowledged them, in order"""
+        unacked = self._backfill_unacked
+        acked = 0
+        while acked < len(unacked) and unacked[acked][1].rc == mqtt.MQTT_ERR_SUCCESS and unacked[acked][1].is_published():
+            acked += 1
+        if acked:
+            self.backfill.pop(unacked[acked - 1][0])
+            del unacked[:acked]
+
+    async def drain_backfill_async(self, now: float | None = None) -> int:
+        """drain_backfill() for the asyncio engine"""
+        if not self.backfill or not self.mqtt_bridge or not self.mqtt_bridge.connected.is_set():
+            return 0
+        count = self._backfill_batch(now)
+        if not count:
+            return 0
+        batch = self.backfill.peek(count)
+        # Reserved before the await so a concurrent drain cannot spend them too
+        self.backfill_limiter.spend(len(batch))
+        results = await asyncio.gather(*(
+            self.mqtt_bridge.publish(f"{self.mqtt_topic}/backfill", payload, qos=1)
+            for _, payload in batch
+        ))
+        # Only release the confirmed prefix so nothing is lost out of order
+        sent = 0
+        for (seq, _), ok in zip(batch, results):
+            if not ok:
+                break
+            self.backfill.pop(seq)
+            sent += 1
+        if sent:
+            logger.info(f"Replayed {sent} buffered samples, {len(self.backfill)} left")
+        return sent
+
+    def _encode_state(self, data) -> str:
+        """Timestamp the sample (unless the reader did) and serialise it for the state topic"""
+        if 'timestamp' not in data:
+            data['timestamp'] = datetime.now(timezone.utc).isoformat()
+        return json.dumps(data)
+
+    def _log_published(self, data):
+        if self.first_published_at is None:
+            self.first_published_at = time.monotonic()
+            elapsed = self.first_published_at - self.started_at
+            METRICS.set('mpp_solar_time_to_first_publish_seconds', elapsed, inverter=self.node_id)
+            logger.info(f"First sample published {elapsed:.1f}s after start")
+        logger.info(
+            f"Published: PV={data['pv_input_power']}W, "
+            f"Battery={data['battery_voltage']:.1f}V/{data['battery_capacity']}%, "
+            f"Load={data['ac_output_power']}W, "
+            f"Temp={data['inverter_temperature']}°C"
+        )
     
     def run(self):
         """Main loop"""
+        if self.metrics_port:
+            start_metrics_server(self.metrics_port)
+        if self.engine == 'asyncio':
+            try:
+                return asyncio.run(self.run_async())
+            except KeyboardInterrupt:
+                logger.info("Shutting down...")
+                return 0
+
         logger.info("Starting MPP Solar Monitor...")
         
-        # Wait for device
-        if not self.wait_for_device():
-            logger.error("Device not available, exiting")
-            return 1
-            
-        # Setup MQTT
+        # Connect to MQTT in the background; polling does not wait for the broker
         if not self.setup_mqtt():
             logger.error("Failed to setup MQTT")
             return 1
             
-        # Wait for MQTT connection
-        time.sleep(2)
+        # Wait for device
+        if not self.wait_for_device():
+            logger.error("Device not available, exiting")
+            self.stop_mqtt()
+            return 1
         
-        # Main loop
+        self.monitor_loop()
+        
+        # Cleanup
+        self.close()
+        self.stop_mqtt()
+            
+        return 0
+
+    def monitor_loop(self):
+        """Poll and publish until stopped or the device is gone for good"""
+        self.open_backfill()
+        self.open_capture()
+        self.open_history()
+        self.energy.load()
+        sink = None
+        if self.queue is not None:
+            sink = threading.Thread(target=self.sink_loop, name=f"{self.node_id}-sink", daemon=True)
+            sink.start()
+        try:
+            self._read_loop()
+        finally:
+            if sink is not None:
+                self.queue.close()
+                sink.join(5.0)
+
+    def _read_loop(self):
+        """Reader stage: poll the device on every tick and hand samples on"""
         error_count = 0
         logger.info("Starting main monitoring loop...")
+        tick = self.clock.start(time.monotonic())
         
-        while True:
+        while not self.stop_event.is_set():
+            # Wait for the next tick
+            if self._sleep_until(tick):
+                break
             cycle_started = time.monotonic()
+            self._record_tick(tick, cycle_started)
             try:
+                if self._device_removed():
+                    logger.error("Device disappeared, waiting for reconnection...")
+                    self.session.close()
+                    if not self.wait_for_device():
+                        if self.keep_waiting:
+                            continue
+                        break
+                    error_count = 0
+
                 logger.debug("Reading inverter data...")
                 # Read inverter data
                 read_started = time.monotonic()
-                data = self.read_inverter_data()
+                data = self.poll_cycle()
                 read_finished = time.monotonic()
                 read_elapsed = read_finished - read_started
                 
                 if data:
-                    self.publish_data(data)
+                    sample = self.collect_sample(data, read_finished)
+                    if sample:
+                        if self.queue is None:
+                            self._publish_timed(sample)
+                        else:
+                            self.submit_sample(sample, read_finished)
                     error_count = 0
                 else:
                     error_count += 1
-                    logger.warning(f"No data from inverter (error count: {error_count})")
-                    
-                    # Check if device still exists
-                    if error_count > 5 and not os.path.exists(self.device):
-                        logger.error("Device disappeared, waiting for reconnection...")
-                        if not self.wait_for_device():
-                            break
-                        error_count = 0
+                    self.warn('no_data', "No data from inverter (error count: %d)", error_count)
+
+                if self.queue is None:
+                    self.drain_backfill()
+                METRICS.observe('mpp_solar_cycle_seconds', time.monotonic() - cycle_started, inverter=self.node_id)
+                self.warnings.flush()
 
                 if self.debug:
                     logger.debug(
-                        f"Cycle timings: read={read_elapsed:.2f}s total={time.monotonic() - cycle_started:.2f}s"
+                        f"Cycle timings: read={read_elapsed:.2f}s total={time.monotonic() - cycle_started:.2f}s "
+                        f"opens={self.session.open_count} reopens={self.session.reopen_count} "
+                        f"deadline={self.read_deadline('QPIGS'):.2f}s "
+                        f"late={self.clock.lateness * 1000:.0f}ms missed={self.clock.missed} "
+                        f"published={self.publish_filter.sent} suppressed={self.publish_filter.suppressed} "
+                        f"failed={self.publish_filter.failed} "
+                        f"buffered={len(self.backfill) if self.backfill else 0} "
+                        f"queued={len(self.queue) if self.queue else 0} "
+                        f"dropped={self.queue.dropped if self.queue else 0} "
+                        f"warnings_aggregated={self.warnings.suppressed}"
                     )
                     
             except KeyboardInterrupt:
@@ -708,22 +4097,404 @@ class MPPSolarMonitor:
             except Exception as e:
                 logger.error(f"Error in main loop: {e}")
                 error_count += 1
-                
-            # Wait for next cycle
-            time.sleep(self.compute_cycle_sleep(cycle_started))
-        
-        # Cleanup
+
+            tick = self.clock.advance(tick, time.monotonic())
+
+    def submit_sample(self, sample, now: float):
+        """Timestamp a sample and queue it for the sink without waiting"""
+        sample['timestamp'] = datetime.now(timezone.utc).isoformat()
+        if self.queue.put(sample, now):
+            if len(self.queue) <= 1:
+                # The sink caught up; warn again if it falls behind later
+                self._dropping = False
+        else:
+            if not self._dropping:
+                logger.warning(
+                    f"Publish queue full ({self.queue.size}), dropping samples ({self.queue.policy})"
+                )
+            self._dropping = True
+            METRICS.set_total('mpp_solar_queue_dropped_total', self.queue.dropped, inverter=self.node_id)
+        METRICS.set('mpp_solar_queue_depth', len(self.queue), inverter=self.node_id)
+
+    def _dequeued(self, item):
+        """Record how long a sample waited; return the sample"""
+        enqueued_at, sample = item
+        METRICS.observe('mpp_solar_queue_wait_seconds', time.monotonic() - enqueued_at, inverter=self.node_id)
+        METRICS.set('mpp_solar_queue_depth', len(self.queue), inverter=self.node_id)
+        return sample
+
+    def _publish_timed(self, sample):
+        publish_started = time.monotonic()
+        self.publish_data(sample)
+        METRICS.observe('mpp_solar_publish_seconds', time.monotonic() - publish_started, inverter=self.node_id)
+
+    def sink_loop(self):
+        """Sink stage: serialise and publish queued samples, replay the backfill"""
+        _current_inverter.set(self.node_id)
+        while True:
+            item = self.queue.get(self.sample_interval)
+            if item is None and self.queue.closed:
+                return
+            try:
+                if item is not None:
+                    self._publish_timed(self._dequeued(item))
+                # The sink wakes per sample; the limiter paces the replay by elapsed time
+                self.drain_backfill(time.monotonic())
+            except Exception as e:
+                logger.error(f"Error publishing sample: {e}")
+
+    async def sink_loop_async(self):
+        """sink_loop() for the asyncio engine"""
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.queue.get_async(self.sample_interval)
+            if item is None and self.queue.closed:
+                return
+            try:
+                if item is not None:
+                    sample = self._dequeued(item)
+                    publish_started = loop.time()
+                    await self.publish_data_async(sample)
+                    METRICS.observe(
+                        'mpp_solar_publish_seconds', loop.time() - publish_started, inverter=self.node_id
+                    )
+                await self.drain_backfill_async(loop.time())
+            except Exception as e:
+                logger.error(f"Error publishing sample: {e}")
+
+    def _sleep_until(self, tick) -> bool:
+        """Sleep until the tick, or until the device node is removed; True when stopping"""
+        while True:
+            remaining = tick - time.monotonic()
+            if remaining <= 0:
+                return self.stop_event.is_set()
+            if self.watcher is None:
+                return self.stop_event.wait(remaining)
+            # Short slices keep the stop event responsive
+            if self.watcher.wait(min(remaining, 1.0)) and self._device_removed():
+                return self.stop_event.is_set()
+            if self.stop_event.is_set():
+                return True
+
+    async def _sleep_until_async(self, tick):
+        """_sleep_until() for the asyncio engine"""
+        loop = asyncio.get_running_loop()
+        while loop.time() < tick:
+            remaining = tick - loop.time()
+            if self.watcher is None:
+                await asyncio.sleep(remaining)
+                return
+            if await self._watcher_wait_async(remaining) and self._device_removed():
+                return
+
+    def _record_tick(self, tick, started_at):
+        """Lateness of this cycle and ticks skipped before it"""
+        METRICS.observe(
+            'mpp_solar_schedule_jitter_seconds', self.clock.begin(tick, started_at), inverter=self.node_id
+        )
+        METRICS.set_total('mpp_solar_missed_ticks_total', self.clock.missed, inverter=self.node_id)
+
+    def device_loop(self):
+        """Worker for one inverter of a fleet: wait for it, then poll it"""
+        _current_inverter.set(self.node_id)
+        while not self.wait_for_device():
+            if self.stop_event.is_set():
+                return
+            logger.error(f"Device {self.device} still not available, waiting again")
+        self.monitor_loop()
+
+    def close(self):
+        """Close the device and mark this inverter offline"""
+        self.warnings.flush(force=True)
+        self.session.close()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.backfill is not None:
+            self.backfill.close()
+        if self.session.capture is not None:
+            self.session.capture.close()
+        if self.history is not None:
+            HISTORY.pop(self.node_id, None)
+            self.history.close()
+        self.energy.save()
         if self.mqtt_client:
             self.mqtt_client.publish(
                 f"{self.mqtt_topic}/availability",
                 "offline",
                 retain=True
             )
-            self.mqtt_client.loop_stop()
+
+    async def run_async(self):
+        """Main loop on asyncio: device reads and MQTT share one thread"""
+        logger.info("Starting MPP Solar Monitor (asyncio engine)...")
+
+        mqtt_task = await self.start_mqtt_async()
+        if not await self.wait_for_device_async():
+            logger.error("Device not available, exiting")
+            mqtt_task.cancel()
+            return 1
+
+        try:
+            await self.monitor_loop_async()
+        finally:
+            await self.close_async()
             self.mqtt_client.disconnect()
-            
+            mqtt_task.cancel()
+
+        return 0
+
+    async def start_mqtt_async(self, monitors=None):
+        """Create the shared client on the running loop and start connecting"""
+        monitors = monitors or [self]
+        loop = asyncio.get_running_loop()
+        self.mqtt_client = self._create_mqtt_client(monitors)
+        self.mqtt_bridge = AsyncioMQTTBridge(loop, self.mqtt_client)
+        for monitor in monitors:
+            monitor.mqtt_client = self.mqtt_client
+            monitor.mqtt_bridge = self.mqtt_bridge
+        # Polling starts right away; the bridge connects in the background
+        return loop.create_task(self.mqtt_bridge.maintain(self.mqtt_host, self.mqtt_port, 60))
+
+    async def monitor_loop_async(self):
+        """monitor_loop() for the asyncio engine"""
+        self.open_backfill()
+        self.open_capture()
+        self.open_history()
+        self.energy.load()
+        sink = None
+        if self.queue is not None:
+            sink = asyncio.get_running_loop().create_task(self.sink_loop_async())
+        try:
+            await self._read_loop_async()
+        finally:
+            if sink is not None:
+                self.queue.close()
+                try:
+                    await asyncio.wait_for(sink, 5.0)
+                except (asyncio.TimeoutError, asyncio.CancelledError):
+                    sink.cancel()
+
+    async def _read_loop_async(self):
+        """_read_loop() for the asyncio engine"""
+        loop = asyncio.get_running_loop()
+        error_count = 0
+        logger.info("Starting main monitoring loop...")
+        tick = self.clock.start(loop.time())
+        while True:
+            await self._sleep_until_async(tick)
+            cycle_started = loop.time()
+            self._record_tick(tick, cycle_started)
+            try:
+                if self._device_removed():
+                    logger.error("Device disappeared, waiting for reconnection...")
+                    self.session.close()
+                    if not await self.wait_for_device_async():
+                        if self.keep_waiting:
+                            continue
+                        break
+                    error_count = 0
+
+                data = await self.poll_cycle_async()
+                read_elapsed = loop.time() - cycle_started
+
+                if data:
+                    sample = self.collect_sample(data, loop.time())
+                    if sample:
+                        if self.queue is None:
+                            publish_started = loop.time()
+                            await self.publish_data_async(sample)
+                            METRICS.observe(
+                                'mpp_solar_publish_seconds', loop.time() - publish_started, inverter=self.node_id
+                            )
+                        else:
+                            self.submit_sample(sample, loop.time())
+                    error_count = 0
+                else:
+                    error_count += 1
+                    self.warn('no_data', "No data from inverter (error count: %d)", error_count)
+
+                if self.queue is None:
+                    await self.drain_backfill_async()
+                METRICS.observe('mpp_solar_cycle_seconds', loop.time() - cycle_started, inverter=self.node_id)
+                self.warnings.flush()
+
+                if self.debug:
+                    logger.debug(
+                        f"Cycle timings: read={read_elapsed:.2f}s total={loop.time() - cycle_started:.2f}s "
+                        f"opens={self.session.open_count} reopens={self.session.reopen_count} "
+                        f"deadline={self.read_deadline('QPIGS'):.2f}s "
+                        f"late={self.clock.lateness * 1000:.0f}ms missed={self.clock.missed} "
+                        f"published={self.publish_filter.sent} suppressed={self.publish_filter.suppressed} "
+                        f"failed={self.publish_filter.failed} "
+                        f"buffered={len(self.backfill) if self.backfill else 0} "
+                        f"queued={len(self.queue) if self.queue else 0} "
+                        f"dropped={self.queue.dropped if self.queue else 0} "
+                        f"warnings_aggregated={self.warnings.suppressed}"
+                    )
+            except Exception as e:
+                logger.error(f"Error in main loop: {e}")
+                error_count += 1
+
+            tick = self.clock.advance(tick, loop.time())
+
+    async def device_loop_async(self):
+        """device_loop() for the asyncio engine"""
+        _current_inverter.set(self.node_id)
+        while not await self.wait_for_device_async():
+            logger.error(f"Device {self.device} still not available, waiting again")
+        await self.monitor_loop_async()
+
+    async def close_async(self):
+        """close() for the asyncio engine"""
+        self.warnings.flush(force=True)
+        self.session.close()
+        if self.watcher is not None:
+            self.watcher.close()
+        if self.backfill is not None:
+            self.backfill.close()
+        if self.session.capture is not None:
+            self.session.capture.close()
+        if self.history is not None:
+            HISTORY.pop(self.node_id, None)
+            self.history.close()
+        self.energy.save()
+        if self.mqtt_bridge and self.mqtt_bridge.connected.is_set():
+            await self.mqtt_bridge.publish(
+                f"{self.mqtt_topic}/availability",
+                "offline",
+                retain=True,
+                timeout=2.0
+            )
+
+
+class InverterFleet:
+    """Poll several inverters from one process over one MQTT connection.
+
+    Every unit gets its own MPPSolarMonitor (HID session, read deadline,
+    command scheduler, topic prefix and discovery device) running in its
+    own thread, or asyncio task with the asyncio engine, so a slow or
+    unplugged inverter never delays the others' cycles.
+    """
+
+    def __init__(self, devices: list[str]):
+        self.monitors = [MPPSolarMonitor(device, index) for index, device in enumerate(devices)]
+        self.primary = self.monitors[0]
+        # The base availability topic carries the LWT for every unit, so the
+        # first unit reports its own device on a topic of its own
+        self.primary.availability_topic = f"{self.primary.mqtt_topic}/device/availability"
+        for monitor in self.monitors:
+            monitor.keep_waiting = True
+        # Spread the units' cycles over the interval instead of polling all at once
+        for index, monitor in enumerate(self.monitors):
+            monitor.clock.phase = index * monitor.clock.period / len(self.monitors)
+        # Tag every log line with the inverter it belongs to
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(_InverterLogFilter())
+            handler.setFormatter(logging.Formatter(
+                '%(asctime)s - %(levelname)s - [%(inverter)s] %(message)s'
+            ))
+
+    def run(self):
+        """Main loop"""
+        if self.primary.metrics_port:
+            start_metrics_server(self.primary.metrics_port)
+        if self.primary.engine == 'asyncio':
+            try:
+                return asyncio.run(self.run_async())
+            except KeyboardInterrupt:
+                logger.info("Shutting down...")
+                return 0
+
+        logger.info(f"Starting MPP Solar Monitor for {len(self.monitors)} inverters...")
+        if not self.primary.setup_mqtt(self.monitors):
+            logger.error("Failed to setup MQTT")
+            return 1
+
+        threads = [
+            threading.Thread(target=monitor.device_loop, name=monitor.node_id, daemon=True)
+            for monitor in self.monitors
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(1.0)
+        except KeyboardInterrupt:
+            logger.info("Shutting down...")
+            for monitor in self.monitors:
+                monitor.stop_event.set()
+            for thread in threads:
+                thread.join(self.primary.get_read_deadline_seconds() * 2)
+
+        for monitor in self.monitors:
+            monitor.close()
+        self.primary.stop_mqtt()
+        return 0
+
+    async def run_async(self):
+        """Main loop on asyncio: one task per inverter on a single thread"""
+        logger.info(f"Starting MPP Solar Monitor for {len(self.monitors)} inverters (asyncio engine)...")
+        mqtt_task = await self.primary.start_mqtt_async(self.monitors)
+        tasks = [
+            asyncio.create_task(monitor.device_loop_async(), name=monitor.node_id)
+            for monitor in self.monitors
+        ]
+        try:
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            for monitor in self.monitors:
+                await monitor.close_async()
+            self.primary.mqtt_client.disconnect()
+            mqtt_task.cancel()
         return 0
 
+
+def history_main(argv: list[str]) -> int:
+    """Query the history stores of a (running or stopped) add-on as CSV."""
+    parser = argparse.ArgumentParser(prog='mpp_solar_monitor.py history', description=history_main.__doc__)
+    parser.add_argument('fields', nargs='*', help=f"default: all of {', '.join(HISTORY_FIELDS)}")
+    parser.add_argument('--inverter', help="node id, e.g. mpp_solar_2 (default: the first one)")
+    parser.add_argument('--start', default='-1h', help="epoch seconds, ISO 8601 time or offset like -6h (default: -1h)")
+    parser.add_argument('--end', default='now')
+    parser.add_argument('--step', help="regroup into buckets of this width, e.g. 1h")
+    parser.add_argument('--tier', help="raw, " + ", ".join(tier for tier, _, _ in HISTORY_TIERS) + " (default: finest covering --start)")
+    parser.add_argument('--data-dir', default=os.path.join(os.environ.get('DATA_DIR', '/data'), 'history'))
+    args = parser.parse_args(argv)
+
+    stores = {}
+    for entry in sorted(os.listdir(args.data_dir)) if os.path.isdir(args.data_dir) else []:
+        if entry.startswith('history_') and entry.endswith('_raw.ring'):
+            store = HistoryStore(args.data_dir, entry[:-len('_raw.ring')])
+            store.open(readonly=True)
+            stores[store.name[len('history_'):]] = store
+    try:
+        result = query_history(stores, {
+            'inverter': args.inverter, 'start': args.start, 'end': args.end,
+            'fields': ','.join(args.fields), 'step': args.step, 'tier': args.tier,
+        }, time.time())
+    except ValueError as e:
+        parser.error(str(e))
+    rows = result['rows']
+    columns = list(rows[0]) if rows else ['time', *(args.fields or HISTORY_FIELDS)]
+    writer = csv.writer(sys.stdout)
+    writer.writerow(columns)
+    for row in rows:
+        row['time'] = datetime.fromtimestamp(row['time'], timezone.utc).isoformat()
+        writer.writerow(['' if row[column] is None else row[column] for column in columns])
+    return 0
+
+
+def main():
+    if sys.argv[1:2] == ['history']:
+        return history_main(sys.argv[2:])
+    devices = parse_device_list(os.environ.get('DEVICE', '/dev/hidraw0'))
+    if len(devices) > 1:
+        return InverterFleet(devices).run()
+    return MPPSolarMonitor().run()
+
+
 if __name__ == "__main__":
-    monitor = MPPSolarMonitor()
-    sys.exit(monitor.run())
+    sys.exit(main())
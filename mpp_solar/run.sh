@@ -10,6 +10,26 @@ MQTT_PASSWORD=$(bashio::config 'mqtt_password')
 MQTT_TOPIC=$(bashio::config 'mqtt_topic')
 DEBUG=$(bashio::config 'debug')
 CRC_STRICT=$(bashio::config 'crc_strict')
+ENGINE=$(bashio::config 'engine')
+COMMANDS=$(bashio::config 'commands')
+POLL_BUDGET=$(bashio::config 'poll_budget')
+PUBLISH_HEARTBEAT=$(bashio::config 'publish_heartbeat')
+DEADBANDS=$(bashio::config 'deadbands')
+STATE_TOPICS=$(bashio::config 'state_topics')
+BACKFILL_SAMPLES=$(bashio::config 'backfill_samples')
+BACKFILL_RATE=$(bashio::config 'backfill_rate')
+SAMPLE_INTERVAL=$(bashio::config 'sample_interval')
+METRICS_PORT=$(bashio::config 'metrics_port')
+ADAPTIVE_DEADLINE=$(bashio::config 'adaptive_deadline')
+ALIGN_TO_CLOCK=$(bashio::config 'align_to_clock')
+MISSED_TICKS=$(bashio::config 'missed_ticks')
+PUBLISH_QUEUE=$(bashio::config 'publish_queue')
+QUEUE_POLICY=$(bashio::config 'queue_policy')
+CAPTURE_FRAMES=$(bashio::config 'capture_frames')
+CAPTURE_MAX_MB=$(bashio::config 'capture_max_mb')
+HISTORY_HOURS=$(bashio::config 'history_hours')
+BAUD_RATE=$(bashio::config 'baud_rate')
+LOG_SUMMARY_INTERVAL=$(bashio::config 'log_summary_interval')
 
 # Try to get MQTT service info from HA (only if not configured manually)
 if bashio::services.available "mqtt" && [ "${MQTT_HOST}" = "core-mosquitto" ] && [ -z "${MQTT_USERNAME}" ]; then
@@ -41,6 +61,26 @@ export MQTT_PASSWORD="${MQTT_PASSWORD}"
 export MQTT_TOPIC="${MQTT_TOPIC}"
 export DEBUG="${DEBUG}"
 export CRC_STRICT="${CRC_STRICT}"
+export ENGINE="${ENGINE}"
+export COMMANDS="${COMMANDS}"
+export POLL_BUDGET="${POLL_BUDGET}"
+export PUBLISH_HEARTBEAT="${PUBLISH_HEARTBEAT}"
+export DEADBANDS="${DEADBANDS}"
+export STATE_TOPICS="${STATE_TOPICS}"
+export BACKFILL_SAMPLES="${BACKFILL_SAMPLES}"
+export BACKFILL_RATE="${BACKFILL_RATE}"
+export SAMPLE_INTERVAL="${SAMPLE_INTERVAL}"
+export METRICS_PORT="${METRICS_PORT}"
+export ADAPTIVE_DEADLINE="${ADAPTIVE_DEADLINE}"
+export ALIGN_TO_CLOCK="${ALIGN_TO_CLOCK}"
+export MISSED_TICKS="${MISSED_TICKS}"
+export PUBLISH_QUEUE="${PUBLISH_QUEUE}"
+export QUEUE_POLICY="${QUEUE_POLICY}"
+export CAPTURE_FRAMES="${CAPTURE_FRAMES}"
+export CAPTURE_MAX_MB="${CAPTURE_MAX_MB}"
+export HISTORY_HOURS="${HISTORY_HOURS}"
+export BAUD_RATE="${BAUD_RATE}"
+export LOG_SUMMARY_INTERVAL="${LOG_SUMMARY_INTERVAL}"
 
 bashio::log.info "Starting MPP Solar Monitor..."
 bashio::log.info "Device: ${DEVICE}"
@@ -54,12 +94,34 @@ else
     bashio::log.warning "MQTT service not available, using configured host"
 fi
 
-# Check device availability  
-if [ -e "${DEVICE}" ]; then
-    bashio::log.info "Device ${DEVICE} found"
-    ls -la "${DEVICE}" || true
-else
-    bashio::log.warning "Device ${DEVICE} not found"
+# Check device availability (a comma separated list polls several inverters)
+MISSING_DEVICE=false
+IFS=',' read -ra DEVICE_SPECS <<< "${DEVICE}"
+for SPEC in "${DEVICE_SPECS[@]}"; do
+    SPEC="$(echo "${SPEC}" | xargs)"
+    [ -z "${SPEC}" ] && continue
+    case "${SPEC,,}" in
+        tcp://*)
+            bashio::log.info "Device ${SPEC} is a TCP bridge, connecting from the monitor"
+            continue
+            ;;
+        usb:*)
+            bashio::log.info "Device ${SPEC} is resolved by USB id from the monitor"
+            continue
+            ;;
+        serial:*)
+            SPEC="${SPEC:7}"
+            ;;
+    esac
+    if [ -e "${SPEC}" ]; then
+        bashio::log.info "Device ${SPEC} found"
+        ls -la "${SPEC}" || true
+    else
+        bashio::log.warning "Device ${SPEC} not found"
+        MISSING_DEVICE=true
+    fi
+done
+if [ "${MISSING_DEVICE}" = true ]; then
     # List all hidraw devices for debugging
     bashio::log.info "Available hidraw devices:"
     ls -la /dev/hidraw* 2>/dev/null || bashio::log.info "No hidraw devices found"
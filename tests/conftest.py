@@ -0,0 +1,52 @@
+from collections import namedtuple
+from types import SimpleNamespace
+
+import pytest
+
+
+Message = namedtuple("Message", "topic payload qos retain")
+
+
+class FakeMQTTClient:
+    """paho client stand-in that records what is published.
+
+    Publishing fails with rc=4 (not connected) while `connected` is False
+    or for topics in `failing`, and records nothing then. `acks` decides
+    what is_published() reports for accepted messages; `rc` forces the
+    result code of every publish.
+    """
+
+    def __init__(self, connected=True, failing=(), rc=None):
+        self.connected = connected
+        self.acks = True
+        self.failing = set(failing)
+        self.rc = rc
+        self.on_connect = None
+        self.published: list[Message] = []
+        # Last payload per topic, as a broker would retain it
+        self.messages: dict[str, str] = {}
+        self.subscriptions = []
+        self.unsubscribed = []
+
+    def is_connected(self):
+        return self.connected
+
+    def publish(self, topic, payload, qos=0, retain=False):
+        rc = self.rc if self.rc is not None else 0 if self.connected and topic not in self.failing else 4
+        if rc != 0:
+            return SimpleNamespace(rc=rc, mid=0, is_published=lambda: False)
+        self.published.append(Message(topic, payload, qos, retain))
+        self.messages[topic] = payload
+        acked = self.acks
+        return SimpleNamespace(rc=0, mid=len(self.published), is_published=lambda: acked)
+
+    def subscribe(self, topic, qos=0):
+        self.subscriptions.append(topic)
+
+    def unsubscribe(self, topic):
+        self.unsubscribed.append(topic)
+
+
+@pytest.fixture
+def mqtt_client():
+    return FakeMQTTClient()
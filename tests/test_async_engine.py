@@ -0,0 +1,92 @@
+import asyncio
+import os
+import sys
+import time
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient  # noqa: E402
+from mpp_solar_monitor import AsyncioMQTTBridge, MPPSolarMonitor  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class AsyncReadTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+        self.monitor = MPPSolarMonitor()
+        self.addCleanup(self.monitor.session.close)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_read_is_woken_by_fragmented_reply(self):
+        crc = self.monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+        wire = QPIGS_PAYLOAD + crc + b"\r"
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            for i in range(0, len(wire), 8):
+                loop.call_later(0.01 + i * 0.001, os.write, self.inverter.master, wire[i:i + 8])
+            started = loop.time()
+            data = await self.monitor.read_inverter_data_async()
+            return data, loop.time() - started
+
+        data, elapsed = asyncio.run(scenario())
+
+        self.assertIsNotNone(data)
+        self.assertEqual(data["ac_output_power"], 2343)
+        self.assertLess(elapsed, 1.0)
+        self.assertEqual(os.read(self.inverter.master, 64), b"QPIGS\xb7\xa9\r")
+
+    def test_read_times_out_without_reply(self):
+        started = time.monotonic()
+
+        self.assertIsNone(asyncio.run(self.monitor.read_inverter_data_async()))
+        self.assertGreaterEqual(
+            time.monotonic() - started, self.monitor.get_read_deadline_seconds() - 0.05
+        )
+
+
+class AsyncioMQTTBridgeTests(unittest.TestCase):
+    def test_publish_waits_for_on_publish(self):
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            client = FakeMQTTClient()
+            bridge = AsyncioMQTTBridge(loop, client)
+            loop.call_later(0.01, client.on_publish, client, None, 1)
+            return await bridge.publish("mpp_solar/state", "{}")
+
+        self.assertTrue(asyncio.run(scenario()))
+
+    def test_publish_returns_false_when_not_connected(self):
+        async def scenario():
+            bridge = AsyncioMQTTBridge(asyncio.get_running_loop(), FakeMQTTClient(rc=4))
+            return await bridge.publish("mpp_solar/state", "{}")
+
+        self.assertFalse(asyncio.run(scenario()))
+
+    def test_connect_callback_is_chained(self):
+        calls = []
+
+        async def scenario():
+            client = FakeMQTTClient()
+            client.on_connect = lambda *args: calls.append(args[-1])
+            bridge = AsyncioMQTTBridge(asyncio.get_running_loop(), client)
+            client.on_connect(client, None, {}, 0)
+            return bridge.connected.is_set()
+
+        self.assertTrue(asyncio.run(scenario()))
+        self.assertEqual(calls, [0])
+
+
+if __name__ == "__main__":
+    unittest.main()
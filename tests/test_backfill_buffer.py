@@ -0,0 +1,236 @@
+import json
+import mmap
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient  # noqa: E402
+from mpp_solar_monitor import MPPSolarMonitor, SampleBuffer  # noqa: E402
+from test_command_scheduler import QPIRI_VALUES  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD  # noqa: E402
+from test_publish_filter import SAMPLE  # noqa: E402
+
+
+class SampleBufferTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "ring")
+
+    def open_buffer(self, slots=4, slot_size=64):
+        buffer = SampleBuffer(self.path, slots, slot_size)
+        buffer.open()
+        self.addCleanup(buffer.close)
+        return buffer
+
+    def test_samples_come_back_oldest_first(self):
+        buffer = self.open_buffer()
+        for n in range(3):
+            buffer.append(b"sample %d" % n)
+
+        items = buffer.peek(2)
+        self.assertEqual([payload for _, payload in items], [b"sample 0", b"sample 1"])
+        buffer.pop(items[-1][0])
+        self.assertEqual(buffer.peek(10), [(2, b"sample 2")])
+
+    def test_full_buffer_overwrites_oldest_at_fixed_size(self):
+        buffer = self.open_buffer()
+        for n in range(6):
+            buffer.append(b"sample %d" % n)
+
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.dropped, 2)
+        self.assertEqual(buffer.peek(1)[0][1], b"sample 2")
+        self.assertEqual(os.path.getsize(self.path), SampleBuffer.HEADER.size + 4 * 64)
+
+    def test_pop_of_overwritten_sequence_does_not_skip_newer_samples(self):
+        buffer = self.open_buffer()
+        for n in range(4):
+            buffer.append(b"sample %d" % n)
+        seq, _ = buffer.peek(1)[0]
+        buffer.append(b"sample 4")
+        buffer.pop(seq)
+        self.assertEqual(buffer.peek(1)[0][1], b"sample 1")
+
+    def test_contents_survive_reopen(self):
+        buffer = self.open_buffer()
+        buffer.append(b"before restart")
+        buffer.close()
+
+        reopened = self.open_buffer()
+        self.assertEqual(reopened.peek(1)[0][1], b"before restart")
+
+    def test_torn_record_is_skipped(self):
+        buffer = self.open_buffer()
+        buffer.append(b"torn")
+        buffer.append(b"intact")
+        offset = SampleBuffer.HEADER.size + SampleBuffer.RECORD.size
+        buffer._map[offset:offset + 4] = b"\xff\xff\xff\xff"
+
+        self.assertEqual([payload for _, payload in buffer.peek(10)], [b"intact"])
+        self.assertEqual(buffer.corrupt, 1)
+
+    def test_layout_change_starts_empty(self):
+        buffer = self.open_buffer()
+        buffer.append(b"sample")
+        buffer.close()
+
+        resized = self.open_buffer(slots=8)
+        self.assertEqual(len(resized), 0)
+        self.assertEqual(os.path.getsize(self.path), SampleBuffer.HEADER.size + 8 * 64)
+
+    def test_disk_sync_is_not_per_sample(self):
+        syncs = []
+
+        class CountingMap(mmap.mmap):
+            def flush(self, *args):
+                syncs.append(args)
+                return super().flush(*args)
+
+        with mock.patch("mmap.mmap", CountingMap):
+            buffer = self.open_buffer(slots=64)
+        for n in range(50):
+            buffer.append(b"sample %d" % n)
+            buffer.pop(buffer.peek(1)[0][0])
+        self.assertEqual(len(syncs), 1)
+
+        buffer.close()
+        self.assertEqual(len(syncs), 2)
+
+    def test_large_sample_continues_over_following_slots(self):
+        buffer = self.open_buffer()
+        buffer.append(b"small")
+        buffer.append(b"x" * 150)
+
+        self.assertEqual(len(buffer), 2)
+        self.assertEqual([payload for _, payload in buffer.peek(10)], [b"small", b"x" * 150])
+        # Needs the slot of "small" and wraps around the end of the file
+        buffer.append(b"y" * 100)
+        self.assertEqual(len(buffer), 1)
+        self.assertEqual(buffer.peek(10)[0][1], b"y" * 100)
+        buffer.close()
+
+        reopened = self.open_buffer()
+        self.assertEqual(len(reopened), 1)
+        self.assertEqual(reopened.peek(10)[0][1], b"y" * 100)
+
+    def test_sample_larger_than_buffer_is_dropped(self):
+        buffer = self.open_buffer()
+        self.assertFalse(buffer.append(b"x" * 4 * 64))
+        self.assertEqual(len(buffer), 0)
+
+
+class MonitorBackfillTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        os.environ["DATA_DIR"] = self._tmp.name
+        os.environ["INTERVAL"] = "5"
+        os.environ["BACKFILL_RATE"] = "0.4"
+        self.monitor = MPPSolarMonitor()
+        self.monitor.mqtt_client = FakeMQTTClient(connected=False)
+        self.monitor.open_backfill()
+        self.addCleanup(self.monitor.backfill.close)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_samples_are_buffered_while_disconnected_and_replayed_at_rate(self):
+        for n in range(3):
+            self.monitor.publish_data(dict(SAMPLE, battery_capacity=70 + n))
+        self.assertEqual(len(self.monitor.backfill), 3)
+        self.assertEqual(self.monitor.drain_backfill(now=0.0), 0)
+
+        self.monitor.mqtt_client.connected = True
+        self.assertEqual(self.monitor.drain_backfill(now=0.0), 2)
+        self.assertEqual(self.monitor.drain_backfill(now=0.0), 0)
+        self.assertEqual(self.monitor.drain_backfill(now=2.5), 1)
+
+        replayed = [json.loads(message.payload) for message in self.monitor.mqtt_client.published]
+        self.assertEqual([sample["battery_capacity"] for sample in replayed], [70, 71, 72])
+        self.assertTrue(all("timestamp" in sample for sample in replayed))
+        self.assertEqual(
+            {(message.topic, message.qos) for message in self.monitor.mqtt_client.published},
+            {("mpp_solar/backfill", 1)},
+        )
+
+    def test_rate_holds_when_draining_on_every_sample_tick(self):
+        os.environ.update(BACKFILL_RATE="10", SAMPLE_INTERVAL="0.2")
+        monitor = MPPSolarMonitor()
+        monitor.mqtt_client = FakeMQTTClient(connected=False)
+        monitor.backfill = self.monitor.backfill
+        for _ in range(450):
+            monitor.backfill.append(b"{}")
+        monitor.mqtt_client.connected = True
+
+        # 2 s of sample ticks: one interval's burst (50) plus 10/s
+        sent = sum(monitor.drain_backfill(now=tick * 0.2) for tick in range(11))
+
+        self.assertEqual(sent, 70)
+        self.assertEqual(len(monitor.backfill), 380)
+
+    def test_samples_are_released_only_after_the_broker_acknowledged_them(self):
+        for n in range(3):
+            self.monitor.backfill.append(b"sample %d" % n)
+        client = self.monitor.mqtt_client
+        client.connected = True
+        client.acks = False
+
+        self.assertEqual(self.monitor.drain_backfill(now=0.0), 2)
+        self.assertEqual(len(self.monitor.backfill), 3)
+        # Not acknowledged yet: the next drain goes on after them
+        self.assertEqual(self.monitor.drain_backfill(now=2.5), 1)
+        self.assertEqual([message.payload for message in client.published], [b"sample 0", b"sample 1", b"sample 2"])
+
+        # The connection dropped before the PUBACKs; after the ack timeout they are sent again
+        client.acks = True
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            self.assertEqual(self.monitor.drain_backfill(now=60.0), 2)
+        self.assertEqual(client.published[-1].payload, b"sample 1")
+        self.assertEqual(len(self.monitor.backfill), 1)
+
+    def test_oversampled_sample_of_every_command_is_buffered(self):
+        os.environ.update(
+            SAMPLE_INTERVAL="1", INTERVAL="5", COMMANDS="QPIGS,QPIGS2,QMOD,QPIWS,QPIRI",
+        )
+        monitor = MPPSolarMonitor()
+        monitor.mqtt_client = FakeMQTTClient(connected=False)
+        monitor.backfill = self.monitor.backfill
+        monitor.extra_state.update(monitor.parse_qpigs2(["01.5", "120.3", "00180"]))
+        monitor.extra_state.update(monitor.parse_qmod(["B"]))
+        monitor.extra_state.update(monitor.parse_qpiws(["0" * 11 + "11" + "1" * 19]))
+        monitor.extra_state.update(monitor.parse_qpiri(QPIRI_VALUES))
+        values = QPIGS_PAYLOAD[1:-1].decode().split()
+        for second in range(5):
+            sample = monitor.collect_sample(dict(monitor.parse_qpigs(values), **monitor.extra_state), second)
+
+        monitor.publish_data(sample)
+
+        payload = monitor._encode_state(sample).encode()
+        self.assertGreater(len(payload), monitor.backfill.slot_size)
+        self.assertEqual(len(monitor.backfill), 1)
+        self.assertEqual(monitor.backfill.peek(1)[0][1], payload)
+
+    def test_connected_samples_are_not_buffered(self):
+        self.monitor.mqtt_client.connected = True
+        self.monitor.publish_data(dict(SAMPLE))
+        self.assertEqual(len(self.monitor.backfill), 0)
+
+    def test_missing_data_dir_disables_buffer(self):
+        os.environ["DATA_DIR"] = os.path.join(self._tmp.name, "missing")
+        monitor = MPPSolarMonitor()
+        monitor.open_backfill()
+        self.assertIsNone(monitor.backfill)
+
+
+if __name__ == "__main__":
+    unittest.main()
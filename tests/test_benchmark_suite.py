@@ -0,0 +1,62 @@
+import json
+import logging
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+import run_suite  # noqa: E402
+from mpp_solar_monitor import MPPSolarMonitor  # noqa: E402
+
+
+class FixtureTests(unittest.TestCase):
+    def test_fixture_replies_are_valid_frames(self):
+        fixtures = run_suite.load_fixtures()
+        monitor = MPPSolarMonitor()
+        for name, wire in fixtures.replies.items():
+            with self.subTest(reply=name):
+                frame, _ = monitor.extract_complete_response_frame(wire)
+                self.assertIsNotNone(frame)
+                self.assertEqual(monitor.crc16_xmodem(frame[:-3]), int.from_bytes(frame[-3:-1], "big"))
+
+    def test_both_qpigs_layouts_are_covered(self):
+        fixtures = run_suite.load_fixtures()
+        monitor = MPPSolarMonitor()
+        layouts = {
+            monitor.detect_qpigs_layout(monitor.extract_values_from_response(fixtures.replies[name]))[0]
+            for name in ("qpigs_status16", "qpigs_status20")
+        }
+        self.assertEqual(layouts, {16, 20})
+
+
+class RegressionThresholdTests(unittest.TestCase):
+    def test_only_cases_beyond_threshold_are_reported(self):
+        baseline = {"results": {"a": {"us_per_op": 10.0}, "b": {"us_per_op": 10.0}}}
+        results = {"a": {"us_per_op": 12.0}, "b": {"us_per_op": 13.0}, "new": {"us_per_op": 1.0}}
+        self.assertEqual(run_suite.compare(results, baseline, 0.25), [("b", 1.3)])
+
+    def test_main_writes_json_and_fails_on_regression(self):
+        self.addCleanup(logging.disable, logging.NOTSET)
+        with tempfile.TemporaryDirectory() as tmp:
+            output = Path(tmp) / "results.json"
+            with redirect_stdout(StringIO()):
+                self.assertEqual(run_suite.main(["--number", "1", "--repeat", "1", "--json", str(output)]), 0)
+            report = json.loads(output.read_text())
+            self.assertIn("publish_data_json", report["results"])
+
+            for result in report["results"].values():
+                result["us_per_op"] = 1e-6
+            output.write_text(json.dumps(report))
+            with redirect_stdout(StringIO()):
+                self.assertEqual(run_suite.main(["--number", "1", "--repeat", "1", "--baseline", str(output)]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,181 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    HA_STATE_MAX_LENGTH,
+    QPIWS_WARNINGS,
+    CommandScheduler,
+    MPPSolarMonitor,
+    parse_command_intervals,
+)
+
+
+QPIRI_VALUES = (
+    "230.0 21.7 230.0 50.0 21.7 5000 5000 48.0 46.0 42.0 56.4 54.0 2 30 060 0 2 3 9 01 0 0 54.0 0 1"
+).split()
+
+
+class CommandIntervalTests(unittest.TestCase):
+    def test_qpigs_is_always_first(self):
+        intervals = parse_command_intervals("QMOD:30, QPIRI")
+
+        self.assertEqual(list(intervals), ["QPIGS", "QMOD", "QPIRI"])
+        self.assertEqual(intervals["QMOD"], 30.0)
+        self.assertEqual(intervals["QPIRI"], 3600.0)
+
+    def test_unknown_commands_are_ignored(self):
+        self.assertEqual(parse_command_intervals("QXYZ,QPIWS:10"), {"QPIGS": 0.0, "QPIWS": 10.0})
+
+
+class CommandSchedulerTests(unittest.TestCase):
+    def test_commands_follow_their_own_cadence(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QMOD": 30, "QPIRI": 3600}, budget=10)
+
+        self.assertEqual(scheduler.due(0.0), ["QPIGS", "QMOD", "QPIRI"])
+        for cmd in ("QPIGS", "QMOD", "QPIRI"):
+            scheduler.record(cmd, 0.0, 0.2, True)
+
+        self.assertEqual(scheduler.due(5.0), ["QPIGS"])
+        self.assertEqual(scheduler.due(30.0), ["QPIGS", "QMOD"])
+        self.assertEqual(scheduler.due(3600.0), ["QPIGS", "QMOD", "QPIRI"])
+
+    def test_budget_defers_expensive_commands(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QPIRI": 3600}, budget=1.0)
+        scheduler.cost["QPIRI"] = 0.6
+
+        self.assertTrue(scheduler.fits("QPIRI", 0.3))
+        self.assertFalse(scheduler.fits("QPIRI", 0.5))
+        self.assertEqual(scheduler.deferred["QPIRI"], 1)
+
+    def test_request_forces_next_cycle(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QPIRI": 3600}, budget=1.0)
+        scheduler.record("QPIRI", 0.0, 0.3, True)
+        scheduler.request("QPIRI")
+
+        self.assertIn("QPIRI", scheduler.due(1.0))
+
+    def test_cadence_does_not_drift_with_read_time(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QMOD": 30}, budget=10, slack=2.5)
+
+        for cycle in range(0, 95, 5):
+            now = cycle + 0.01
+            for cmd in scheduler.due(now):
+                # Every read finishes 0.4 s after the cycle started
+                scheduler.record(cmd, now + 0.4, 0.4, True)
+
+        self.assertEqual(scheduler.sent["QMOD"], 4)
+        self.assertAlmostEqual(scheduler.next_due["QMOD"], 120.01)
+
+    def test_cadenced_commands_are_staggered(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QMOD": 60, "QPIWS": 60, "QPIRI": 60}, budget=10, stagger=5)
+        for cmd in scheduler.due(0.0):
+            scheduler.record(cmd, 0.2, 0.2, True)
+
+        self.assertEqual(
+            [scheduler.next_due[cmd] for cmd in ("QMOD", "QPIWS", "QPIRI")], [60.0, 65.0, 70.0]
+        )
+
+    def test_qpigs_cannot_be_disabled(self):
+        scheduler = CommandScheduler({"QPIGS": 0, "QPIGS2": 0}, budget=1.0)
+        scheduler.disable("QPIGS2")
+        scheduler.disable("QPIGS")
+
+        self.assertEqual(scheduler.due(0.0), ["QPIGS"])
+
+
+class CommandDecoderTests(unittest.TestCase):
+    def setUp(self):
+        self.monitor = MPPSolarMonitor()
+
+    def test_parse_qmod(self):
+        self.assertEqual(self.monitor.parse_qmod(["B"]), {"device_mode": "Battery"})
+        self.assertIsNone(self.monitor.parse_qmod(["X"]))
+
+    def test_parse_qpiws_lists_active_warnings(self):
+        data = self.monitor.parse_qpiws(["00000000000100001000000000000000"])
+
+        self.assertEqual(data["warnings"], "Battery voltage high, Overload")
+        self.assertEqual(data["warning_count"], 2)
+        self.assertFalse(data["fault_active"])
+
+    def test_parse_qpiws_keeps_state_within_home_assistant_limit(self):
+        data = self.monitor.parse_qpiws(["0" + "1" * 31])
+
+        self.assertEqual(data["warning_count"], 27)
+        self.assertEqual(data["warning_list"], list(QPIWS_WARNINGS.values()))
+        self.assertLessEqual(len(data["warnings"]), HA_STATE_MAX_LENGTH)
+        self.assertTrue(data["warnings"].startswith("Inverter fault, Bus over, "))
+        self.assertRegex(data["warnings"], r", \+\d+ more$")
+
+    def test_parse_qpiri(self):
+        data = self.monitor.parse_qpiri(QPIRI_VALUES)
+
+        self.assertEqual(data["ac_output_rating_active_power"], 5000)
+        self.assertEqual(data["battery_float_voltage"], 54.0)
+        self.assertEqual(data["battery_type"], "User")
+        self.assertEqual(data["output_source_priority"], "SBU first")
+        self.assertEqual(data["charger_source_priority"], "Only solar")
+
+    def test_parse_qpigs2(self):
+        self.assertEqual(
+            self.monitor.parse_qpigs2(["04.1", "120.3", "00493"]),
+            {"pv2_input_current": 4.1, "pv2_input_voltage": 120.3, "pv2_input_power": 493},
+        )
+
+    def test_nak_disables_command(self):
+        self.monitor.scheduler = CommandScheduler({"QPIGS": 0, "QPIGS2": 0}, budget=1.0)
+
+        self.assertIsNone(self.monitor._decode_values("QPIGS2", ["NAK"]))
+        self.assertNotIn("QPIGS2", self.monitor.scheduler.intervals)
+
+
+class PollCycleTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        os.environ["COMMANDS"] = "QPIGS,QMOD:30,QPIRI:3600"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_slow_command_values_are_merged_into_state(self):
+        monitor = MPPSolarMonitor()
+        replies = {
+            "QPIGS": {"pv_input_power": 500},
+            "QMOD": {"device_mode": "Line"},
+            "QPIRI": {"battery_type": "AGM"},
+        }
+        sent = []
+
+        def fake_read(command):
+            sent.append(command)
+            return dict(replies[command])
+
+        with mock.patch.object(monitor, "read_command", side_effect=fake_read):
+            first = monitor.poll_cycle()
+            second = monitor.poll_cycle()
+
+        self.assertEqual(sent, ["QPIGS", "QMOD", "QPIRI", "QPIGS"])
+        self.assertEqual(first["device_mode"], "Line")
+        self.assertEqual(second["battery_type"], "AGM")
+
+    def test_mode_change_requests_ratings(self):
+        monitor = MPPSolarMonitor()
+        monitor.extra_state["device_mode"] = "Line"
+        monitor.scheduler.record("QPIRI", 0.0, 0.1, True)
+
+        monitor._merge_extra_state({"device_mode": "Battery"})
+
+        self.assertEqual(monitor.scheduler.next_due["QPIRI"], 0.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    MPPSolarMonitor,
+    StreamingFrameCRC,
+    crc16_xmodem_update,
+)
+
+
+PAYLOAD = (
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)"
+)
+
+
+def crc16_xmodem_bitwise(data):
+    crc = 0
+    for byte in data:
+        crc ^= byte << 8
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x1021) if crc & 0x8000 else (crc << 1)
+            crc &= 0xFFFF
+    return crc
+
+
+class CRCTests(unittest.TestCase):
+    def test_table_matches_bitwise_reference(self):
+        for data in (b"", b"QPIGS", b"123456789", bytes(range(256)), PAYLOAD):
+            self.assertEqual(crc16_xmodem_update(0, data), crc16_xmodem_bitwise(data))
+
+    def test_known_check_value(self):
+        self.assertEqual(crc16_xmodem_update(0, b"123456789"), 0x31C3)
+
+    def test_incremental_update_equals_one_shot(self):
+        crc = 0
+        for i in range(0, len(PAYLOAD), 7):
+            crc = crc16_xmodem_update(crc, PAYLOAD[i:i + 7])
+        self.assertEqual(crc, crc16_xmodem_update(0, PAYLOAD))
+
+    def test_create_command_is_cached(self):
+        monitor = MPPSolarMonitor()
+        first = monitor.create_command("QPIGS")
+
+        self.assertEqual(first, b"QPIGS\xb7\xa9\r")
+        self.assertIs(monitor.create_command("QPIGS"), first)
+
+
+class StreamingFrameCRCTests(unittest.TestCase):
+    def setUp(self):
+        self.crc = crc16_xmodem_update(0, PAYLOAD)
+        self.wire = b"\x00noise" + PAYLOAD + self.crc.to_bytes(2, "big") + b"\r(next"
+
+    def test_verdict_ready_when_trailer_lands(self):
+        tracker = StreamingFrameCRC()
+        buffer = b""
+        frame_end = len(self.wire) - len(b"(next")
+        for i in range(0, len(self.wire), 8):
+            buffer = self.wire[:i + 8]
+            complete = tracker.feed(buffer)
+            self.assertEqual(complete, len(buffer) >= frame_end)
+            if complete:
+                break
+
+        self.assertEqual(tracker.crc, self.crc)
+        self.assertEqual(tracker.expected_crc(buffer), self.crc)
+        self.assertEqual(buffer[tracker.frame_start:tracker.frame_end], self.wire[6:frame_end])
+
+    def test_corrupted_payload_is_detected(self):
+        wire = self.wire.replace(b"2343", b"2348")
+        tracker = StreamingFrameCRC()
+
+        self.assertTrue(tracker.feed(wire))
+        self.assertNotEqual(tracker.crc, tracker.expected_crc(wire))
+
+    def test_missing_carriage_return_is_not_complete(self):
+        tracker = StreamingFrameCRC()
+
+        self.assertFalse(tracker.feed(PAYLOAD + self.crc.to_bytes(2, "big") + b"X"))
+
+
+if __name__ == "__main__":
+    unittest.main()
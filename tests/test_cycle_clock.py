@@ -0,0 +1,107 @@
+import asyncio
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import CycleClock, InverterFleet, MPPSolarMonitor  # noqa: E402
+
+
+class CycleClockTests(unittest.TestCase):
+    def test_ticks_stay_on_the_grid(self):
+        clock = CycleClock(5.0)
+        tick = clock.start(100.0)
+
+        for finished in (101.3, 107.9, 110.2):
+            tick = clock.advance(tick, finished)
+
+        self.assertEqual(tick, 115.0)
+        self.assertEqual(clock.missed, 0)
+
+    def test_alignment_to_wall_clock(self):
+        clock = CycleClock(10.0, align=True)
+
+        # Wall clock at ...03.5 s: the first tick is at ...10 s
+        self.assertAlmostEqual(clock.start(50.0, wall=1_700_000_003.5), 56.5)
+
+    def test_phase_shifts_aligned_ticks(self):
+        clock = CycleClock(10.0, phase=5.0, align=True)
+
+        self.assertAlmostEqual(clock.start(50.0, wall=1_700_000_003.5), 51.5)
+
+    def test_skip_resumes_at_next_future_tick(self):
+        clock = CycleClock(5.0)
+
+        # The cycle for tick 0 ran until 12.0: ticks 5 and 10 are dropped
+        self.assertEqual(clock.advance(0.0, 12.0), 15.0)
+        self.assertEqual(clock.missed, 2)
+
+    def test_catch_up_runs_missed_ticks(self):
+        clock = CycleClock(5.0, policy="catch_up")
+
+        self.assertEqual(clock.advance(0.0, 12.0), 5.0)
+        self.assertEqual(clock.missed, 0)
+
+    def test_catch_up_is_limited(self):
+        clock = CycleClock(1.0, policy="catch_up")
+
+        tick = clock.advance(0.0, 10.5)
+
+        self.assertEqual(tick, 10.0 - CycleClock.CATCH_UP_LIMIT + 1)
+        self.assertEqual(clock.missed, 10 - CycleClock.CATCH_UP_LIMIT)
+
+    def test_lateness_is_recorded_per_tick(self):
+        clock = CycleClock(5.0)
+
+        self.assertAlmostEqual(clock.begin(10.0, 10.02), 0.02)
+        self.assertEqual(clock.begin(15.0, 14.99), 0.0)
+        self.assertEqual(clock.ticks, 2)
+        self.assertAlmostEqual(clock.max_lateness, 0.02)
+
+
+class MonitorCycleTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "1"
+        os.environ["DATA_DIR"] = "/nonexistent"
+        os.environ["BACKFILL_SAMPLES"] = "0"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_slow_cycles_do_not_shift_later_ticks(self):
+        monitor = MPPSolarMonitor("/dev/null")
+        monitor.clock.period = 0.2
+        starts = []
+
+        async def poll():
+            starts.append(asyncio.get_running_loop().time())
+            if len(starts) == 4:
+                raise asyncio.CancelledError
+            # The first cycle overruns two ticks, the others take 0.05 s
+            await asyncio.sleep(0.5 if len(starts) == 1 else 0.05)
+            return None
+
+        monitor.poll_cycle_async = poll
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(monitor.monitor_loop_async())
+
+        for start, expected in zip(starts, (0.0, 0.6, 0.8, 1.0)):
+            self.assertAlmostEqual(start - starts[0], expected, delta=0.03)
+        self.assertEqual(monitor.clock.missed, 2)
+
+    def test_fleet_staggers_inverters_over_the_interval(self):
+        os.environ["INTERVAL"] = "6"
+        fleet = InverterFleet(["/dev/a", "/dev/b", "/dev/c"])
+
+        self.assertEqual([m.clock.phase for m in fleet.monitors], [0.0, 2.0, 4.0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+import mpp_solar_monitor  # noqa: E402
+from mpp_solar_monitor import DeviceWatcher, MPPSolarMonitor, resolve_device  # noqa: E402
+
+
+def add_hidraw(sysfs, name, vid, pid):
+    device = Path(sysfs) / name / "device"
+    device.mkdir(parents=True, exist_ok=True)
+    (device / "uevent").write_text(
+        f"DRIVER=hid-generic\nHID_ID=0003:{vid:08X}:{pid:08X}\nHID_NAME=Inverter\n"
+    )
+
+
+class ResolveDeviceTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.sysfs = tmp.name
+        add_hidraw(self.sysfs, "hidraw0", 0x046D, 0xC52B)
+        add_hidraw(self.sysfs, "hidraw2", 0x0665, 0x5161)
+        add_hidraw(self.sysfs, "hidraw10", 0x0665, 0x5161)
+
+    def test_paths_are_returned_unchanged(self):
+        self.assertEqual(resolve_device("/dev/hidraw3", self.sysfs), "/dev/hidraw3")
+
+    def test_usb_id_selects_matching_node(self):
+        self.assertEqual(resolve_device("usb:0665:5161", self.sysfs), "/dev/hidraw2")
+        self.assertEqual(resolve_device("USB:665:5161@2", self.sysfs), "/dev/hidraw10")
+
+    def test_missing_or_invalid_ids_resolve_to_none(self):
+        self.assertIsNone(resolve_device("usb:0665:5161@3", self.sysfs))
+        self.assertIsNone(resolve_device("usb:1234:5678", self.sysfs))
+        with self.assertLogs("mpp_solar_monitor", "ERROR"):
+            self.assertIsNone(resolve_device("usb:inverter", self.sysfs))
+
+
+class DeviceWatcherTests(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dev = Path(tmp.name)
+        self.watcher = DeviceWatcher.create(tmp.name)
+        if self.watcher is None:
+            self.skipTest("inotify not available")
+        self.addCleanup(self.watcher.close)
+
+    def later(self, delay, action):
+        timer = threading.Timer(delay, action)
+        timer.start()
+        self.addCleanup(timer.join)
+
+    def test_wait_wakes_on_node_creation(self):
+        self.later(0.05, (self.dev / "hidraw0").touch)
+        started = time.monotonic()
+
+        self.assertTrue(self.watcher.wait(5))
+
+        self.assertLess(time.monotonic() - started, 1.0)
+        self.assertFalse(self.watcher.wait(0.05))
+
+    def test_events_carry_node_names(self):
+        (self.dev / "hidraw0").touch()
+        (self.dev / "hidraw0").unlink()
+
+        self.assertEqual(self.watcher.read_events(), ["hidraw0", "hidraw0"])
+
+
+class MonitorHotplugTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dev = Path(tmp.name)
+        self.node = self.dev / "hidraw0"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def monitor(self, device):
+        monitor = MPPSolarMonitor(device)
+        self.addCleanup(monitor.close)
+        return monitor
+
+    def test_wait_for_device_returns_when_node_appears(self):
+        monitor = self.monitor(str(self.node))
+        timer = threading.Timer(0.1, self.node.touch)
+        timer.start()
+        self.addCleanup(timer.join)
+        started = time.monotonic()
+
+        with self.assertLogs("mpp_solar_monitor", "INFO"):
+            self.assertTrue(monitor.wait_for_device())
+
+        self.assertLess(time.monotonic() - started, 2.0)
+
+    def test_sleep_is_cut_short_when_node_is_removed(self):
+        self.node.touch()
+        monitor = self.monitor(str(self.node))
+        monitor._watch_device()
+        if monitor.watcher is None:
+            self.skipTest("inotify not available")
+        timer = threading.Timer(0.1, self.node.unlink)
+        timer.start()
+        self.addCleanup(timer.join)
+        started = time.monotonic()
+
+        self.assertFalse(monitor._sleep_until(started + 5))
+
+        self.assertLess(time.monotonic() - started, 2.0)
+        self.assertTrue(monitor._device_removed())
+
+    def test_usb_id_follows_re_enumeration(self):
+        sysfs = self.dev / "sysfs"
+        add_hidraw(sysfs, "hidraw0", 0x0665, 0x5161)
+        with mock.patch.object(mpp_solar_monitor, "HIDRAW_SYSFS", str(sysfs)):
+            monitor = self.monitor("usb:0665:5161")
+            self.assertEqual(monitor.device, "/dev/hidraw0")
+
+            # The inverter comes back as hidraw1 after a USB reset
+            (sysfs / "hidraw0" / "device" / "uevent").write_text("HID_ID=0003:0000046D:0000C52B\n")
+            add_hidraw(sysfs, "hidraw1", 0x0665, 0x5161)
+            self.assertTrue(monitor._device_removed())
+            with self.assertLogs("mpp_solar_monitor", "INFO"):
+                monitor._resolve_device()
+
+        self.assertEqual(monitor.device, "/dev/hidraw1")
+        self.assertEqual(monitor.session.device, "/dev/hidraw1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+import hashlib
+import os
+import sys
+import unittest
+from pathlib import Path
+from types import SimpleNamespace
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+import mpp_solar_monitor  # noqa: E402
+from conftest import FakeMQTTClient, Message  # noqa: E402
+from mpp_solar_monitor import MPPSolarMonitor  # noqa: E402
+
+
+class DiscoverySyncTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["COMMANDS"] = "QPIGS"
+        self.monitor = MPPSolarMonitor()
+        self.client = FakeMQTTClient()
+        self.monitor.mqtt_client = self.client
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def retained(self, topic, payload):
+        self.monitor.on_discovery_message(topic, payload.encode())
+
+    def test_payloads_are_built_once(self):
+        with mock.patch.object(
+            self.monitor, "_build_discovery_messages", wraps=self.monitor._build_discovery_messages
+        ) as build:
+            first = self.monitor.discovery_messages()
+            second = self.monitor.discovery_messages()
+        self.assertIs(first, second)
+        self.assertEqual(build.call_count, 1)
+
+    def test_entity_set_change_rebuilds_payloads(self):
+        before = self.monitor.discovery_messages()
+        self.monitor.scheduler.intervals["QMOD"] = 30
+        after = self.monitor.discovery_messages()
+        self.assertIn("homeassistant/sensor/mpp_solar/device_mode/config", after)
+        self.assertNotIn("homeassistant/sensor/mpp_solar/device_mode/config", before)
+
+    def test_empty_broker_receives_every_config(self):
+        self.monitor.sync_discovery()
+        self.assertEqual(len(self.client.published), len(self.monitor.discovery_messages()))
+        self.assertEqual(self.monitor.discovery_stats["published"], len(self.client.published))
+        self.assertEqual(self.client.unsubscribed, ["homeassistant/+/mpp_solar/+/config"])
+
+    def test_matching_retained_configs_are_not_resent(self):
+        messages = self.monitor.discovery_messages()
+        for topic, payload in messages.items():
+            self.retained(topic, payload)
+        changed = "homeassistant/sensor/mpp_solar/battery_voltage/config"
+        self.retained(changed, '{"name": "old"}')
+
+        self.monitor.sync_discovery()
+
+        self.assertEqual(self.client.published, [Message(changed, messages[changed], 1, True)])
+        self.assertEqual(self.monitor.discovery_stats["unchanged"], len(messages) - 1)
+
+    def test_stale_retained_configs_are_cleared(self):
+        for topic, payload in self.monitor.discovery_messages().items():
+            self.retained(topic, payload)
+        stale = "homeassistant/sensor/mpp_solar/device_mode/config"
+        self.retained(stale, '{"name": "Device Mode"}')
+
+        self.monitor.sync_discovery()
+
+        self.assertEqual(self.client.published, [Message(stale, "", 1, True)])
+        self.assertEqual(self.monitor.discovery_stats["removed"], 1)
+
+    def test_connect_defers_publishing_to_a_timer(self):
+        with mock.patch.object(mpp_solar_monitor.threading, "Timer") as timer:
+            self.monitor.start_discovery_sync(self.client)
+
+        self.assertEqual(self.client.subscriptions, ["homeassistant/+/mpp_solar/+/config"])
+        self.assertEqual(self.client.published, [])
+        timer.assert_called_once_with(
+            mpp_solar_monitor.DISCOVERY_SETTLE_SECONDS, self.monitor.sync_discovery
+        )
+        timer.return_value.start.assert_called_once()
+
+    def test_on_message_routes_retained_configs_by_node_id(self):
+        os.environ["DEVICE"] = "/dev/hidraw0,/dev/hidraw1"
+        second = MPPSolarMonitor(device="/dev/hidraw1", index=1)
+        client = self.monitor._create_mqtt_client([self.monitor, second])
+        topic = "homeassistant/sensor/mpp_solar_2/battery_voltage/config"
+
+        client.on_message(client, None, SimpleNamespace(topic=topic, payload=b"{}"))
+
+        self.assertEqual(second._broker_discovery, {topic: hashlib.sha1(b"{}").hexdigest()})
+        self.assertEqual(self.monitor._broker_discovery, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
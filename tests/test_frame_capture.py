@@ -0,0 +1,112 @@
+import os
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+from mpp_solar_monitor import FrameCapture, MPPSolarMonitor, capture_name, read_capture  # noqa: E402
+from replay_capture import replay_files  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class FrameCaptureTests(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+
+    def test_records_round_trip_with_wall_times(self):
+        capture = FrameCapture(self.dir, "frames_a")
+        capture.record(FrameCapture.COMMAND, b"QPIGS\xb7\xa9\r", now=100.0)
+        capture.record(FrameCapture.CHUNK, b"(230.0 5", now=100.25)
+        capture.close()
+
+        records = list(read_capture(capture.path))
+
+        self.assertEqual([(kind, data) for _, kind, data in records],
+                         [(FrameCapture.COMMAND, b"QPIGS\xb7\xa9\r"), (FrameCapture.CHUNK, b"(230.0 5")])
+        self.assertAlmostEqual(records[1][0] - records[0][0], 0.25)
+        self.assertEqual(capture_name(capture.path), "frames_a")
+
+    def test_rotation_keeps_newest_files(self):
+        capture = FrameCapture(self.dir, "frames_a", max_bytes=100, keep=2)
+        other = FrameCapture(self.dir, "frames_a_2")
+        other.record(FrameCapture.CHUNK, b"x", now=0.0)
+        other.close()
+        paths = []
+        for i in range(5):
+            capture.record(FrameCapture.CHUNK, bytes(90), now=float(i))
+            paths.append(capture.path)
+            # File names have millisecond resolution
+            time.sleep(0.002)
+        capture.close()
+
+        self.assertEqual(len(set(paths)), 5)
+        self.assertEqual(capture.files(), paths[-2:])
+        self.assertEqual(other.files(), [other.path])
+
+    def test_truncated_file_ends_at_last_complete_record(self):
+        capture = FrameCapture(self.dir, "frames_a")
+        for i in range(50):
+            capture.record(FrameCapture.CHUNK, b"%02d" % i * 8, now=float(i))
+        capture._file.flush()
+        with open(capture.path, "rb") as f:
+            flushed = f.read()
+        capture.close()
+        with open(capture.path, "wb") as f:
+            f.write(flushed[:-5])
+
+        records = list(read_capture(capture.path))
+
+        self.assertTrue(0 < len(records) <= 50)
+        self.assertEqual(records[-1][2], b"%02d" % (len(records) - 1) * 8)
+
+
+class CaptureReplayTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+        os.environ["DATA_DIR"] = tempfile.mkdtemp()
+        os.environ["CAPTURE_FRAMES"] = "true"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_replay_reproduces_live_readings(self):
+        monitor = MPPSolarMonitor()
+        monitor.get_read_deadline_seconds = lambda: 0.2
+        monitor.open_capture()
+        crc = monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+        replies = [
+            QPIGS_PAYLOAD + crc + b"\r",
+            QPIGS_PAYLOAD + b"\x00\x00\r",             # CRC mismatch, still decoded
+            QPIGS_PAYLOAD[:60],                        # incomplete
+            b"",                                       # no reply
+            QPIGS_PAYLOAD + crc + b"\r\0\0" + QPIGS_PAYLOAD[:20],
+        ]
+        live = []
+        for reply in replies:
+            if reply:
+                os.write(self.inverter.master, reply)
+            live.append(monitor.read_command("QPIGS"))
+        monitor.close()
+
+        files = monitor.session.capture.files()
+        replayed = list(replay_files(files))
+
+        self.assertEqual([reading for _, _, reading, _ in replayed], live)
+        self.assertTrue(all(frame_ok for _, _, _, frame_ok in replayed))
+        self.assertEqual({command for _, command, _, _ in replayed}, {"QPIGS"})
+        self.assertIsNotNone(live[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+import os
+import sys
+import unittest
+from unittest import mock
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import FrameReader, MPPSolarMonitor, crc16_xmodem_update  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+def hid_reports(data, size=8):
+    """Split data into NUL padded HID reports like hidraw delivers them."""
+    return [data[i:i + size].ljust(size, b"\0") for i in range(0, len(data), size)]
+
+
+class ChunkSession:
+    """Serves canned chunks like HIDSession.read()."""
+
+    def __init__(self, chunks):
+        self.buffer = b""
+        self.reopen_count = 0
+        self.chunks = list(chunks)
+
+    def read(self, size=512):
+        return self.chunks.pop(0) if self.chunks else b""
+
+
+class FrameReaderTests(unittest.TestCase):
+    def test_carriage_return_in_crc_does_not_end_the_frame(self):
+        # CRC16 of "(00006)" is 0x2D0D, so its second byte is a carriage return
+        reader = FrameReader(ChunkSession([b"(00006)-\r", b"\r"]))
+
+        self.assertFalse(reader.read_chunk())
+        self.assertTrue(reader.read_chunk())
+        self.assertEqual(reader.tracker.crc, reader.tracker.expected_crc(reader.response))
+
+    def test_frame_left_over_from_the_previous_cycle_is_complete_at_once(self):
+        session = ChunkSession([])
+        session.buffer = b"(L)" + crc16_xmodem_update(0, b"(L)").to_bytes(2, "big") + b"\r(next"
+
+        reader = FrameReader(session)
+
+        self.assertTrue(reader.complete)
+        self.assertTrue(reader.buffered)
+
+
+class PaddedReportTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+        self.monitor = MPPSolarMonitor()
+        self.addCleanup(self.monitor.session.close)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_padded_reports_decode_and_leave_next_frame_buffered(self):
+        crc = self.monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+        for report in hid_reports(QPIGS_PAYLOAD + crc + b"\r") + [b"(230.0 \0"]:
+            os.write(self.inverter.master, report)
+
+        data = self.monitor.read_command("QPIGS")
+
+        self.assertEqual(data["pv_input_power"], 528)
+        self.assertTrue(self.monitor.session.buffer.startswith(b"(230.0"))
+
+    def test_partial_frame_ignores_trailing_padding(self):
+        partial = QPIGS_PAYLOAD[:-1] + b"\r"
+        for report in hid_reports(partial):
+            os.write(self.inverter.master, report)
+
+        with mock.patch.object(self.monitor, "get_read_deadline_seconds", return_value=0.3):
+            data = self.monitor.read_command("QPIGS")
+
+        self.assertEqual(data["pv_input_power"], 528)
+
+
+if __name__ == "__main__":
+    unittest.main()
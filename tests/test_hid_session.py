@@ -0,0 +1,133 @@
+import errno
+import os
+import pty
+import sys
+import tty
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import HIDSession, MPPSolarMonitor  # noqa: E402
+
+
+QPIGS_PAYLOAD = (
+    b"(230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    b"54.00 000 00010000 00 00 00528 010)"
+)
+
+
+class FakeInverterPty:
+    """Raw pty pair; the slave path stands in for /dev/hidrawN."""
+
+    def __init__(self):
+        self.master, slave = pty.openpty()
+        tty.setraw(slave)
+        self.path = os.ttyname(slave)
+        self._slave = slave
+
+    def close(self):
+        os.close(self.master)
+        os.close(self._slave)
+
+
+class HIDSessionTests(unittest.TestCase):
+    def setUp(self):
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+
+    def test_session_keeps_fd_open_across_reads(self):
+        session = HIDSession(self.inverter.path)
+        self.addCleanup(session.close)
+
+        for _ in range(3):
+            session.write(b"QPIGS\r")
+            os.write(self.inverter.master, b"(ok)")
+            self.assertTrue(session.wait_readable(1.0))
+            self.assertEqual(session.read(), b"(ok)")
+
+        self.assertEqual(session.open_count, 1)
+        self.assertEqual(session.reopen_count, 0)
+
+    def test_read_reopens_after_eio(self):
+        session = HIDSession(self.inverter.path)
+        self.addCleanup(session.close)
+        session.open()
+        session.buffer = b"(stale"
+
+        with mock.patch(
+            "mpp_solar_monitor.os.read",
+            side_effect=OSError(errno.EIO, "Input/output error"),
+        ):
+            self.assertEqual(session.read(), b"")
+
+        self.assertTrue(session.is_open)
+        self.assertEqual(session.open_count, 2)
+        self.assertEqual(session.reopen_count, 1)
+        self.assertEqual(session.buffer, b"")
+
+    def test_write_reopens_after_enodev_and_retries(self):
+        session = HIDSession(self.inverter.path)
+        self.addCleanup(session.close)
+        session.open()
+        real_write = os.write
+        calls = []
+
+        def flaky_write(fd, data):
+            calls.append(fd)
+            if len(calls) == 1:
+                raise OSError(errno.ENODEV, "No such device")
+            return real_write(fd, data)
+
+        with mock.patch("mpp_solar_monitor.os.write", side_effect=flaky_write):
+            self.assertEqual(session.write(b"QPIGS\r"), 6)
+
+        self.assertEqual(session.reopen_count, 1)
+        self.assertEqual(os.read(self.inverter.master, 16), b"QPIGS\r")
+
+    def test_other_errors_are_not_swallowed(self):
+        session = HIDSession(self.inverter.path)
+        self.addCleanup(session.close)
+        session.open()
+
+        with mock.patch(
+            "mpp_solar_monitor.os.read",
+            side_effect=OSError(errno.EACCES, "Permission denied"),
+        ):
+            with self.assertRaises(OSError):
+                session.read()
+        self.assertEqual(session.reopen_count, 0)
+
+
+class MonitorSessionTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_read_inverter_data_reuses_session_between_cycles(self):
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+        crc = monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+
+        for _ in range(2):
+            os.write(self.inverter.master, QPIGS_PAYLOAD + crc + b"\r")
+            data = monitor.read_inverter_data()
+            self.assertIsNotNone(data)
+            self.assertEqual(data["pv_input_power"], 528)
+
+        self.assertEqual(monitor.session.open_count, 1)
+        self.assertTrue(monitor.session.is_open)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    HISTORY,
+    HistoryStore,
+    MPPSolarMonitor,
+    history_main,
+    parse_history_time,
+    start_metrics_server,
+)
+from test_publish_filter import SAMPLE  # noqa: E402
+
+T0 = 1_700_000_040.0  # a whole minute
+
+
+class HistoryStoreTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.dir = self._tmp.name
+
+    def store(self, raw_slots=100, fields=("pv_input_power", "battery_voltage")):
+        store = HistoryStore(self.dir, "history_a", raw_slots, fields)
+        store.open()
+        self.addCleanup(store.close)
+        return store
+
+    def test_raw_ring_keeps_newest_readings(self):
+        store = self.store(raw_slots=10)
+        for i in range(25):
+            store.add(T0 + i, {"pv_input_power": i, "battery_voltage": 52.1})
+
+        tier, rows = store.query(T0 + 15, T0 + 17, tier="raw")
+
+        self.assertEqual(tier, "raw")
+        self.assertEqual(rows, [
+            {"time": T0 + 15, "pv_input_power": 15, "battery_voltage": 52.1},
+            {"time": T0 + 16, "pv_input_power": 16, "battery_voltage": 52.1},
+            {"time": T0 + 17, "pv_input_power": 17, "battery_voltage": 52.1},
+        ])
+        self.assertEqual(store.query(T0, T0 + 30, tier="raw")[1][0]["time"], T0 + 15)
+
+    def test_minute_buckets_hold_mean_min_max_and_skip_missing_values(self):
+        store = self.store()
+        store.add(T0, {"pv_input_power": 100, "battery_voltage": "n/a"})
+        store.add(T0 + 30, {"pv_input_power": 300})
+        self.assertEqual(store.query(T0, T0 + 60, tier="1m")[1], [])
+
+        store.add(T0 + 60, {"pv_input_power": 0})
+        rows = store.query(T0 + 10, T0 + 20, tier="1m")[1]
+
+        self.assertEqual(rows, [{
+            "time": T0, "count": 2,
+            "pv_input_power": 200, "pv_input_power_min": 100, "pv_input_power_max": 300,
+            "battery_voltage": None, "battery_voltage_min": None, "battery_voltage_max": None,
+        }])
+
+    def test_query_falls_back_to_coarser_tier_and_regroups(self):
+        store = self.store(raw_slots=60)
+        hour = 1_699_999_200.0
+        for i in range(3 * 60):  # three hours, one reading a minute
+            store.add(hour + i * 60, {"pv_input_power": i % 60})
+
+        tier, rows = store.query(hour, hour + 3 * 3600, ["pv_input_power"], step=3600)
+
+        self.assertEqual(tier, "1m")
+        # The last minute is still open
+        self.assertEqual([row["pv_input_power_max"] for row in rows], [59, 59, 58])
+        self.assertEqual(rows[1]["count"], 60)
+        self.assertEqual(rows[1]["pv_input_power"], 29.5)
+        self.assertEqual(store.query(hour + 2.5 * 3600, hour + 3 * 3600)[0], "raw")
+
+    def test_history_survives_reopen_and_layout_changes_start_empty(self):
+        store = self.store()
+        store.add(T0, {"pv_input_power": 1})
+        store.close()
+
+        reopened = self.store()
+        self.assertEqual(len(reopened.query(T0, T0, tier="raw")[1]), 1)
+        reopened.close()
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            other = self.store(fields=("pv_input_power",))
+        self.assertEqual(other.query(T0, T0, tier="raw")[1], [])
+
+    def test_unknown_fields_and_tiers_are_rejected(self):
+        store = self.store()
+        with self.assertRaises(ValueError):
+            store.query(T0, T0 + 1, ["nope"])
+        with self.assertRaises(ValueError):
+            store.query(T0, T0 + 1, tier="5m")
+
+    def test_relative_and_iso_times(self):
+        self.assertEqual(parse_history_time("-6h", T0), T0 - 6 * 3600)
+        self.assertEqual(parse_history_time("now", T0), T0)
+        self.assertEqual(parse_history_time("2023-11-14T22:14:00+00:00", 0), T0)
+
+
+class HistoryQueryTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.store = HistoryStore(self._tmp.name, "history_a", 100)
+        self.store.open()
+        self.addCleanup(self.store.close)
+        for i in range(3):
+            self.store.add(T0 + i * 5, SAMPLE, {"pv_energy": 1.5})
+
+    def test_endpoint_serves_queries(self):
+        HISTORY["a"] = self.store
+        self.addCleanup(HISTORY.pop, "a")
+        server = start_metrics_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = f"http://127.0.0.1:{server.server_address[1]}/history?inverter=a&start={T0}&end={T0 + 5}"
+
+        with urllib.request.urlopen(url + "&fields=pv_input_power,pv_energy", timeout=5) as response:
+            result = json.load(response)
+        with self.assertRaises(urllib.error.HTTPError) as raised:
+            urllib.request.urlopen(url + "&fields=nope", timeout=5)
+
+        self.assertEqual(result["tier"], "raw")
+        self.assertEqual(result["rows"], [
+            {"time": T0, "pv_input_power": SAMPLE["pv_input_power"], "pv_energy": 1.5},
+            {"time": T0 + 5, "pv_input_power": SAMPLE["pv_input_power"], "pv_energy": 1.5},
+        ])
+        self.assertEqual(raised.exception.code, 400)
+
+    def test_cli_reads_the_files_as_csv(self):
+        self.store.close()
+        output = StringIO()
+        with redirect_stdout(output):
+            history_main([
+                "--data-dir", self._tmp.name, "--start", str(T0), "--end", str(T0 + 10), "battery_voltage",
+            ])
+
+        self.assertEqual(output.getvalue().splitlines(), [
+            "time,battery_voltage",
+            *[f"2023-11-14T22:14:{second:02d}+00:00,{SAMPLE['battery_voltage']}" for second in (0, 5, 10)],
+        ])
+
+
+class MonitorHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DATA_DIR"] = self._tmp.name
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_every_reading_is_stored(self):
+        os.environ["SAMPLE_INTERVAL"] = "1"
+        monitor = MPPSolarMonitor()
+        monitor.open_history()
+        self.addCleanup(monitor.history.close)
+        self.assertIs(HISTORY[monitor.node_id], monitor.history)
+        self.addCleanup(HISTORY.pop, monitor.node_id)
+
+        for second in range(3):
+            monitor.collect_sample(dict(SAMPLE), float(second))
+
+        rows = monitor.history.query(0, 2e9, ["pv_input_power", "pv_energy"], tier="raw")[1]
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0]["pv_input_power"], SAMPLE["pv_input_power"])
+        self.assertEqual(rows[0]["pv_energy"], 0.0)
+        # 24 hours at one reading per second
+        self.assertEqual(monitor.history.tiers["raw"][1].slots, 86400)
+
+    def test_disabled_with_zero_hours(self):
+        os.environ["HISTORY_HOURS"] = "0"
+        monitor = MPPSolarMonitor()
+        monitor.open_history()
+        self.assertIsNone(monitor.history)
+
+
+if __name__ == "__main__":
+    unittest.main()
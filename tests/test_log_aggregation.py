@@ -0,0 +1,91 @@
+import logging
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import METRICS, MPPSolarMonitor, WarningAggregator  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class WarningAggregatorTests(unittest.TestCase):
+    def setUp(self):
+        self.warnings = WarningAggregator(300)
+
+    def warn(self, value, now):
+        self.warnings.log("crc", logging.WARNING, "CRC mismatch: %d", value, now=now)
+
+    def test_repeats_are_summarised_once_per_interval(self):
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            for i in range(10):
+                self.warn(i, now=100.0 + i * 5)
+            self.warnings.flush(now=200.0)
+            self.warnings.flush(now=400.0)
+
+        self.assertEqual(len(logs.output), 2)
+        self.assertIn("CRC mismatch: 0", logs.output[0])
+        self.assertIn("CRC mismatch: 9 (9 more since the last report, first ", logs.output[1])
+        self.assertEqual(self.warnings.suppressed, 9)
+
+    def test_kind_is_news_again_after_a_quiet_interval(self):
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            self.warn(1, now=0.0)
+            self.warnings.flush(now=301.0)
+            self.warn(2, now=302.0)
+            self.warnings.log("other", logging.WARNING, "Other problem", now=303.0)
+
+        self.assertEqual([line.rsplit(":", 1)[-1] for line in logs.output], [" 1", " 2", "Other problem"])
+
+    def test_forced_flush_and_zero_interval(self):
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            self.warn(1, now=0.0)
+            self.warn(2, now=1.0)
+            self.warnings.flush(now=2.0, force=True)
+        self.assertEqual(len(logs.output), 2)
+
+        every = WarningAggregator(0)
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            for i in range(3):
+                every.log("crc", logging.WARNING, "CRC mismatch: %d", i, now=float(i))
+        self.assertEqual(len(logs.output), 3)
+
+
+class MonitorWarningTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+        os.environ["DATA_DIR"] = tempfile.mkdtemp()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_crc_mismatch_every_cycle_is_logged_once_and_counted(self):
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+        before = METRICS.value("mpp_solar_warnings_total", inverter=monitor.node_id, kind="crc_mismatch") or 0
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            for _ in range(3):
+                os.write(self.inverter.master, QPIGS_PAYLOAD + b"\x00\x00\r")
+                self.assertIsNotNone(monitor.read_inverter_data())
+            # Pending repeats are reported on shutdown
+            monitor.close()
+
+        crc_lines = [line for line in logs.output if "CRC mismatch" in line]
+        self.assertEqual(len(crc_lines), 2)
+        self.assertIn("(2 more since the last report", crc_lines[1])
+        after = METRICS.value("mpp_solar_warnings_total", inverter=monitor.node_id, kind="crc_mismatch")
+        self.assertEqual(after - before, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
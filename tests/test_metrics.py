@@ -0,0 +1,126 @@
+import os
+import socket
+import sys
+import unittest
+import urllib.request
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    METRIC_DEFINITIONS,
+    METRICS,
+    MetricsRegistry,
+    MPPSolarMonitor,
+    start_metrics_server,
+)
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class MetricsRegistryTests(unittest.TestCase):
+    def test_histogram_buckets_are_cumulative(self):
+        registry = MetricsRegistry(METRIC_DEFINITIONS)
+        for value in (0.003, 0.02, 0.02, 7.0):
+            registry.observe("mpp_solar_frame_seconds", value, inverter="a", command="QPIGS")
+
+        text = registry.render()
+
+        self.assertIn("# TYPE mpp_solar_frame_seconds histogram", text)
+        self.assertIn('mpp_solar_frame_seconds_bucket{command="QPIGS",inverter="a",le="0.005"} 1', text)
+        self.assertIn('mpp_solar_frame_seconds_bucket{command="QPIGS",inverter="a",le="0.025"} 3', text)
+        self.assertIn('mpp_solar_frame_seconds_bucket{command="QPIGS",inverter="a",le="5"} 3', text)
+        self.assertIn('mpp_solar_frame_seconds_bucket{command="QPIGS",inverter="a",le="+Inf"} 4', text)
+        self.assertIn('mpp_solar_frame_seconds_count{command="QPIGS",inverter="a"} 4', text)
+        self.assertIn('mpp_solar_frame_seconds_sum{command="QPIGS",inverter="a"} 7.043000', text)
+
+    def test_counters_and_unused_metrics(self):
+        registry = MetricsRegistry(METRIC_DEFINITIONS)
+        registry.inc("mpp_solar_crc_mismatches_total", inverter="a")
+        registry.inc("mpp_solar_crc_mismatches_total", inverter="a")
+        registry.set_total("mpp_solar_device_reopens_total", 3, inverter="a")
+        registry.inc("mpp_solar_mqtt_disconnects_total")
+
+        text = registry.render()
+
+        self.assertIn('mpp_solar_crc_mismatches_total{inverter="a"} 2', text)
+        self.assertIn('mpp_solar_device_reopens_total{inverter="a"} 3', text)
+        self.assertIn("mpp_solar_mqtt_disconnects_total 1", text)
+        # Metrics without samples are left out entirely
+        self.assertNotIn("mpp_solar_parse_seconds", text)
+
+    def test_endpoint_serves_registry(self):
+        METRICS.inc("mpp_solar_mqtt_disconnects_total", 0)
+        server = start_metrics_server(0)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        port = server.server_address[1]
+
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5) as response:
+            self.assertTrue(response.headers["Content-Type"].startswith("text/plain; version=0.0.4"))
+            self.assertIn("mpp_solar_mqtt_disconnects_total", response.read().decode())
+
+
+    def test_port_in_use_logs_and_continues_without_endpoint(self):
+        taken = socket.socket()
+        self.addCleanup(taken.close)
+        taken.bind(("", 0))
+        taken.listen()
+
+        with self.assertLogs("mpp_solar_monitor", "ERROR") as logs:
+            server = start_metrics_server(taken.getsockname()[1])
+
+        self.assertIsNone(server)
+        self.assertIn(f"port {taken.getsockname()[1]}", logs.output[0])
+
+
+class MonitorMetricsTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+        self.monitor = MPPSolarMonitor()
+        self.monitor.get_read_deadline_seconds = lambda: 0.2
+        self.addCleanup(self.monitor.session.close)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def count(self, name, **labels):
+        state = METRICS.value(name, inverter=self.monitor.node_id, **labels)
+        if state is None:
+            return 0
+        return state[-1] if isinstance(state, list) else state
+
+    def test_read_records_stage_latencies(self):
+        before = {
+            name: self.count(name, command="QPIGS")
+            for name in ("mpp_solar_first_byte_seconds", "mpp_solar_frame_seconds",
+                         "mpp_solar_crc_seconds", "mpp_solar_parse_seconds")
+        }
+        crc = self.monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+        os.write(self.inverter.master, QPIGS_PAYLOAD + crc + b"\r")
+
+        self.assertIsNotNone(self.monitor.read_command("QPIGS"))
+
+        for name, count in before.items():
+            self.assertEqual(self.count(name, command="QPIGS"), count + 1, name)
+
+    def test_crc_mismatch_and_timeout_are_counted(self):
+        mismatches = self.count("mpp_solar_crc_mismatches_total")
+        timeouts = self.count("mpp_solar_timeouts_total", command="QPIGS")
+
+        os.write(self.inverter.master, QPIGS_PAYLOAD + b"\x00\x00\r")
+        self.monitor.read_command("QPIGS")
+        self.assertIsNone(self.monitor.read_command("QPIGS"))
+
+        self.assertEqual(self.count("mpp_solar_crc_mismatches_total"), mismatches + 1)
+        self.assertEqual(self.count("mpp_solar_timeouts_total", command="QPIGS"), timeouts + 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -38,6 +38,15 @@ class MonitorTimingTests(unittest.TestCase):
 
         self.assertLessEqual(monitor.get_read_deadline_seconds(), 2.0)
 
+    def test_read_deadline_and_poll_budget_follow_the_sample_interval(self):
+        os.environ["INTERVAL"] = "10"
+        os.environ["SAMPLE_INTERVAL"] = "1"
+        monitor = MPPSolarMonitor()
+
+        self.assertEqual(monitor.get_read_deadline_seconds(), 1.2)
+        self.assertEqual(monitor.get_poll_budget_seconds(), 1.2)
+        self.assertEqual(monitor.scheduler.budget, 1.2)
+
     def test_response_is_incomplete_without_closing_frame_and_crc(self):
         monitor = MPPSolarMonitor()
 
@@ -0,0 +1,156 @@
+import asyncio
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import METRICS, Backoff, MPPSolarMonitor  # noqa: E402
+from test_publish_filter import SAMPLE  # noqa: E402
+from test_transports import blackholed_port  # noqa: E402
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class FakeBroker:
+    """Accepts MQTT connections and answers CONNECT with a CONNACK."""
+
+    def __init__(self, port):
+        self.server = socket.create_server(("127.0.0.1", port))
+        self.connections = 0
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._session, args=(conn,), daemon=True).start()
+
+    def _session(self, conn):
+        with conn:
+            if conn.recv(1024):
+                conn.sendall(b"\x20\x02\x00\x00")
+            while conn.recv(1024):
+                pass
+
+    def close(self):
+        self.server.close()
+
+
+class BackoffTests(unittest.TestCase):
+    def test_delays_grow_with_jitter_up_to_the_cap(self):
+        backoff = Backoff(1.0, 8.0)
+
+        delays = [backoff.next() for _ in range(6)]
+
+        for delay, window in zip(delays, (1, 2, 4, 8, 8, 8)):
+            self.assertGreaterEqual(delay, window / 2)
+            self.assertLessEqual(delay, window)
+        backoff.reset()
+        self.assertLessEqual(backoff.next(), 1.0)
+
+
+class MQTTStartupTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        os.environ["MQTT_HOST"] = "127.0.0.1"
+        os.environ["MQTT_PORT"] = str(free_port())
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_setup_returns_at_once_and_connects_when_the_broker_starts(self):
+        monitor = MPPSolarMonitor("/dev/null")
+        failures = METRICS.value("mpp_solar_mqtt_connect_failures_total") or 0
+
+        started = time.monotonic()
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            self.assertTrue(monitor.setup_mqtt())
+            self.addCleanup(monitor.stop_mqtt)
+            monitor.mqtt_loop.backoff = Backoff(0.05, 0.2)
+            self.assertLess(time.monotonic() - started, 0.5)
+            time.sleep(0.3)
+
+        broker = FakeBroker(monitor.mqtt_port)
+        self.addCleanup(broker.close)
+        deadline = time.monotonic() + 5
+        while not monitor.mqtt_client.is_connected() and time.monotonic() < deadline:
+            time.sleep(0.02)
+
+        self.assertTrue(monitor.mqtt_client.is_connected())
+        self.assertGreater(METRICS.value("mpp_solar_mqtt_connect_failures_total"), failures)
+
+        monitor.stop_mqtt()
+        self.assertFalse(monitor.mqtt_loop._thread.is_alive())
+
+    def run_bridge(self, seconds, connect_timeout=0.5):
+        """Run the asyncio MQTT bridge for a while; return the ticker's gaps."""
+        monitor = MPPSolarMonitor("/dev/null")
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            task = await monitor.start_mqtt_async()
+            monitor.mqtt_client.connect_timeout = connect_timeout
+            gaps = []
+            last = loop.time()
+            while sum(gaps) < seconds:
+                await asyncio.sleep(0.05)
+                gaps.append(loop.time() - last)
+                last = loop.time()
+            connected = monitor.mqtt_bridge.connected.is_set()
+            task.cancel()
+            return connected, gaps
+
+        return asyncio.run(scenario())
+
+    def test_asyncio_connect_to_blackholed_broker_keeps_the_loop_running(self):
+        with blackholed_port() as port:
+            os.environ["MQTT_PORT"] = str(port)
+            with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+                connected, gaps = self.run_bridge(1.0)
+
+        self.assertFalse(connected)
+        self.assertTrue(any("MQTT connection failed" in line for line in logs.output))
+        self.assertLess(max(gaps), 0.25)
+
+    def test_asyncio_bridge_connects_from_the_executor(self):
+        broker = FakeBroker(int(os.environ["MQTT_PORT"]))
+        self.addCleanup(broker.close)
+
+        connected, _ = self.run_bridge(0.5)
+
+        self.assertTrue(connected)
+        self.assertEqual(broker.connections, 1)
+
+    def test_time_to_first_publish_is_recorded_once(self):
+        monitor = MPPSolarMonitor("/dev/null")
+        monitor.started_at -= 3.0
+
+        with self.assertLogs("mpp_solar_monitor", "INFO") as logs:
+            monitor._log_published(dict(SAMPLE))
+            monitor._log_published(dict(SAMPLE))
+
+        recorded = METRICS.value("mpp_solar_time_to_first_publish_seconds", inverter=monitor.node_id)
+        self.assertGreaterEqual(recorded, 3.0)
+        self.assertLess(recorded, 4.0)
+        self.assertEqual(sum("First sample published" in line for line in logs.output), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,174 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from pathlib import Path
+from unittest import mock
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient, Message  # noqa: E402
+from mpp_solar_monitor import InverterFleet, MPPSolarMonitor, parse_device_list  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class FleetIdentityTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["MQTT_TOPIC"] = "mpp_solar"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_parse_device_list(self):
+        self.assertEqual(
+            parse_device_list("/dev/hidraw0, /dev/hidraw1,"), ["/dev/hidraw0", "/dev/hidraw1"]
+        )
+        self.assertEqual(parse_device_list(""), ["/dev/hidraw0"])
+
+    def test_single_device_option_uses_first_entry(self):
+        os.environ["DEVICE"] = "/dev/hidraw2,/dev/hidraw3"
+
+        self.assertEqual(MPPSolarMonitor().device, "/dev/hidraw2")
+
+    def test_first_inverter_keeps_historic_identity(self):
+        monitor = MPPSolarMonitor("/dev/hidraw0", 0)
+        monitor.mqtt_client = FakeMQTTClient()
+        monitor.publish_discovery()
+
+        config = json.loads(
+            monitor.mqtt_client.messages["homeassistant/sensor/mpp_solar/pv_input_power/config"]
+        )
+        self.assertEqual(config["unique_id"], "mpp_solar_pv_input_power")
+        self.assertEqual(config["state_topic"], "mpp_solar/state")
+        self.assertEqual(config["availability_topic"], "mpp_solar/availability")
+        self.assertEqual(config["device"]["identifiers"], ["mpp_solar_pip5048mg"])
+
+    def test_additional_inverter_gets_own_topic_and_device(self):
+        monitor = MPPSolarMonitor("/dev/hidraw1", 1)
+        monitor.mqtt_client = FakeMQTTClient()
+        monitor.publish_discovery()
+
+        config = json.loads(
+            monitor.mqtt_client.messages["homeassistant/sensor/mpp_solar_2/pv_input_power/config"]
+        )
+        self.assertEqual(monitor.mqtt_topic, "mpp_solar_2")
+        self.assertEqual(config["unique_id"], "mpp_solar_2_pv_input_power")
+        self.assertEqual(config["state_topic"], "mpp_solar_2/state")
+        self.assertEqual(config["device"]["identifiers"], ["mpp_solar_2_pip5048mg"])
+        self.assertEqual(config["device"]["name"], "MPP Solar PIP5048MG 2")
+        self.assertEqual(
+            [item["topic"] for item in config["availability"]],
+            ["mpp_solar/availability", "mpp_solar_2/availability"],
+        )
+
+
+class FleetAvailabilityTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["MQTT_TOPIC"] = "mpp_solar"
+        self.fleet = InverterFleet(["/dev/hidraw0", "/dev/hidraw1"])
+        self.client = FakeMQTTClient()
+        for monitor in self.fleet.monitors:
+            monitor.mqtt_client = self.client
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_unit_keeps_waiting_for_its_device(self):
+        monitor = self.fleet.monitors[1]
+        # Two full waits time out before the device shows up
+        answers = iter([False] * 60 + [True])
+        with mock.patch.object(monitor, "_watch_device"), \
+                mock.patch.object(monitor, "_device_accessible", side_effect=lambda: next(answers)), \
+                mock.patch.object(monitor, "monitor_loop") as monitor_loop, \
+                mock.patch("mpp_solar_monitor.time.sleep"):
+            monitor.device_loop()
+
+        monitor_loop.assert_called_once_with()
+        self.assertEqual(
+            [message.payload for message in self.client.published if message.topic == "mpp_solar_2/availability"],
+            ["online"],
+        )
+        self.assertTrue(monitor.device_available)
+
+    def test_unit_without_device_is_offline_after_connect(self):
+        primary, second = self.fleet.monitors
+        primary.device_available = True
+        client = primary._create_mqtt_client(self.fleet.monitors)
+        client.publish = self.client.publish
+        with mock.patch.object(primary, "start_discovery_sync"), \
+                mock.patch.object(second, "start_discovery_sync"):
+            client.on_connect(client, None, {}, 0)
+
+        self.assertEqual(self.client.messages["mpp_solar/availability"], "online")
+        self.assertEqual(self.client.messages["mpp_solar/device/availability"], "online")
+        self.assertEqual(self.client.messages["mpp_solar_2/availability"], "offline")
+
+    def test_lost_device_marks_only_its_unit_offline(self):
+        primary, second = self.fleet.monitors
+        primary.device_available = True
+        primary._handle_read_error(FileNotFoundError())
+
+        self.assertEqual(self.client.published, [Message("mpp_solar/device/availability", "offline", 1, True)])
+
+    def test_first_unit_discovery_requires_its_device(self):
+        primary = self.fleet.primary
+        primary.publish_discovery()
+
+        config = json.loads(
+            self.client.messages["homeassistant/sensor/mpp_solar/pv_input_power/config"]
+        )
+        self.assertEqual(config["unique_id"], "mpp_solar_pv_input_power")
+        self.assertEqual(
+            [item["topic"] for item in config["availability"]],
+            ["mpp_solar/availability", "mpp_solar/device/availability"],
+        )
+
+
+class ConcurrentPollingTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        self.fast = FakeInverterPty()
+        self.silent = FakeInverterPty()
+        self.addCleanup(self.fast.close)
+        self.addCleanup(self.silent.close)
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_silent_inverter_does_not_delay_responsive_one(self):
+        fast = MPPSolarMonitor(self.fast.path, 0)
+        silent = MPPSolarMonitor(self.silent.path, 1)
+        self.addCleanup(fast.session.close)
+        self.addCleanup(silent.session.close)
+        crc = fast.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+
+        async def timed(monitor):
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            data = await monitor.read_inverter_data_async()
+            return data, loop.time() - started
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.05, os.write, self.fast.master, QPIGS_PAYLOAD + crc + b"\r")
+            return await asyncio.gather(timed(fast), timed(silent))
+
+        (fast_data, fast_elapsed), (silent_data, silent_elapsed) = asyncio.run(scenario())
+
+        self.assertIsNotNone(fast_data)
+        self.assertIsNone(silent_data)
+        self.assertLess(fast_elapsed, 0.5)
+        self.assertGreaterEqual(silent_elapsed, silent.get_read_deadline_seconds() - 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
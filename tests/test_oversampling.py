@@ -0,0 +1,168 @@
+import json
+import os
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import EnergyIntegrator, MPPSolarMonitor, SampleAggregator  # noqa: E402
+from test_publish_filter import SAMPLE  # noqa: E402
+
+
+class SampleAggregatorTests(unittest.TestCase):
+    def test_rollup_publishes_mean_min_max_and_latest_other_fields(self):
+        aggregator = SampleAggregator(["pv_input_power", "battery_voltage"])
+        aggregator.add(dict(SAMPLE, pv_input_power=100, battery_voltage=52.0, load_on=True))
+        aggregator.add(dict(SAMPLE, pv_input_power=300, battery_voltage=52.3, load_on=False))
+
+        result = aggregator.rollup()
+
+        self.assertEqual(result["pv_input_power"], 200)
+        self.assertEqual(result["pv_input_power_min"], 100)
+        self.assertEqual(result["pv_input_power_max"], 300)
+        self.assertEqual(result["battery_voltage"], 52.15)
+        self.assertFalse(result["load_on"])
+        self.assertNotIn("battery_capacity_min", result)
+
+    def test_mean_of_integer_fields_stays_an_integer(self):
+        aggregator = SampleAggregator(["pv_input_power", "battery_voltage"])
+        aggregator.add(dict(SAMPLE, pv_input_power=100, battery_voltage=52))
+        aggregator.add(dict(SAMPLE, pv_input_power=101, battery_voltage=52.5))
+
+        result = aggregator.rollup()
+
+        self.assertIs(type(result["pv_input_power"]), int)
+        self.assertEqual(result["pv_input_power"], 100)
+        self.assertEqual(result["battery_voltage"], 52.25)
+
+    def test_rollup_starts_a_new_interval(self):
+        aggregator = SampleAggregator(["pv_input_power"])
+        aggregator.add(dict(SAMPLE, pv_input_power=100))
+        aggregator.rollup()
+        self.assertIsNone(aggregator.rollup())
+
+        aggregator.add(dict(SAMPLE, pv_input_power=50))
+        self.assertEqual(aggregator.rollup()["pv_input_power_max"], 50)
+
+
+class EnergyIntegratorTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        self.path = os.path.join(self._tmp.name, "energy.json")
+
+    def test_trapezoidal_integration_splits_battery_direction(self):
+        energy = EnergyIntegrator(None)
+        energy.add({"pv_input_power": 1000, "ac_output_power": 500, "battery_power": 600.0}, 0.0)
+        energy.add({"pv_input_power": 3000, "ac_output_power": 500, "battery_power": -600.0}, 36.0)
+
+        totals = energy.values()
+        self.assertEqual(totals["pv_energy"], 0.02)
+        self.assertEqual(totals["load_energy"], 0.005)
+        self.assertEqual(totals["battery_charge_energy"], 0.003)
+        self.assertEqual(totals["battery_discharge_energy"], 0.003)
+
+    def test_long_gaps_are_not_integrated(self):
+        energy = EnergyIntegrator(None, max_gap=60.0)
+        energy.add({"pv_input_power": 1000}, 0.0)
+        energy.add({"pv_input_power": 1000}, 3600.0)
+        self.assertEqual(energy.values()["pv_energy"], 0.0)
+
+    def test_counters_survive_restart(self):
+        energy = EnergyIntegrator(self.path)
+        energy.add({"pv_input_power": 1000}, 0.0)
+        energy.add({"pv_input_power": 1000}, 36.0)
+        energy.save()
+
+        restored = EnergyIntegrator(self.path)
+        restored.load()
+        self.assertEqual(restored.values()["pv_energy"], 0.01)
+
+    def test_save_without_samples_keeps_stored_counters(self):
+        with open(self.path, "w") as f:
+            json.dump({"pv_energy": 12.5}, f)
+        EnergyIntegrator(self.path).save()
+        with open(self.path) as f:
+            self.assertEqual(json.load(f), {"pv_energy": 12.5})
+
+    def test_unreadable_file_starts_from_zero(self):
+        with open(self.path, "w") as f:
+            f.write("not json")
+        energy = EnergyIntegrator(self.path)
+        energy.load()
+        self.assertEqual(energy.values()["pv_energy"], 0.0)
+
+
+class CollectSampleTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        os.environ["DATA_DIR"] = self._tmp.name
+        os.environ["INTERVAL"] = "5"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_without_oversampling_every_sample_is_published_with_counters(self):
+        monitor = MPPSolarMonitor()
+        self.assertEqual(monitor.sample_interval, 5)
+
+        sample = monitor.collect_sample(dict(SAMPLE), 0.0)
+
+        self.assertEqual(sample["pv_energy"], 0.0)
+        self.assertNotIn("pv_input_power_min", sample)
+
+    def test_oversampling_publishes_one_rollup_per_interval(self):
+        os.environ["SAMPLE_INTERVAL"] = "1"
+        monitor = MPPSolarMonitor()
+        self.assertEqual(monitor.compute_cycle_sleep(0.0, 0.25), 0.75)
+
+        published = []
+        for second in range(11):
+            sample = monitor.collect_sample(dict(SAMPLE, ac_output_power=100 * second), float(second))
+            if sample:
+                published.append(sample)
+
+        self.assertEqual(len(published), 2)
+        self.assertEqual(published[0]["ac_output_power"], 200)
+        self.assertEqual(published[0]["ac_output_power_min"], 0)
+        self.assertEqual(published[0]["ac_output_power_max"], 400)
+        self.assertEqual(published[1]["ac_output_power"], 700)
+        self.assertGreater(published[1]["load_energy"], 0)
+
+    def test_min_max_are_discovered_and_published_per_sensor_only_when_oversampling(self):
+        topic = "homeassistant/sensor/mpp_solar/ac_output_power_max/config"
+        self.assertNotIn(topic, MPPSolarMonitor().discovery_messages())
+
+        os.environ.update(SAMPLE_INTERVAL="1", STATE_TOPICS="per_sensor")
+        monitor = MPPSolarMonitor()
+        config = json.loads(monitor.discovery_messages()[topic])
+        self.assertEqual(config["state_topic"], "mpp_solar/ac_output_power_max")
+        self.assertEqual(config["name"], "AC Output Power Max")
+        self.assertEqual(config["unit_of_measurement"], "W")
+
+        samples = [
+            monitor.collect_sample(dict(SAMPLE, ac_output_power=100 * second), float(second))
+            for second in range(5)
+        ]
+        _, messages = monitor._sensor_messages(samples[-1], 0.0)
+        self.assertIn(("ac_output_power_max", "mpp_solar/ac_output_power_max", "400"), messages)
+
+    def test_energy_counters_are_discovered_as_total_increasing(self):
+        monitor = MPPSolarMonitor()
+        config = json.loads(
+            monitor.discovery_messages()["homeassistant/sensor/mpp_solar/pv_energy/config"]
+        )
+        self.assertEqual(config["state_class"], "total_increasing")
+        self.assertEqual(config["device_class"], "energy")
+        self.assertEqual(config["unit_of_measurement"], "kWh")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,132 @@
+import asyncio
+import json
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient, Message  # noqa: E402
+from mpp_solar_monitor import METRICS, MPPSolarMonitor  # noqa: E402
+from test_publish_filter import SAMPLE  # noqa: E402
+
+
+class FakeBridge(FakeMQTTClient):
+    """AsyncioMQTTBridge stand-in: publish() is awaited and returns success."""
+
+    async def publish(self, topic, payload, qos=0, retain=False):
+        return FakeMQTTClient.publish(self, topic, payload, qos, retain).rc == 0
+
+
+class PerSensorTopicTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["STATE_TOPICS"] = "per_sensor"
+        os.environ["COMMANDS"] = "QPIGS"
+        self.monitor = MPPSolarMonitor()
+        self.monitor.mqtt_client = FakeMQTTClient()
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def sample(self, **changes):
+        data = dict(SAMPLE, battery_power=0.0, pv_input_voltage=0.0, ac_output_voltage=230.0,
+                    ac_output_load=8, scc_charging=False, ac_charging=False)
+        data.update(changes)
+        return data
+
+    def test_discovery_points_each_entity_at_its_own_topic(self):
+        self.monitor.publish_discovery()
+        configs = {topic: json.loads(payload) for topic, payload in self.monitor.mqtt_client.messages.items()}
+
+        sensor = configs["homeassistant/sensor/mpp_solar/battery_voltage/config"]
+        binary = configs["homeassistant/binary_sensor/mpp_solar/load_on/config"]
+        self.assertEqual(sensor["state_topic"], "mpp_solar/battery_voltage")
+        self.assertNotIn("value_template", sensor)
+        self.assertEqual(binary["state_topic"], "mpp_solar/load_on")
+        self.assertNotIn("value_template", binary)
+
+    def test_first_sample_publishes_every_entity_retained(self):
+        self.monitor.publish_data(self.sample())
+        published = {message.topic: (message.payload, message.retain) for message in self.monitor.mqtt_client.published}
+
+        self.assertEqual(published["mpp_solar/battery_voltage"], ("52.0", True))
+        self.assertEqual(published["mpp_solar/load_on"], ("ON", True))
+        self.assertNotIn("mpp_solar/state", published)
+        self.assertNotIn("mpp_solar/device_status", published)
+
+    def test_only_changed_entities_are_published(self):
+        self.monitor.publish_data(self.sample())
+        first_count = len(self.monitor.mqtt_client.published)
+        self.monitor.mqtt_client.published.clear()
+
+        self.monitor.publish_data(self.sample(ac_output_power=450, load_on=False))
+
+        self.assertEqual(
+            sorted(self.monitor.mqtt_client.published),
+            [Message("mpp_solar/ac_output_power", "450", 0, True), Message("mpp_solar/load_on", "OFF", 0, True)],
+        )
+        self.assertEqual(self.monitor.publish_filter.sent, first_count + 2)
+        self.assertEqual(self.monitor.publish_filter.suppressed, first_count - 2)
+
+    def test_full_warning_list_is_an_attribute_in_both_state_modes(self):
+        self.monitor.scheduler.intervals["QPIWS"] = 30
+        warnings = self.monitor.parse_qpiws(["0" + "1" * 31])
+        self.monitor.publish_discovery()
+        self.monitor.publish_data(self.sample(**warnings))
+        published = self.monitor.mqtt_client.messages
+
+        config = json.loads(published["homeassistant/sensor/mpp_solar/warnings/config"])
+        self.assertEqual(config["json_attributes_topic"], "mpp_solar/warning_list")
+        self.assertEqual(published["mpp_solar/warnings"], warnings["warnings"])
+        self.assertEqual(json.loads(published["mpp_solar/warning_list"]), {"warning_list": warnings["warning_list"]})
+
+        os.environ["STATE_TOPICS"] = "json"
+        monitor = MPPSolarMonitor()
+        monitor.scheduler.intervals["QPIWS"] = 30
+        config = json.loads(monitor.discovery_messages()["homeassistant/sensor/mpp_solar/warnings/config"])
+        self.assertEqual(config["json_attributes_topic"], "mpp_solar/state")
+        self.assertEqual(
+            config["json_attributes_template"], "{{ {'warning_list': value_json.warning_list} | tojson }}"
+        )
+
+    def test_failed_topics_are_counted_as_failed_and_retried(self):
+        self.monitor.mqtt_client = FakeMQTTClient(failing={"mpp_solar/battery_voltage"})
+        self.monitor.publish_data(self.sample())
+        total = len(self.monitor.mqtt_client.published) + 1
+
+        self.assertEqual(self.monitor.publish_filter.sent, total - 1)
+        self.assertEqual(self.monitor.publish_filter.failed, 1)
+        self.assertEqual(self.monitor.publish_filter.suppressed, 0)
+        self.assertEqual(METRICS.value("mpp_solar_publish_failed_total", inverter="mpp_solar"), 1)
+
+        self.monitor.mqtt_client = FakeMQTTClient()
+        self.monitor.publish_data(self.sample())
+
+        self.assertEqual(self.monitor.mqtt_client.published, [Message("mpp_solar/battery_voltage", "52.0", 0, True)])
+        self.assertEqual(self.monitor.publish_filter.suppressed, total - 1)
+
+    def test_async_failed_topics_are_counted_as_failed_and_retried(self):
+        self.monitor.mqtt_client = None
+        self.monitor.mqtt_bridge = FakeBridge(failing={"mpp_solar/battery_voltage"})
+        asyncio.run(self.monitor.publish_data_async(self.sample()))
+        total = len(self.monitor.mqtt_bridge.published) + 1
+
+        self.assertEqual(self.monitor.publish_filter.failed, 1)
+        self.assertEqual(self.monitor.publish_filter.suppressed, 0)
+
+        self.monitor.mqtt_bridge.failing.clear()
+        self.monitor.mqtt_bridge.published.clear()
+        asyncio.run(self.monitor.publish_data_async(self.sample()))
+
+        self.assertEqual(self.monitor.mqtt_bridge.published, [Message("mpp_solar/battery_voltage", "52.0", 0, True)])
+        self.assertEqual(self.monitor.publish_filter.sent, total)
+        self.assertEqual(self.monitor.publish_filter.suppressed, total - 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
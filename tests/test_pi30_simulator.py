@@ -0,0 +1,75 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+from mpp_solar_monitor import MPPSolarMonitor  # noqa: E402
+from pi30_simulator import Impairments, PI30Simulator  # noqa: E402
+
+
+class SimulatedInverterTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        os.environ["COMMANDS"] = "QPIGS,QPIGS2"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def monitor_for(self, impairments, deadline=0.5, **env):
+        simulator = PI30Simulator(impairments)
+        simulator.start()
+        self.addCleanup(simulator.stop)
+        os.environ["DEVICE"] = simulator.path
+        os.environ.update(env)
+        monitor = MPPSolarMonitor()
+        monitor.get_read_deadline_seconds = lambda: deadline
+        self.addCleanup(monitor.session.close)
+        return simulator, monitor
+
+    def test_fragmented_slow_reports_are_assembled(self):
+        simulator, monitor = self.monitor_for(Impairments(latency=0.01, report_gap=0.005))
+
+        data = monitor.read_command("QPIGS")
+
+        self.assertEqual(data["pv_input_power"], 528)
+        self.assertEqual(simulator.stats["commands"], 1)
+
+    def test_late_crc_past_deadline_uses_partial_frame(self):
+        _, monitor = self.monitor_for(Impairments(crc_delay=0.5), deadline=0.2)
+
+        with self.assertLogs("mpp_solar_monitor", "INFO") as logs:
+            data = monitor.read_command("QPIGS")
+
+        self.assertEqual(data["pv_input_power"], 528)
+        self.assertTrue(any("Using partial QPIGS response" in line for line in logs.output))
+
+    def test_corruption_is_rejected_in_strict_mode(self):
+        simulator, monitor = self.monitor_for(Impairments(corrupt_rate=1.0), CRC_STRICT="true")
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            self.assertIsNone(monitor.read_command("QPIGS"))
+
+        self.assertEqual(simulator.stats["corrupted"], 1)
+        self.assertTrue(any("CRC mismatch" in line for line in logs.output))
+
+    def test_silent_inverter_misses_the_deadline(self):
+        _, monitor = self.monitor_for(Impairments(silent_rate=1.0), deadline=0.2)
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            self.assertIsNone(monitor.read_command("QPIGS"))
+
+    def test_unsupported_command_is_answered_with_nak(self):
+        _, monitor = self.monitor_for(Impairments())
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            self.assertIsNone(monitor.read_command("QPIGS2"))
+        self.assertNotIn("QPIGS2", monitor.scheduler.intervals)
+
+
+if __name__ == "__main__":
+    unittest.main()
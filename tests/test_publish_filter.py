@@ -0,0 +1,120 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient  # noqa: E402
+from mpp_solar_monitor import METRICS, MPPSolarMonitor, PublishFilter, parse_deadbands  # noqa: E402
+
+
+SAMPLE = {
+    "pv_input_power": 0,
+    "battery_voltage": 52.0,
+    "battery_capacity": 80,
+    "ac_output_power": 400,
+    "inverter_temperature": 30,
+    "device_status": "00010000",
+    "load_on": True,
+}
+
+
+class DeadbandParsingTests(unittest.TestCase):
+    def test_absolute_and_percent_bands(self):
+        self.assertEqual(
+            parse_deadbands("pv_input_power:10, battery_voltage:0.1,ac_output_power:5%"),
+            {
+                "pv_input_power": (10.0, False),
+                "battery_voltage": (0.1, False),
+                "ac_output_power": (5.0, True),
+            },
+        )
+
+    def test_invalid_entries_are_skipped(self):
+        self.assertEqual(parse_deadbands("pv_input_power:abc,,battery_capacity:1"), {"battery_capacity": (1.0, False)})
+
+
+class PublishFilterTests(unittest.TestCase):
+    def setUp(self):
+        self.filter = PublishFilter(
+            {"battery_voltage": (0.1, False), "ac_output_power": (5.0, True)}, heartbeat=300
+        )
+        self.filter.mark_sent(SAMPLE, 0.0)
+
+    def test_identical_sample_is_suppressed(self):
+        self.assertFalse(self.filter.should_publish(dict(SAMPLE, timestamp="later"), 5.0))
+        self.assertEqual(self.filter.suppressed, 1)
+
+    def test_change_within_deadband_is_suppressed(self):
+        self.assertFalse(self.filter.should_publish(dict(SAMPLE, battery_voltage=52.05), 5.0))
+        self.assertFalse(self.filter.should_publish(dict(SAMPLE, ac_output_power=415), 5.0))
+
+    def test_change_past_deadband_is_sent(self):
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, battery_voltage=52.2), 5.0))
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, ac_output_power=430), 5.0))
+
+    def test_slow_drift_is_measured_against_last_sent_value(self):
+        self.assertFalse(self.filter.should_publish(dict(SAMPLE, battery_voltage=52.06), 5.0))
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, battery_voltage=52.12), 10.0))
+
+    def test_fields_without_deadband_publish_on_any_change(self):
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, battery_capacity=81), 5.0))
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, load_on=False), 5.0))
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE, device_status="00010001"), 5.0))
+
+    def test_heartbeat_forces_publish(self):
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE), 300.0))
+
+    def test_reset_forces_publish(self):
+        self.filter.reset()
+        self.assertTrue(self.filter.should_publish(dict(SAMPLE), 5.0))
+
+    def test_without_heartbeat_or_deadbands_every_sample_is_sent(self):
+        publish_filter = PublishFilter({}, heartbeat=0)
+        publish_filter.mark_sent(SAMPLE, 0.0)
+        self.assertTrue(publish_filter.should_publish(dict(SAMPLE), 1.0))
+
+    def test_zero_heartbeat_keeps_deadbands_and_never_forces_a_resend(self):
+        publish_filter = PublishFilter({"battery_voltage": (0.1, False)}, heartbeat=0)
+        publish_filter.mark_sent(SAMPLE, 0.0)
+
+        self.assertFalse(publish_filter.should_publish(dict(SAMPLE, battery_voltage=52.05), 1.0))
+        self.assertFalse(publish_filter.should_publish(dict(SAMPLE), 1e6))
+        self.assertTrue(publish_filter.should_publish(dict(SAMPLE, battery_voltage=52.2), 1e6))
+        # Per-sensor topics: same meaning, field by field
+        self.assertEqual(publish_filter.changed_fields(dict(SAMPLE, battery_voltage=52.05), 1e6), [])
+        self.assertEqual(
+            publish_filter.changed_fields(dict(SAMPLE, battery_voltage=52.2), 1e6), ["battery_voltage"]
+        )
+
+
+class PublishDataFilterTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["PUBLISH_HEARTBEAT"] = "60"
+        os.environ["DEADBANDS"] = "battery_voltage:0.2"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_unchanged_samples_are_not_published(self):
+        monitor = MPPSolarMonitor()
+        monitor.mqtt_client = FakeMQTTClient()
+
+        monitor.publish_data(dict(SAMPLE))
+        monitor.publish_data(dict(SAMPLE, battery_voltage=52.1))
+        monitor.publish_data(dict(SAMPLE, battery_voltage=52.3))
+
+        self.assertEqual(len(monitor.mqtt_client.published), 2)
+        self.assertEqual(monitor.publish_filter.sent, 2)
+        self.assertEqual(monitor.publish_filter.suppressed, 1)
+        self.assertEqual(METRICS.value("mpp_solar_publish_sent_total", inverter=monitor.node_id), 2)
+        self.assertEqual(METRICS.value("mpp_solar_publish_suppressed_total", inverter=monitor.node_id), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,165 @@
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from conftest import FakeMQTTClient  # noqa: E402
+from mpp_solar_monitor import MPPSolarMonitor, SampleQueue  # noqa: E402
+from test_publish_filter import SAMPLE  # noqa: E402
+
+
+class SampleQueueTests(unittest.TestCase):
+    def test_drop_oldest_keeps_the_latest_samples(self):
+        queue = SampleQueue(2)
+
+        self.assertTrue(queue.put({"n": 1}, 1.0))
+        self.assertTrue(queue.put({"n": 2}, 2.0))
+        self.assertFalse(queue.put({"n": 3}, 3.0))
+
+        self.assertEqual(queue.dropped, 1)
+        self.assertEqual(queue.get_nowait(), (2.0, {"n": 2}))
+        self.assertEqual(queue.get_nowait(), (3.0, {"n": 3}))
+        self.assertIsNone(queue.get_nowait())
+
+    def test_drop_newest_keeps_the_queued_samples(self):
+        queue = SampleQueue(1, "drop_newest")
+        queue.put({"n": 1}, 1.0)
+
+        self.assertFalse(queue.put({"n": 2}, 2.0))
+
+        self.assertEqual(queue.get(0.0), (1.0, {"n": 1}))
+        self.assertEqual(queue.high_water, 1)
+
+    def test_close_wakes_a_waiting_sink(self):
+        queue = SampleQueue(4)
+        timer = threading.Timer(0.05, queue.close)
+        timer.start()
+        self.addCleanup(timer.join)
+        started = time.monotonic()
+
+        self.assertIsNone(queue.get(5.0))
+
+        self.assertLess(time.monotonic() - started, 1.0)
+
+    def test_async_get_wakes_on_put(self):
+        queue = SampleQueue(4)
+
+        async def scenario():
+            asyncio.get_running_loop().call_later(0.05, queue.put, {"n": 1}, 1.0)
+            return await queue.get_async(5.0)
+
+        self.assertEqual(asyncio.run(scenario()), (1.0, {"n": 1}))
+
+
+class PipelineTests(unittest.TestCase):
+    CYCLES = 10
+    PERIOD = 0.05
+
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+        os.environ["PUBLISH_QUEUE"] = "2"
+        os.environ["DATA_DIR"] = "/nonexistent"
+        self.monitor = MPPSolarMonitor("/dev/null")
+        self.monitor.clock.period = self.PERIOD
+        self.cycles = []
+        self.published = []
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def poll(self):
+        self.cycles.append(time.monotonic())
+        if len(self.cycles) == self.CYCLES:
+            self.monitor.stop_event.set()
+        return dict(SAMPLE)
+
+    def assert_reader_kept_its_cadence(self):
+        self.assertEqual(len(self.cycles), self.CYCLES)
+        gaps = [b - a for a, b in zip(self.cycles, self.cycles[1:])]
+        self.assertLess(max(gaps), self.PERIOD * 3)
+        self.assertGreater(self.monitor.queue.dropped, 0)
+        self.assertTrue(all("timestamp" in sample for sample in self.published))
+
+    def test_slow_publishing_does_not_delay_the_reader(self):
+        def slow_publish(sample):
+            time.sleep(0.2)
+            self.published.append(sample)
+
+        self.monitor.poll_cycle = self.poll
+        self.monitor.publish_data = slow_publish
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING") as logs:
+            self.monitor.monitor_loop()
+
+        self.assert_reader_kept_its_cadence()
+        self.assertEqual(sum("Publish queue full" in line for line in logs.output), 1)
+
+    def test_slow_publishing_does_not_delay_the_async_reader(self):
+        async def poll():
+            data = self.poll()
+            if self.monitor.stop_event.is_set():
+                raise asyncio.CancelledError
+            return data
+
+        async def slow_publish(sample):
+            await asyncio.sleep(0.2)
+            self.published.append(sample)
+
+        self.monitor.poll_cycle_async = poll
+        self.monitor.publish_data_async = slow_publish
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            with self.assertRaises(asyncio.CancelledError):
+                asyncio.run(self.monitor.monitor_loop_async())
+
+        self.assertEqual(len(self.cycles), self.CYCLES)
+        self.assert_reader_kept_its_cadence()
+        # Samples still queued at shutdown are published before the sink stops
+        self.assertEqual(len(self.monitor.queue), 0)
+
+
+class SinkBackfillTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self._tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self._tmp.cleanup)
+        os.environ.update(
+            INTERVAL="5", SAMPLE_INTERVAL="0.02", BACKFILL_RATE="10", DATA_DIR=self._tmp.name
+        )
+        self.monitor = MPPSolarMonitor("/dev/null")
+        self.monitor.mqtt_client = FakeMQTTClient(connected=False)
+        self.monitor.open_backfill()
+        self.addCleanup(self.monitor.backfill.close)
+        for _ in range(450):
+            self.monitor.backfill.append(b"{}")
+        self.monitor.mqtt_client.connected = True
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def test_sink_waking_every_sample_tick_keeps_the_backfill_rate(self):
+        sink = threading.Thread(target=self.monitor.sink_loop)
+        with self.assertLogs("mpp_solar_monitor", "INFO"):
+            sink.start()
+            time.sleep(0.5)
+            self.monitor.queue.close()
+            sink.join(5.0)
+
+        # One interval's burst (50) plus 10/s, instead of 50 per wake-up
+        self.assertGreaterEqual(len(self.monitor.mqtt_client.published), 50)
+        self.assertLessEqual(len(self.monitor.mqtt_client.published), 60)
+
+
+if __name__ == "__main__":
+    unittest.main()
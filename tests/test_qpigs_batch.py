@@ -0,0 +1,105 @@
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+sys.path.insert(0, str(REPO_ROOT / "benchmarks"))
+
+from bench_qpigs_batch import as_rows, synthetic_replies  # noqa: E402
+from mpp_solar_monitor import FrameCapture, MPPSolarMonitor  # noqa: E402
+from qpigs_batch import QPIGSBatchDecoder, numpy  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD  # noqa: E402
+from test_qpigs_decoder import OLD_LAYOUT, SHORT_LAYOUT  # noqa: E402
+
+
+OLD_PAYLOAD = ("(" + " ".join(OLD_LAYOUT) + ")").encode()
+SHORT_PAYLOAD = ("(" + " ".join(SHORT_LAYOUT) + ")").encode()
+
+
+class BatchDecoderTests(unittest.TestCase):
+    use_numpy = False
+
+    def setUp(self):
+        self.monitor = MPPSolarMonitor()
+        self.decoder = QPIGSBatchDecoder(self.monitor.parse_qpigs, use_numpy=self.use_numpy)
+
+    def expected(self, payloads):
+        rows = (self.monitor.parse_qpigs(payload[1:payload.index(b")")].decode().split()) for payload in payloads)
+        return [row for row in rows if row is not None]
+
+    def test_matches_parse_qpigs_in_input_order(self):
+        payloads = synthetic_replies(3000, odd_rate=0.05) + [QPIGS_PAYLOAD, OLD_PAYLOAD, SHORT_PAYLOAD]
+
+        columns = self.decoder.decode(payloads)
+
+        self.assertEqual(list(columns), list(self.monitor.parse_qpigs(SHORT_LAYOUT)))
+        self.assertEqual(as_rows(columns), self.expected(payloads))
+
+    def test_odd_rows_fall_back_and_rejected_rows_are_left_out(self):
+        signed = QPIGS_PAYLOAD.replace(b" 000 ", b" -00 ")
+        fraction = QPIGS_PAYLOAD.replace(b" 00528 ", b" 528.5 ")
+        payloads = [QPIGS_PAYLOAD, b"(garbage)", signed, OLD_PAYLOAD, fraction, b"(1 2 3)", QPIGS_PAYLOAD + b"\xb7\xa9\r"]
+
+        columns = self.decoder.decode(payloads, times=[float(i) for i in range(len(payloads))])
+
+        kept = [i for i, payload in enumerate(payloads) if self.expected([payload])]
+        self.assertEqual(kept, [0, 2, 3, 4, 6])
+        self.assertEqual(list(columns["time"]), [float(i) for i in kept])
+        self.assertEqual(as_rows(columns), [
+            {"time": float(i), **row} for i, row in zip(kept, self.expected(payloads))
+        ])
+        self.assertEqual(self.decoder.rejected, 2)
+
+    def test_empty_input(self):
+        columns = self.decoder.decode([])
+
+        self.assertEqual(list(columns), list(self.decoder.columns))
+        self.assertEqual(len(columns["battery_voltage"]), 0)
+
+
+@unittest.skipIf(numpy is None, "NumPy is not installed")
+class NumpyBatchDecoderTests(BatchDecoderTests):
+    use_numpy = True
+
+    def test_columns_are_typed_arrays(self):
+        columns = self.decoder.decode([QPIGS_PAYLOAD, OLD_PAYLOAD])
+
+        self.assertEqual(columns["battery_voltage"].dtype, numpy.float64)
+        self.assertEqual(columns["pv_input_power"].dtype, numpy.int64)
+        self.assertEqual(columns["load_on"].dtype, bool)
+        self.assertEqual(columns["device_status"].tolist(), ["00010000", "00010110"])
+
+
+class ExportTests(unittest.TestCase):
+    def test_capture_exports_qpigs_frames_as_csv(self):
+        directory = tempfile.mkdtemp()
+        capture = FrameCapture(directory, "frames_a")
+        for i, frame in enumerate((QPIGS_PAYLOAD, OLD_PAYLOAD)):
+            capture.record(FrameCapture.COMMAND, b"QPIGS\xb7\xa9\r", now=100.0 + i)
+            capture.record(FrameCapture.FRAME, frame + b"\xb7\xa9\r", now=100.5 + i)
+            capture.record(FrameCapture.COMMAND, b"QMOD\x49\xc1\r", now=100.6 + i)
+            capture.record(FrameCapture.FRAME, b"(B\xe7\xc9\r", now=100.7 + i)
+        capture.close()
+        output = os.path.join(directory, "qpigs.csv")
+
+        subprocess.run(
+            [sys.executable, str(REPO_ROOT / "benchmarks" / "export_qpigs.py"), directory,
+             "--output", output, "--no-numpy"],
+            check=True, capture_output=True,
+        )
+
+        with open(output, newline="") as f:
+            rows = list(csv.DictReader(f))
+        self.assertAlmostEqual(float(rows[1]["time"]) - float(rows[0]["time"]), 1.0)
+        self.assertEqual([row["device_status"] for row in rows], ["00010000", "00010110"])
+        self.assertEqual(rows[1]["battery_discharge_current"], "12")
+
+
+if __name__ == "__main__":
+    unittest.main()
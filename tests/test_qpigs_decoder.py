@@ -0,0 +1,105 @@
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import (  # noqa: E402
+    QPIGS_LAYOUT_CONFIRMATIONS,
+    MPPSolarMonitor,
+    QPIGSDecoder,
+    QPIGSLayoutMismatch,
+)
+from test_hid_session import QPIGS_PAYLOAD  # noqa: E402
+
+
+# Status at 16, discharge current at 15, PV power at 19
+NEW_LAYOUT = QPIGS_PAYLOAD[1:-1].decode().split()
+# Status at 20, discharge current at 16
+OLD_LAYOUT = (
+    "230.0 50.0 230.0 50.0 2500 2343 046 420 52.00 27 048 0033 05.0 105.7 "
+    "54.00 000 00012 00 00 00528 00010110"
+).split()
+# Short frame without PV power, computed from V*I
+SHORT_LAYOUT = NEW_LAYOUT[:17]
+
+
+class QPIGSDecoderTests(unittest.TestCase):
+    def setUp(self):
+        self.monitor = MPPSolarMonitor()
+
+    def compiled(self, values):
+        status_idx, discharge_idx = self.monitor.detect_qpigs_layout(values)
+        return QPIGSDecoder(len(values), status_idx, discharge_idx)
+
+    def test_compiled_decoder_matches_generic_parser(self):
+        for values in (NEW_LAYOUT, OLD_LAYOUT, SHORT_LAYOUT):
+            with self.subTest(fields=len(values)):
+                decoded = self.compiled(values).decode(values)
+                self.assertEqual(decoded, self.monitor.parse_qpigs(values))
+                self.assertEqual(list(decoded), list(self.monitor.parse_qpigs(values)))
+
+    def test_frames_that_do_not_fit_raise_mismatch(self):
+        decoder = self.compiled(NEW_LAYOUT)
+        for values in (OLD_LAYOUT[:20], OLD_LAYOUT, NEW_LAYOUT[:5] + ["x"] + NEW_LAYOUT[6:]):
+            with self.subTest(values=values):
+                with self.assertRaises(QPIGSLayoutMismatch):
+                    decoder.decode(values)
+
+
+class LayoutLearningTests(unittest.TestCase):
+    def setUp(self):
+        self.monitor = MPPSolarMonitor()
+
+    def test_layout_is_compiled_after_confirmations(self):
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS - 1):
+            self.monitor.decode_qpigs(NEW_LAYOUT)
+        self.assertIsNone(self.monitor.qpigs_decoder)
+
+        self.monitor.decode_qpigs(NEW_LAYOUT)
+        self.assertEqual(self.monitor.qpigs_decoder.layout, (21, 16, 15))
+
+    def test_disagreeing_frame_restarts_confirmation(self):
+        self.monitor.decode_qpigs(NEW_LAYOUT)
+        self.monitor.decode_qpigs(OLD_LAYOUT)
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS - 2):
+            self.monitor.decode_qpigs(NEW_LAYOUT)
+        self.assertIsNone(self.monitor.qpigs_decoder)
+
+    def test_mismatch_falls_back_to_detection(self):
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS):
+            self.monitor.decode_qpigs(NEW_LAYOUT)
+
+        data = self.monitor.decode_qpigs(OLD_LAYOUT)
+
+        self.assertEqual(data, self.monitor.parse_qpigs(OLD_LAYOUT))
+        self.assertEqual(data["battery_discharge_current"], 12)
+        self.assertEqual(self.monitor.qpigs_decoder.layout, (21, 16, 15))
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS - 1):
+            self.monitor.decode_qpigs(OLD_LAYOUT)
+        self.assertEqual(self.monitor.qpigs_decoder.layout, (21, 20, 16))
+
+    def test_odd_frames_between_good_ones_keep_the_layout(self):
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS):
+            self.monitor.decode_qpigs(NEW_LAYOUT)
+        decoder = self.monitor.qpigs_decoder
+
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS):
+            self.assertEqual(self.monitor.decode_qpigs(SHORT_LAYOUT), self.monitor.parse_qpigs(SHORT_LAYOUT))
+            self.assertEqual(self.monitor.decode_qpigs(OLD_LAYOUT)["battery_discharge_current"], 12)
+            self.monitor.decode_qpigs(NEW_LAYOUT)
+
+        self.assertIs(self.monitor.qpigs_decoder, decoder)
+
+    def test_frames_without_status_are_never_compiled(self):
+        values = NEW_LAYOUT[:16] + ["xx"] + NEW_LAYOUT[17:]
+        for _ in range(QPIGS_LAYOUT_CONFIRMATIONS + 1):
+            self.assertIsNotNone(self.monitor.decode_qpigs(values))
+        self.assertIsNone(self.monitor.qpigs_decoder)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,117 @@
+import asyncio
+import os
+import sys
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import METRICS, MPPSolarMonitor, ResponseTimes  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+class ResponseTimesTests(unittest.TestCase):
+    def test_ceiling_until_enough_samples(self):
+        times = ResponseTimes()
+        for _ in range(ResponseTimes.MIN_SAMPLES - 1):
+            times.record("QPIGS", 0.3, 0.1)
+
+        self.assertEqual(times.deadline("QPIGS", 2.0), 2.0)
+        self.assertIsNone(times.transfer_time("QPIGS"))
+
+    def test_deadline_follows_high_percentile(self):
+        times = ResponseTimes()
+        for i in range(40):
+            times.record("QPIGS", 0.30 + i * 0.001, 0.1)
+
+        deadline = times.deadline("QPIGS", 2.0)
+
+        self.assertAlmostEqual(deadline, 0.338 * 1.25 + ResponseTimes.MARGIN, places=3)
+        self.assertEqual(times.deadline("QMOD", 2.0), 2.0)
+        self.assertAlmostEqual(times.transfer_time("QPIGS"), 0.1)
+
+    def test_deadline_is_bounded(self):
+        times = ResponseTimes()
+        for _ in range(20):
+            times.record("QPIGS", 0.01)
+            times.record("QPIRI", 5.0)
+
+        self.assertEqual(times.deadline("QPIGS", 2.0), ResponseTimes.FLOOR)
+        self.assertEqual(times.deadline("QPIRI", 2.0), 2.0)
+
+    def test_timeouts_push_the_deadline_back_up(self):
+        times = ResponseTimes()
+        for _ in range(20):
+            times.record("QPIGS", 0.2)
+        learned = times.deadline("QPIGS", 2.0)
+
+        for _ in range(4):
+            times.record("QPIGS", times.deadline("QPIGS", 2.0))
+
+        self.assertGreater(times.deadline("QPIGS", 2.0), learned)
+
+
+class MonitorReadDeadlineTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        self.inverter = FakeInverterPty()
+        self.addCleanup(self.inverter.close)
+        os.environ["INTERVAL"] = "5"
+        os.environ["DEVICE"] = self.inverter.path
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def read_fast_replies(self, monitor, count):
+        crc = monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big")
+        for _ in range(count):
+            os.write(self.inverter.master, QPIGS_PAYLOAD + crc + b"\r")
+            self.assertIsNotNone(monitor.read_command("QPIGS"))
+
+    def test_deadline_is_learned_and_exported(self):
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+
+        self.read_fast_replies(monitor, ResponseTimes.MIN_SAMPLES)
+
+        self.assertEqual(monitor.read_deadline("QPIGS"), ResponseTimes.FLOOR)
+        self.assertEqual(
+            METRICS.value("mpp_solar_read_deadline_seconds", inverter=monitor.node_id, command="QPIGS"),
+            ResponseTimes.FLOOR,
+        )
+        self.assertIsNotNone(monitor.expected_transfer_seconds("QPIGS"))
+
+    def test_async_read_waits_out_the_transfer_after_first_byte(self):
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+        self.read_fast_replies(monitor, ResponseTimes.MIN_SAMPLES)
+        for _ in range(ResponseTimes.MIN_SAMPLES):
+            monitor.response_times.record("QPIGS", 0.1, 0.05)
+        wire = QPIGS_PAYLOAD + monitor.crc16_xmodem(QPIGS_PAYLOAD).to_bytes(2, "big") + b"\r"
+
+        async def scenario():
+            loop = asyncio.get_running_loop()
+            for i in range(0, len(wire), 8):
+                loop.call_later(0.01 + i * 0.0005, os.write, self.inverter.master, wire[i:i + 8])
+            return await monitor.read_command_async("QPIGS")
+
+        data = asyncio.run(scenario())
+
+        self.assertEqual(data["pv_input_power"], 528)
+
+    def test_fixed_deadline_when_disabled(self):
+        os.environ["ADAPTIVE_DEADLINE"] = "false"
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+
+        self.read_fast_replies(monitor, ResponseTimes.MIN_SAMPLES)
+
+        self.assertEqual(monitor.read_deadline("QPIGS"), monitor.get_read_deadline_seconds())
+        self.assertIsNone(monitor.expected_transfer_seconds("QPIGS"))
+
+
+if __name__ == "__main__":
+    unittest.main()
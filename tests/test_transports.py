@@ -0,0 +1,237 @@
+import asyncio
+import contextlib
+import os
+import socket
+import sys
+import termios
+import threading
+import unittest
+from pathlib import Path
+
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(REPO_ROOT / "mpp_solar"))
+
+from mpp_solar_monitor import MPPSolarMonitor, SerialSession, TCPSession, crc16_xmodem_update, parse_transport  # noqa: E402
+from test_hid_session import QPIGS_PAYLOAD, FakeInverterPty  # noqa: E402
+
+
+QPIGS_FRAME = QPIGS_PAYLOAD + crc16_xmodem_update(0, QPIGS_PAYLOAD).to_bytes(2, "big") + b"\r"
+
+
+class FakeBridge:
+    """Local TCP server standing in for ser2net: answers every QPIGS."""
+
+    def __init__(self, reply: bytes, hang_up_after_reply: bool = False):
+        self.reply = reply
+        self.hang_up_after_reply = hang_up_after_reply
+        self.connections = 0
+        self.commands = []
+        # Released whenever the bridge has closed a connection
+        self.closed = threading.Semaphore(0)
+        self.server = socket.create_server(("127.0.0.1", 0))
+        self.port = self.server.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn, self._closing():
+            pending = b""
+            while True:
+                data = conn.recv(64)
+                if not data:
+                    return
+                pending += data
+                while b"\r" in pending:
+                    command, pending = pending.split(b"\r", 1)
+                    self.commands.append(command[:-2])
+                    conn.sendall(self.reply)
+                    if self.hang_up_after_reply:
+                        return
+
+    @contextlib.contextmanager
+    def _closing(self):
+        try:
+            yield
+        finally:
+            self.closed.release()
+
+    def close(self):
+        self.server.close()
+
+
+@contextlib.contextmanager
+def blackholed_port():
+    """Port whose accept queue is full, so connection attempts hang."""
+    with socket.socket() as server:
+        server.bind(("127.0.0.1", 0))
+        server.listen(0)
+        port = server.getsockname()[1]
+        waiting = []
+        try:
+            for _ in range(3):
+                sock = socket.socket()
+                waiting.append(sock)
+                sock.setblocking(False)
+                sock.connect_ex(("127.0.0.1", port))
+            yield port
+        finally:
+            for sock in waiting:
+                sock.close()
+
+
+class TransportParsingTests(unittest.TestCase):
+    def test_device_option_selects_transport(self):
+        self.assertEqual(parse_transport("/dev/hidraw0"), ("hidraw", "/dev/hidraw0"))
+        self.assertEqual(parse_transport("usb:0665:5161"), ("hidraw", "usb:0665:5161"))
+        self.assertEqual(parse_transport("/dev/ttyUSB0"), ("serial", "/dev/ttyUSB0"))
+        self.assertEqual(parse_transport("/dev/serial/by-id/usb-FTDI"), ("serial", "/dev/serial/by-id/usb-FTDI"))
+        self.assertEqual(parse_transport("serial:/dev/pts/3"), ("serial", "/dev/pts/3"))
+        self.assertEqual(parse_transport("tcp://192.168.1.20:4001"), ("tcp", "192.168.1.20:4001"))
+
+    def test_invalid_settings_are_rejected(self):
+        with self.assertRaises(ValueError):
+            SerialSession("/dev/ttyUSB0", baud_rate=1234)
+        with self.assertRaises(ValueError):
+            TCPSession("bridge.local")
+
+
+class MonitorTransportTests(unittest.TestCase):
+    def setUp(self):
+        self._env = os.environ.copy()
+        os.environ["INTERVAL"] = "5"
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self._env)
+
+    def monitor(self, device):
+        os.environ["DEVICE"] = device
+        monitor = MPPSolarMonitor()
+        self.addCleanup(monitor.session.close)
+        return monitor
+
+    def test_serial_port_is_set_to_raw_at_baud_rate(self):
+        inverter = FakeInverterPty()
+        self.addCleanup(inverter.close)
+        os.environ["BAUD_RATE"] = "9600"
+        monitor = self.monitor(f"serial:{inverter.path}")
+
+        self.assertIsInstance(monitor.session, SerialSession)
+        self.assertTrue(monitor._device_accessible())
+        os.write(inverter.master, b"stale")
+        iflag, _oflag, cflag, lflag, ispeed, ospeed, _cc = termios.tcgetattr(monitor.session.open())
+        os.write(inverter.master, QPIGS_FRAME)
+        data = monitor.read_inverter_data()
+
+        self.assertEqual((ispeed, ospeed), (termios.B9600, termios.B9600))
+        self.assertEqual(cflag & termios.CSIZE, termios.CS8)
+        self.assertEqual(lflag & (termios.ICANON | termios.ECHO), 0)
+        self.assertEqual(iflag & termios.ICRNL, 0)
+        self.assertEqual(data["pv_input_power"], 528)
+        self.assertEqual(os.read(inverter.master, 64)[:5], b"QPIGS")
+
+    def test_baud_rate_without_termios_constant_is_rejected_before_opening(self):
+        os.environ["DEVICE"] = "/dev/ttyUSB0"
+        os.environ["BAUD_RATE"] = "14400"
+        with self.assertRaisesRegex(ValueError, r"Unsupported baud_rate 14400, expected one of 1200, 2400"):
+            MPPSolarMonitor()
+
+    def test_tcp_connection_is_kept_across_reads(self):
+        bridge = FakeBridge(QPIGS_FRAME)
+        self.addCleanup(bridge.close)
+        monitor = self.monitor(f"tcp://127.0.0.1:{bridge.port}")
+
+        self.assertTrue(monitor._device_accessible())
+        for _ in range(3):
+            self.assertEqual(monitor.read_inverter_data()["pv_input_power"], 528)
+
+        self.assertEqual(bridge.connections, 1)
+        self.assertEqual(bridge.commands, [b"QPIGS"] * 3)
+        self.assertEqual(monitor.session._sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE), 1)
+        self.assertFalse(monitor._device_removed())
+
+    def test_tcp_reconnects_after_bridge_hangs_up(self):
+        bridge = FakeBridge(QPIGS_FRAME, hang_up_after_reply=True)
+        self.addCleanup(bridge.close)
+        monitor = self.monitor(f"tcp://127.0.0.1:{bridge.port}")
+
+        readings = []
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            for _ in range(3):
+                readings.append(monitor.read_inverter_data())
+                self.assertTrue(bridge.closed.acquire(timeout=5))
+
+        self.assertEqual([data["pv_input_power"] for data in readings], [528] * 3)
+        self.assertEqual(bridge.connections, 3)
+        self.assertEqual(monitor.session.reopen_count, 2)
+
+    def test_async_engine_reads_reply_before_hang_up(self):
+        bridge = FakeBridge(QPIGS_FRAME, hang_up_after_reply=True)
+        self.addCleanup(bridge.close)
+        monitor = self.monitor(f"tcp://127.0.0.1:{bridge.port}")
+
+        async def scenario():
+            readings = []
+            for _ in range(2):
+                readings.append(await monitor.read_inverter_data_async())
+                self.assertTrue(bridge.closed.acquire(timeout=5))
+            return readings
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            readings = asyncio.run(scenario())
+
+        self.assertEqual([data["pv_input_power"] for data in readings], [528] * 2)
+
+    def test_connecting_to_blackholed_bridge_keeps_the_event_loop_running(self):
+        with blackholed_port() as port:
+            monitor = self.monitor(f"tcp://127.0.0.1:{port}")
+            monitor.session.CONNECT_TIMEOUT = 0.5
+
+            async def scenario():
+                loop = asyncio.get_running_loop()
+                gaps = []
+
+                async def ticker():
+                    last = loop.time()
+                    while True:
+                        await asyncio.sleep(0.05)
+                        gaps.append(loop.time() - last)
+                        last = loop.time()
+
+                task = loop.create_task(ticker())
+                accessible = await monitor._device_accessible_async()
+                data = await monitor.read_inverter_data_async()
+                task.cancel()
+                return accessible, data, gaps
+
+            with self.assertLogs("mpp_solar_monitor", "WARNING"):
+                accessible, data, gaps = asyncio.run(scenario())
+
+        self.assertFalse(accessible)
+        self.assertIsNone(data)
+        # Two 0.5 s connect attempts, the 50 ms ticker never held up
+        self.assertGreater(len(gaps), 10)
+        self.assertLess(max(gaps), 0.25)
+
+    def test_unreachable_bridge_is_not_fatal(self):
+        with socket.create_server(("127.0.0.1", 0)) as unused:
+            port = unused.getsockname()[1]
+        monitor = self.monitor(f"tcp://127.0.0.1:{port}")
+
+        with self.assertLogs("mpp_solar_monitor", "WARNING"):
+            self.assertFalse(monitor._device_accessible())
+            self.assertIsNone(monitor.read_inverter_data())
+        self.assertIsNone(monitor.watcher)
+
+
+if __name__ == "__main__":
+    unittest.main()